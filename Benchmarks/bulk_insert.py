@@ -0,0 +1,86 @@
+"""Throughput benchmark of per-row addWeather against bulk addWeatherMany.
+
+Writes synthetic observations into throw-away databases in a temporary
+directory: once row by row, once as whole ingestion rounds, and once as a
+streamed backfill that is never held in memory. Every run writes its own
+time range, so no row is skipped as a duplicate.
+
+Usage:
+    python -m Benchmarks.bulk_insert --cities 500 --rounds 20 --backfill 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from DataManager.db import close_connections
+from DataManager.weather_db import addWeather, addWeatherMany
+from DataManager.weather_db import initialize_db as w_db
+
+STATUSES = ["clear sky", "few clouds", "haze", "light rain", "mist"]
+
+
+def observations(cities, rounds, start, step=600, seed=0):
+    """Yield synthetic weather records, one per city and round, `step` seconds apart."""
+    rng = random.Random(seed)
+    for round_index in range(rounds):
+        for city in cities:
+            temp = rng.uniform(15, 40)
+            yield {
+                "City": city,
+                "DateTime": start + round_index * step,
+                "Temperature": temp,
+                "Temperature_max": temp + 1,
+                "Temperature_min": temp - 1,
+                "Weather": rng.choice(STATUSES),
+                "Feels_like": temp + 2,
+                "Wind_Speed": rng.uniform(0, 10),
+                "Humidity": rng.randint(20, 95),
+            }
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16}{rows:>10} rows  {elapsed:8.3f}s  {rows / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, default=500, help="number of cities per round")
+    parser.add_argument("--rounds", type=int, default=20, help="number of ingestion rounds")
+    parser.add_argument("--backfill", type=int, default=1000000, help="rows in the streamed backfill")
+    args = parser.parse_args()
+
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+    rows = args.cities * args.rounds
+    start = int(time.time()) - 30 * 86400
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        w_db()
+
+        def per_row():
+            for observation in observations(cities, args.rounds, start):
+                addWeather(observation["City"], observation["DateTime"], observation["Temperature"],
+                           observation["Temperature_max"], observation["Temperature_min"], observation["Weather"],
+                           observation["Feels_like"], observation["Wind_Speed"], observation["Humidity"])
+
+        def per_round():
+            for round_index in range(args.rounds):
+                addWeatherMany(observations(cities, 1, start + (args.rounds + round_index) * 600, seed=round_index))
+
+        def backfill():
+            backfill_rounds = -(-args.backfill // len(cities))
+            addWeatherMany(observations(cities, backfill_rounds, start - backfill_rounds * 600))
+
+        timed("addWeather", rows, per_row)
+        timed("addWeatherMany", rows, per_round)
+        timed("streamed", -(-args.backfill // len(cities)) * len(cities), backfill)
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Load time and peak memory of reading the weather table into a DataFrame.
+
+Fills a throw-away database with synthetic observations, then loads the
+whole table twice: the old way (fetchall into a list of tuples, then
+pd.DataFrame) and with getWeather, which streams cursor batches into
+compactly typed arrays.
+
+Usage:
+    python -m Benchmarks.frame_load --rows 5000000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from Benchmarks.bulk_insert import observations
+from DataManager.db import DATA_DB, close_connections, get_connection
+from DataManager.weather_db import addWeatherMany, getWeather
+from DataManager.weather_db import initialize_db as w_db
+
+
+def fetchall_frame():
+    """Load the table as the weather reader did before: a list of tuples, then a DataFrame."""
+    c = get_connection(DATA_DB).cursor()
+    c.execute("""
+        SELECT City, datetime(DateTime, 'unixepoch', 'localtime') AS DateTime, Temperature, Temperature_max,
+               Temperature_min, Weather, feels_like, Wind_Speed, Humidity
+        FROM weather
+    """)
+    data = c.fetchall()
+    return pd.DataFrame(data, columns=[description[0] for description in c.description])
+
+
+def measure(label, load):
+    # Time a plain run, then trace a second one for the peak memory, as tracing slows it down
+    gc.collect()
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    df = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = df.memory_usage(deep=True).sum()
+    print(f"{label:<10}{len(df):>10} rows  {elapsed:8.2f}s  peak {peak / 2 ** 20:9.1f} MiB  "
+          f"frame {size / 2 ** 20:9.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000000, help="rows in the weather table")
+    parser.add_argument("--cities", type=int, default=500, help="number of distinct cities")
+    args = parser.parse_args()
+
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+    rounds = -(-args.rows // len(cities))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        w_db()
+        addWeatherMany(observations(cities, rounds, int(time.time()) - rounds * 600))
+
+        measure("fetchall", fetchall_frame)
+        measure("streamed", getWeather)
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
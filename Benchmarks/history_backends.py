@@ -0,0 +1,97 @@
+"""Latency of history queries on the SQLite and Parquet storage backends.
+
+Fills a throw-away database with synthetic observations ending now, copies
+them to Parquet, then times the same queryWeather and weatherHistory calls
+on both backends: first with every raw observation still in SQLite, then
+after retention has rolled the old ones up into the hourly and daily tiers.
+Each call is timed as the best of a few runs.
+
+Usage:
+    python -m Benchmarks.history_backends --rows 10000000 --cities 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from Benchmarks.bulk_insert import observations
+from DataManager.db import close_connections
+from DataManager.parquet_store import ParquetBackend
+from DataManager.retention import applyRetention, weatherHistory
+from DataManager.sqlite_store import SQLiteBackend
+from DataManager.storage import set_backend
+from DataManager.weather_db import addWeatherMany, queryWeather
+from DataManager.weather_db import initialize_db as w_db
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(backends, queries, repeat):
+    print(f"{'query':<34}" + "".join(f"{name:>22}" for name in backends))
+    for label, query in queries:
+        cells = []
+        for backend in backends.values():
+            set_backend(backend)
+            elapsed, df = best_of(repeat, query)
+            cells.append(f"{elapsed * 1000:10.1f} ms {len(df):>8} rows")
+        print(f"{label:<34}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000, help="number of observations")
+    parser.add_argument("--cities", type=int, default=100, help="number of cities")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each query")
+    args = parser.parse_args()
+
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+    rounds = -(-args.rows // len(cities))
+    now = int(time.time())
+    start = now - rounds * 600
+    city = cities[0]
+
+    queries = [
+        ("day, all cities, all time", lambda: weatherHistory(resolution="day")),
+        ("hour, all cities, last 30 days", lambda: weatherHistory(start=now - 30 * 86400, resolution="hour")),
+        ("hour, one city, last 90 days", lambda: weatherHistory(cities=[city], start=now - 90 * 86400,
+                                                                 resolution="hour")),
+        ("raw, one city, last 7 days", lambda: queryWeather(cities=[city], start=now - 7 * 86400,
+                                                             columns=["DateTime", "Temperature"])),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        w_db()
+
+        began = time.perf_counter()
+        addWeatherMany(observations(cities, rounds, start))
+        print(f"Inserted {rounds * len(cities):,} rows in {time.perf_counter() - began:.1f}s")
+
+        parquet = ParquetBackend("weather_parquet")
+        began = time.perf_counter()
+        copied = parquet.sync(force=True)
+        print(f"Copied {copied:,} rows to Parquet in {time.perf_counter() - began:.1f}s")
+        backends = {"sqlite": SQLiteBackend(), "parquet": parquet}
+
+        print("\nEvery raw observation in SQLite")
+        compare(backends, queries, args.repeat)
+
+        began = time.perf_counter()
+        applyRetention(now=now)
+        print(f"\nApplied retention in {time.perf_counter() - began:.1f}s")
+        compare(backends, queries, args.repeat)
+
+        set_backend(None)
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
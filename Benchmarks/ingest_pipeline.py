@@ -0,0 +1,79 @@
+"""Throughput benchmark of the ingest -> store -> summarize pipeline.
+
+Runs entirely offline against a synthetic or replayed weather provider and
+throw-away databases in a temporary directory. Each round is stamped with
+its own observation time, ten minutes apart, so no round is dropped as a
+duplicate of the previous one, and the rows reported are the rows stored.
+
+Usage:
+    python -m Benchmarks.ingest_pipeline --cities 200 --rounds 5 --latency 0.05
+    python -m Benchmarks.ingest_pipeline --replay recordings --rounds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from DataManager.DataGen import fetchCities
+from DataManager.db import DATA_DB, get_connection
+from DataManager.providers import ReplayProvider, SyntheticProvider, set_provider
+from DataManager.report_db import addSummary
+from DataManager.report_db import initialize_db as r_db
+from DataManager.weather_db import Summary
+from DataManager.weather_db import initialize_db as w_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, default=100, help="number of cities per round")
+    parser.add_argument("--rounds", type=int, default=5, help="number of ingestion rounds")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per provider request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds per request")
+    parser.add_argument("--replay", help="serve a recording directory instead of synthetic data")
+    args = parser.parse_args()
+
+    # The observation time of the current round, moved forward by each round
+    round_time = [int(time.time()) - args.rounds * 600]
+
+    def clock():
+        return round_time[0]
+
+    if args.replay:
+        provider = ReplayProvider(os.path.abspath(args.replay), latency=args.latency, jitter=args.jitter, clock=clock)
+    else:
+        provider = SyntheticProvider(latency=args.latency, jitter=args.jitter, seed=0, clock=clock)
+    set_provider(provider)
+
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        w_db()
+        r_db()
+
+        ingest = summarize = 0.0
+        rows = 0
+        conn = get_connection(DATA_DB)
+        for _ in range(args.rounds):
+            round_time[0] += 600
+            stored = conn.execute("SELECT COUNT(*) FROM weather").fetchone()[0]
+            start = time.perf_counter()
+            fetchCities(cities)
+            ingest += time.perf_counter() - start
+            rows += conn.execute("SELECT COUNT(*) FROM weather").fetchone()[0] - stored
+
+            start = time.perf_counter()
+            for city in cities:
+                summary = Summary(city)
+                addSummary(city=summary["City"], datetime=summary["DateTime"], min_temp=summary["min_temp"],
+                           max_temp=summary["max_temp"], avg_temp=summary["avg_temp"],
+                           dominant_weather=summary["dominant_weather"])
+            summarize += time.perf_counter() - start
+
+    print(f"rows stored:    {rows}")
+    print(f"ingest:         {ingest:.3f}s ({rows / ingest:,.0f} rows/s)")
+    print(f"summarize:      {summarize:.3f}s ({len(cities) * args.rounds / summarize:,.0f} cities/s)")
+
+
+if __name__ == "__main__":
+    main()
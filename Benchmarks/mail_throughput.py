@@ -0,0 +1,54 @@
+"""Throughput in messages/sec of one SMTP session per mail against pooled sessions.
+
+Sends synthetic mails to a local stand-in SMTP server that waits `--delay`
+seconds before answering each command, to mimic the round trips to a
+remote server. Compared are a new session (connect, EHLO, LOGIN) per mail,
+as send_email used to open, and pooled sessions with one or more senders.
+
+Usage:
+    python -m Benchmarks.mail_throughput --messages 1000 --delay 0.005 --threads 4
+"""
+import argparse
+import concurrent.futures
+import time
+from email.mime.text import MIMEText
+
+from Benchmarks.smtp_server import LocalSMTPServer
+from DataManager.mailSystem import SMTPPool
+
+
+def message(i):
+    msg = MIMEText(f"Weather report number {i}\n" * 20)
+    msg["From"] = "sender@example.com"
+    msg["To"] = f"user{i}@example.com"
+    msg["Subject"] = "Weather Report"
+    return msg
+
+
+def run(label, server, messages, threads, **kwargs):
+    pool = SMTPPool("127.0.0.1", server.port, user="sender@example.com", password="secret", starttls=False,
+                    size=threads, **kwargs)
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda i: pool.send(message(i)), range(messages)))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    print(f"{label:<28}{messages:>8} mails  {pool.connects:>6} sessions  {elapsed:8.2f}s"
+          f"  {messages / elapsed:>10,.1f} mails/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000, help="mails to send in each run")
+    parser.add_argument("--delay", type=float, default=0.005, help="seconds the server waits per command")
+    parser.add_argument("--threads", type=int, default=4, help="senders and sessions in the last run")
+    args = parser.parse_args()
+
+    with LocalSMTPServer(delay=args.delay) as server:
+        run("session per mail", server, args.messages, 1, messages_per_session=1)
+        run("pooled, 1 session", server, args.messages, 1)
+        run(f"pooled, {args.threads} sessions", server, args.messages, args.threads)
+
+
+if __name__ == "__main__":
+    main()
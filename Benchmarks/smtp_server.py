@@ -0,0 +1,179 @@
+"""A local stand-in SMTP server, for tests, benchmarks and offline runs.
+
+It speaks enough SMTP for smtplib: EHLO/HELO, AUTH PLAIN and LOGIN (any
+credentials are accepted), MAIL, RCPT (refusing addresses without an @),
+DATA, RSET, NOOP and QUIT. There is no STARTTLS, so point the mail pool at
+it with SMTP_STARTTLS=0. Messages are kept in memory rather than delivered.
+
+Usage:
+    python -m Benchmarks.smtp_server --port 8025
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One SMTP session, on its own thread
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost stand-in SMTP")
+        sent = 0
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if server.delay:
+                time.sleep(server.delay)
+
+            if verb == "EHLO":
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "AUTH":
+                parts = command.split()
+                if len(parts) > 1 and parts[1].upper() == "LOGIN":
+                    # The username may come with the command, the password always comes alone
+                    if len(parts) == 2:
+                        self.reply("334 VXNlcm5hbWU6")
+                        self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == server.refuse_on and server.refuse_after is not None and sent >= server.refuse_after:
+                # Mimic a server shutting a session down mid-transaction
+                self.reply("421 Service not available, closing transmission channel")
+                return
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip(" <>")
+                if "@" in recipient:
+                    recipients.append(recipient)
+                    self.reply("250 OK")
+                else:
+                    self.reply("550 No such user here")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    server.messages.append((recipients, b"".join(data)))
+                self.reply("250 OK queued")
+                sent += 1
+                # Mimic a server that limits messages per session by hanging up
+                if server.drop_after and sent >= server.drop_after:
+                    return
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    SMTP server on localhost, serving each connection on its own thread.
+
+    Parameters
+    ----------
+    port : int, optional
+        The port to listen on, by default 0 for any free port (see `port`).
+    drop_after : int, optional
+        If set, the server closes a connection after accepting this many
+        messages on it, as servers enforcing a per-session limit do.
+    delay : float, optional
+        Seconds to wait before answering each command, to mimic the round
+        trips to a remote server.
+    refuse_after : int, optional
+        If set, the server answers `refuse_on` with 421 and closes the
+        connection once it has accepted this many messages on it.
+    refuse_on : str, optional
+        The command refused by `refuse_after`, "MAIL" (the default), "RCPT"
+        or "DATA".
+
+    Attributes
+    ----------
+    messages : list of tuple
+        The accepted messages, as (recipients, raw message bytes).
+    connections : int
+        Connections accepted so far.
+    logins : int
+        Successful AUTH commands so far.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, drop_after=None, delay=0.0, refuse_after=None, refuse_on="MAIL"):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.drop_after = drop_after
+        self.delay = delay
+        self.refuse_after = refuse_after
+        self.refuse_on = refuse_on
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        """The port the server listens on."""
+        return self.server_address[1]
+
+    def start(self):
+        """Serve on a background thread and return the server."""
+        self._thread = threading.Thread(target=self.serve_forever, name="smtp-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8025, help="port to listen on")
+    parser.add_argument("--drop-after", type=int, help="close connections after this many messages")
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(args.port, drop_after=args.drop_after)
+    print(f"Stand-in SMTP server listening on 127.0.0.1:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Accepted {len(server.messages)} messages on {server.connections} connections")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
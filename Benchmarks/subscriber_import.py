@@ -0,0 +1,64 @@
+"""Throughput of per-row subscribe against the bulk import_subscribers.
+
+Writes a synthetic subscriber CSV into a temporary directory, then
+subscribes part of it row by row and imports the whole file in bulk into
+throw-away databases.
+
+Usage:
+    python -m Benchmarks.subscriber_import --rows 100000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from DataManager.Users_db import import_subscribers, subscribe, unsubscribe_many
+from DataManager.Users_db import initialize_db as u_db
+from DataManager.cities import DEFAULT_CITIES
+from DataManager.db import USERS_DB, close_connections
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["UserName", "Mail", "City"])
+        for i in range(rows):
+            writer.writerow([f"user{i}", f"user{i}@example.com", DEFAULT_CITIES[i % len(DEFAULT_CITIES)]])
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20}{rows:>10} rows  {elapsed:8.3f}s  {rows / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="subscribers in the CSV file")
+    parser.add_argument("--per-row", type=int, default=2000, help="subscribers added one at a time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        write_csv("subscribers.csv", args.rows)
+        u_db()
+
+        def per_row():
+            with open("subscribers.csv", newline="") as file:
+                for row, _ in zip(csv.DictReader(file), range(args.per_row)):
+                    subscribe(row["UserName"], row["Mail"], row["City"])
+
+        timed("subscribe", args.per_row, per_row)
+        close_connections()
+        os.remove(USERS_DB)
+        u_db()
+        timed("import_subscribers", args.rows, lambda: import_subscribers("subscribers.csv"))
+        timed("unsubscribe_many", args.rows,
+              lambda: unsubscribe_many(f"user{i}@example.com" for i in range(args.rows)))
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
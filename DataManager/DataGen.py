@@ -1,93 +1,282 @@
+import concurrent.futures
 import datetime
-import pyowm
 import os
+import threading
+import time
+
 from .LLMsummary import send_warning, send_summary
+from .alerts import get_alert_engine
+from .cities import city_names
+from .providers import get_provider, owm_api_call
+from .ratelimit import CircuitOpenError
 from .report_db import addSummary
-from .weather_db import addWeather, shouldUpdateWeather, dropDataBefore24Hours, Warning, Summary
+from .scheduler import PollScheduler
+from .weather_db import addWeather, addWeatherMany, lastUpdates, lastWeather, Warning, Summary, WARNING_THRESHOLD
+
+# Upper bound on the number of cities fetched at the same time
+MAX_FETCH_WORKERS = int(os.getenv("OWM_MAX_WORKERS", 8))
+
+# How callCities fetches a round: "concurrent", "batch" or "sequential"
+FETCH_MODE = os.getenv("OWM_FETCH_MODE", "concurrent")
+
+_pool_lock = threading.Lock()
+_fetch_pool = None
+_scheduler = None
+_tracked_cities = None
+
+
+# Function to turn a provider record into a weather data row
+def _weather_data(record):
+    """Add the DateTime column, the observation's own reference time, to a provider record."""
+    reference_time = record.get("Reference_time")
+    if reference_time is None:
+        date_time = datetime.datetime.now()
+    else:
+        date_time = datetime.datetime.fromtimestamp(reference_time)
+    return {"DateTime": date_time, **record}
 
 
-# Function to call the OpenWeatherMap API for the specified city
-def owm_api_call(city):
+# Function to store a weather record in the database
+def _store(weather_data):
+    """Add a weather record produced by _weather_data to the SQLite3 database."""
+    addWeather(
+        weather_data["City"], weather_data["DateTime"], weather_data["Temperature"],
+        weather_data["Temperature_max"], weather_data["Temperature_min"],
+        weather_data["Weather"], weather_data["Feels_like"],
+        weather_data["Wind_Speed"], weather_data["Humidity"]
+    )
+
+
+# Function to get the weather for a specific city and store it in the database
+def getWeather(city, store=True):
     """
-    Call the OpenWeatherMap API for the specified city and retrieve the
-    current weather data.
+    Retrieves the current weather for the specified city and stores it in the database.
 
     Parameters
     ----------
     city : str
         The city for which to retrieve the weather data.
+    store : bool, optional
+        Whether to store the data, by default True. Callers fetching many
+        cities pass False and store the whole round with addWeatherMany.
 
     Returns
     -------
-    observation : pyowm.weatherapi25.weather_manager.WeatherManager
-        The pyowm observation object containing the current weather data.
+    weather_data : dict
+        A dictionary containing the current weather data for the specified city.
+        While OWM calls are short-circuited after repeated failures, the latest
+        stored entry is returned instead, marked with "Stale": True, and
+        nothing new is stored.
 
     """
-    # Create an instance of the OpenWeatherMap API
-    owm = pyowm.OWM(os.getenv("OPENWEATHER_API_KEY"))
+    # Retrieve the current weather data from the configured provider
+    try:
+        weather_data = _weather_data(get_provider().fetch(city))
+    except CircuitOpenError:
+        # Serve the last stored observation while the API is unavailable
+        weather_data = lastWeather(city)
+        if weather_data is None:
+            raise
+        weather_data["Stale"] = True
+        return weather_data
 
-    # Retrieve the current weather for the specified city
-    observation = owm.weather_manager().weather_at_place(city)
+    # Add the new data to the SQLite3 database
+    if store:
+        _store(weather_data)
 
-    # Return the observation object
-    return observation
+    return weather_data
 
 
-# Function to get the weather for a specific city and store it in the database
-def getWeather(city):
+# Function to get the weather for many cities in as few requests as possible
+def getWeatherBatch(cities):
     """
-    Retrieves the current weather for the specified city and stores it in the database.
+    Retrieves the current weather for many cities and stores it in the database.
+
+    With the OpenWeatherMap provider, city names are resolved to city IDs once
+    (offline, through pyowm's bundled registry, and cached on disk), and the
+    IDs are fetched through the group endpoint, 20 cities per request. Chunks
+    are fetched concurrently on the shared thread pool. Cities missing from
+    the batch, or every city if the batch fails, fall back to a regular
+    per-city getWeather call. The whole
+    round is stored in a single transaction.
 
     Parameters
     ----------
-    city : str
-        The city for which to retrieve the weather data.
+    cities : list of str
+        The cities for which to retrieve the weather data.
 
     Returns
     -------
-    weather_data : dict
-        A dictionary containing the current weather data for the specified city.
+    data : list
+        A list of dictionaries with the current weather data of every city
+        that was fetched successfully.
 
     """
-    # Call the OpenWeatherMap API and retrieve the current weather data
-    data = owm_api_call(city)
+    try:
+        records = get_provider().fetch_many(cities, pool=_get_fetch_pool())
+    except Exception as e:
+        # Fall back to fetching every city on its own
+        print(f"Failed to fetch a batch of cities: {e!r}")
+        records = {}
+
+    data = [_weather_data(record) for record in records.values()]
+
+    # Cities that could not be resolved or were missing from the group response
+    fetched = {weather_data["City"] for weather_data in data}
+    for city in cities:
+        if city not in fetched:
+            try:
+                data.append(getWeather(city, store=False))
+            except Exception as e:
+                print(f"Failed to fetch {city}: {e!r}")
+
+    addWeatherMany(weather_data for weather_data in data if not weather_data.get("Stale"))
 
-    # Extract the relevant weather data from the observation object
-    weather_data = {
-        "City": city,
-        "DateTime": datetime.datetime.now(),
-        "Temperature": data.weather.temperature("celsius")["temp"],
-        "Temperature_max": data.weather.temperature("celsius")["temp_max"],
-        "Temperature_min": data.weather.temperature("celsius")["temp_min"],
-        "Weather": data.weather.detailed_status,
-        "Feels_like": data.weather.temperature("celsius")["feels_like"],
-        "Wind_Speed": data.weather.wind()['speed'],
-        "Humidity": data.weather.humidity
-    }
+    return data
 
-    # Add the new data to the SQLite3 database
-    addWeather(
-        weather_data["City"], weather_data["DateTime"], weather_data["Temperature"],
-        weather_data["Temperature_max"], weather_data["Temperature_min"],
-        weather_data["Weather"], weather_data["Feels_like"],
-        weather_data["Wind_Speed"], weather_data["Humidity"]
-    )
 
-    return weather_data
+# Function to get the thread pool used for concurrent fetching
+def _get_fetch_pool():
+    """Return the long-lived thread pool used by fetchCities."""
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=MAX_FETCH_WORKERS, thread_name_prefix="owm-fetch")
+    return _fetch_pool
+
+
+# Function to fetch a single city and measure how long it took
+def _timed_getWeather(city):
+    """Run getWeather for a city without storing it and return its data, the latency and the error if it failed."""
+    start = time.perf_counter()
+    try:
+        return getWeather(city, store=False), time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, e
+
+
+# Function to fetch the weather for several cities concurrently
+def fetchCities(cities, timeout=None):
+    """
+    Fetch and store the weather for several cities concurrently.
+
+    Each city is fetched on the shared thread pool. A failing city does not
+    affect the others, and cities that have not finished once `timeout`
+    seconds have passed are reported as timed out instead of holding up the
+    whole round (their requests keep running in the background, but their
+    results are dropped). The fetched cities are stored together in a single
+    transaction.
+
+    Parameters
+    ----------
+    cities : list of str
+        The cities for which to fetch the weather data.
+    timeout : float, optional
+        The maximum number of seconds to wait for the round, by default no limit.
+
+    Returns
+    -------
+    data : list
+        A list of dictionaries with the weather data of every city that was
+        fetched successfully.
+    report : list
+        A list of dictionaries, one per city, with the keys City, Latency
+        (seconds, None if the city timed out) and Error (None on success).
+
+    """
+    pool = _get_fetch_pool()
+    futures = {pool.submit(_timed_getWeather, city): city for city in cities}
+    results = {}
+
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=timeout):
+            city = futures[future]
+            weather_data, latency, error = future.result()
+            results[city] = (weather_data, {"City": city, "Latency": latency,
+                                            "Error": None if error is None else repr(error)})
+    except concurrent.futures.TimeoutError:
+        pass
+
+    data = []
+    report = []
+    for city in cities:
+        weather_data, city_report = results.get(
+            city, (None, {"City": city, "Latency": None, "Error": "Timed out"}))
+        if weather_data is not None:
+            data.append(weather_data)
+        report.append(city_report)
+
+    addWeatherMany(weather_data for weather_data in data if not weather_data.get("Stale"))
+
+    return data, report
+
+
+# Function to get the per-city polling scheduler
+def get_scheduler():
+    """
+    Return the process-wide polling scheduler, creating it on first use.
+
+    The tracked cities (see track_cities, by default every city in the
+    registry) fall due one base interval after their latest stored
+    observation, or immediately if they have none.
+
+    Returns
+    -------
+    PollScheduler
+        The shared scheduler.
+
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _pool_lock:
+            if _scheduler is None:
+                scheduler = PollScheduler(warning_threshold=WARNING_THRESHOLD)
+                last_updates = lastUpdates()
+                for city in _tracked_cities or city_names():
+                    last_update = last_updates.get(city)
+                    scheduler.add(city, last_update.timestamp() if last_update else None)
+                _scheduler = scheduler
+    return _scheduler
+
+
+# Function to choose the cities callCities fetches
+def track_cities(cities):
+    """
+    Restrict the cities fetched by callCities, e.g. to one worker's shard.
+
+    Parameters
+    ----------
+    cities : list of str or None
+        The cities to track, or None for every city in the registry.
+
+    """
+    global _scheduler, _tracked_cities
+    with _pool_lock:
+        _tracked_cities = list(cities) if cities is not None else None
+        _scheduler = None
 
 
 # Function to iterate over cities and fetch weather if required
-def callCities():
+def callCities(mode=None, timeout=None):
     """
     Iterate over cities and fetch weather data if required.
 
-    The function checks if the last update was more than 5 minutes ago
-    and if so, it fetches the weather data for the specified cities.
-    The obtained data is added to the SQLite3 database.
+    Only the cities the polling scheduler reports as due are fetched, so
+    every city refreshes on its own adaptive interval and a city whose fetch
+    failed is retried early. The obtained data is added to the SQLite3
+    database.
 
     Parameters
     ----------
-    None
+    mode : str, optional
+        How to fetch the round, by default FETCH_MODE:
+        "concurrent" fetches the cities in parallel on a shared thread pool,
+        "batch" fetches them by city ID through the group endpoint and
+        "sequential" fetches them one after another.
+    timeout : float, optional
+        The maximum number of seconds to wait for a concurrent round.
 
     Returns
     -------
@@ -96,19 +285,50 @@ def callCities():
         for the specified city.
 
     """
-    CITIES = ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]
+    scheduler = get_scheduler()
+    due = scheduler.due()
     data = []
 
-    # Check if the last update was more than 5 minutes ago
-    if shouldUpdateWeather():
-        print("Updating weather data...")
-        # Fetch weather data for each city
-        for city in CITIES:
-            data.append(getWeather(city))
-        # Drop data before 24 hours
-        dropDataBefore24Hours()
-    else:
-        print("Skipping, last update was less than 5 minutes ago.")
+    if not due:
+        print("Skipping, no city is due for an update.")
+        return data
+
+    print(f"Updating weather data for {', '.join(due)}...")
+    mode = mode or FETCH_MODE
+    fetched = {}
+    try:
+        if mode == "batch":
+            data = getWeatherBatch(due)
+        elif mode == "concurrent":
+            # Fetch weather data for all due cities at once
+            data, report = fetchCities(due, timeout=timeout)
+            for entry in report:
+                if entry["Error"]:
+                    print(f"Failed to fetch {entry['City']}: {entry['Error']}")
+                else:
+                    print(f"Fetched {entry['City']} in {entry['Latency']:.3f}s")
+        else:
+            # Fetch weather data for each city
+            for city in due:
+                try:
+                    data.append(getWeather(city, store=False))
+                except Exception as e:
+                    print(f"Failed to fetch {city}: {e!r}")
+            addWeatherMany(weather_data for weather_data in data if not weather_data.get("Stale"))
+        fetched = {weather_data["City"]: weather_data for weather_data in data if not weather_data.get("Stale")}
+    finally:
+        # Reschedule every due city according to the outcome of its fetch. If the round
+        # raised, e.g. because the database was locked, every due city counts as failed,
+        # so none stays marked as in flight
+        for city in due:
+            if city in fetched:
+                scheduler.record_success(city, fetched[city]["Temperature"])
+            else:
+                scheduler.record_failure(city)
+
+    # Evaluate the alert rules over the new readings, for the tracked cities only
+    for change in get_alert_engine(_tracked_cities).ingest(fetched.values()):
+        print(f"Alert {change['Rule']} {'raised' if change['Active'] else 'cleared'} for {change['City']}")
 
     return data
 
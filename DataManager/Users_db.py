@@ -1,4 +1,38 @@
-import sqlite3
+import csv
+import itertools
+import re
+
+from DataManager.db import DATA_DB, USERS_DB, get_connection, transaction
+from DataManager.migrations import migrate
+
+# Rows written per transaction by import_subscribers and unsubscribe_many
+IMPORT_BATCH_SIZE = 5000
+
+# Recipients per group yielded by subscribers_by_city
+FANOUT_BATCH_SIZE = 500
+
+# Columns a subscriber CSV must have
+IMPORT_COLUMNS = ["UserName", "Mail", "City"]
+
+# Loose check of an email address: one @, no spaces, and a dot in the domain
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]+")
+
+# Insert a subscriber, or move an existing one (by Mail) to their new city
+SUBSCRIBE_SQL = """
+    INSERT INTO users (UserName, Mail, City) VALUES (?, ?, ?)
+    ON CONFLICT (Mail) DO UPDATE SET City = excluded.City
+"""
+
+# Schema migrations of the users database, applied in order by initialize_db
+MIGRATIONS = [
+    # 1: the original 'users' table
+    ['''CREATE TABLE IF NOT EXISTS users (
+           UserName TEXT, 
+           Mail TEXT UNIQUE, 
+           City TEXT)'''],
+    # 2: covering index for looking subscribers up by city
+    ["CREATE INDEX IF NOT EXISTS users_city ON users (City, UserName, Mail)"],
+]
 
 
 # Initialize the SQLite database and create the 'users' table if it doesn't exist
@@ -7,30 +41,20 @@ def initialize_db():
 
     This function creates a SQLite database named 'Users.db' and creates a table named
     'users' with columns for the user's name, email, and preferred city. The email column
-    is marked as unique to ensure that each user's email is unique.
+    is marked as unique to ensure that each user's email is unique. The schema is
+    brought up to date by applying the pending MIGRATIONS.
     """
-    # Connect to the database and create a cursor
-    conn = sqlite3.connect('Users.db')
-    c = conn.cursor()
-
-    # Create the 'users' table if it doesn't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                 UserName TEXT, 
-                 Mail TEXT UNIQUE, 
-                 City TEXT)''')
-
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    # Create the 'users' table and its indexes, or bring them up to date
+    migrate(USERS_DB, MIGRATIONS)
 
 
 # Subscribe a user by adding them to the database or updating their city
 def subscribe(UserName, Mail, City):
     """Subscribe a user by adding them to the database or updating their city.
 
-    This function checks if the user already exists in the database. If the user
-    exists, it updates their city. If the user does not exist, it creates a new
-    record with the given information.
+    This function inserts a new record with the given information, or, if
+    a user with this email address already exists, updates their city. Both
+    cases are one UPSERT on the unique Mail column.
 
     Parameters
     ----------
@@ -41,47 +65,111 @@ def subscribe(UserName, Mail, City):
     City : str
         The preferred city of the user to subscribe.
     """
-    # Connect to the database and create a cursor
-    conn = sqlite3.connect('Users.db')
-    c = conn.cursor()
-
-    # Check if the user already exists
-    c.execute("SELECT * FROM users WHERE Mail = ?", (Mail,))
-    existing_user = c.fetchone()
-
-    if existing_user:
-        # User exists, update the city
-        c.execute("UPDATE users SET City = ? WHERE Mail = ?", (City, Mail))
-    else:
-        # User does not exist, insert a new record
-        c.execute("INSERT INTO users (UserName, Mail, City) VALUES (?, ?, ?)", (UserName, Mail, City))
-
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    # One statement, so there is no window between the check and the write
+    with transaction(USERS_DB) as conn:
+        conn.execute(SUBSCRIBE_SQL, (UserName, Mail, City))
 
 
 # Unsubscribe a user by removing their record from the database
 def unsubscribe(Mail):
     """Unsubscribe a user by removing their record from the database.
 
-    This function first checks if the user exists in the database. If the user
-    exists, it deletes the record.
+    This function deletes the user's record, if there is one.
     """
-    conn = sqlite3.connect('Users.db')
-    c = conn.cursor()
+    with transaction(USERS_DB) as conn:
+        # Deleting a user who does not exist does nothing
+        conn.execute("DELETE FROM users WHERE Mail = ?", (Mail,))
+
+
+# Import subscribers from a CSV file in bulk
+def import_subscribers(source, cities=None, batch_size=IMPORT_BATCH_SIZE):
+    """Subscribe every user listed in a CSV file.
+
+    The file is read row by row and written with executemany, `batch_size`
+    rows per transaction, so a list of any length is imported in bounded
+    memory. Each row is subscribed as by subscribe: existing users (by
+    email address) are moved to the listed city. Rows without a valid email
+    address or a city are skipped and reported.
+
+    Parameters
+    ----------
+    source : str or file object
+        The path of the CSV file, or the file opened in text mode. Its
+        header must name the columns UserName, Mail and City; other columns
+        are ignored.
+    cities : collection of str, optional
+        The cities users may subscribe to, by default any city.
+    batch_size : int, optional
+        Rows written per transaction, by default IMPORT_BATCH_SIZE.
+
+    Returns
+    -------
+    tuple of (int, list)
+        The number of rows imported, and the skipped rows as (line number,
+        reason) tuples.
 
-    # Check if the user exists
-    c.execute("SELECT * FROM users WHERE Mail = ?", (Mail,))
-    existing_user = c.fetchone()
+    Raises
+    ------
+    ValueError
+        If the header lacks one of the IMPORT_COLUMNS.
+    """
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as file:
+            return import_subscribers(file, cities, batch_size)
 
-    if existing_user:
-        # User exists, delete the record
-        c.execute("DELETE FROM users WHERE Mail = ?", (Mail,))
+    reader = csv.DictReader(source)
+    missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Subscriber CSV lacks the column(s) {', '.join(missing)}")
 
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    rejected = []
+
+    def valid_rows():
+        for row in reader:
+            mail = (row["Mail"] or "").strip()
+            city = (row["City"] or "").strip()
+            if not EMAIL_PATTERN.fullmatch(mail):
+                rejected.append((reader.line_num, f"invalid email address {mail!r}"))
+            elif not city or (cities is not None and city not in cities):
+                rejected.append((reader.line_num, f"unknown city {city!r}"))
+            else:
+                yield (row["UserName"] or "").strip(), mail, city
+
+    rows = valid_rows()
+    imported = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return imported, rejected
+        with transaction(USERS_DB) as conn:
+            conn.executemany(SUBSCRIBE_SQL, batch)
+        imported += len(batch)
+
+
+# Unsubscribe many users at once
+def unsubscribe_many(Mails, batch_size=IMPORT_BATCH_SIZE):
+    """Unsubscribe every user in a list of email addresses.
+
+    Parameters
+    ----------
+    Mails : iterable of str
+        The email addresses to unsubscribe; unknown ones are ignored.
+    batch_size : int, optional
+        Addresses deleted per transaction, by default IMPORT_BATCH_SIZE.
+
+    Returns
+    -------
+    int
+        The number of users unsubscribed.
+    """
+    mails = ((mail.strip(),) for mail in Mails)
+    removed = 0
+    while True:
+        batch = list(itertools.islice(mails, batch_size))
+        if not batch:
+            return removed
+        with transaction(USERS_DB) as conn:
+            removed += conn.executemany("DELETE FROM users WHERE Mail = ?", batch).rowcount
 
 
 # Retrieve and return a list of users in a specific city
@@ -103,13 +191,79 @@ def get_users_by_city(city):
         A list of tuples, where each tuple contains the user's name and email
         address.
     """
-    # Connect to the SQLite database
-    conn = sqlite3.connect('Users.db')
+    # Get the thread's connection to the SQLite database
+    conn = get_connection(USERS_DB)
     c = conn.cursor()
 
     # Fetch users based on the specified city
     c.execute("SELECT UserName, Mail FROM users WHERE City = ?", (city,))
     users = c.fetchall()
-    conn.close()
 
     return users
+
+
+def _attach_weather(conn):
+    # Attach the weather database, whose 'alerts' table holds the alert state, once per connection
+    attached = [name for _, name, _ in conn.execute("PRAGMA database_list")]
+    if "weather" not in attached:
+        conn.execute("ATTACH DATABASE ? AS weather", (DATA_DB,))
+
+
+# Stream the subscribers of many cities, grouped by city
+def subscribers_by_city(cities=None, alerting=False, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Stream the subscribers of a set of cities in groups of one city each.
+
+    The subscribers are read by a single query, in City order from the
+    covering users_city index, and fetched `batch_size` at a time, so the
+    whole table is never held in memory. A city with more than `batch_size`
+    subscribers comes in several consecutive groups.
+
+    Parameters
+    ----------
+    cities : collection of str, optional
+        The cities whose subscribers to return, by default all of them.
+    alerting : bool, optional
+        If True, only cities with an active alert in the weather database
+        (see alerts.py) are returned, joined in the same query.
+    batch_size : int, optional
+        The largest number of recipients per group, by default
+        FANOUT_BATCH_SIZE.
+
+    Yields
+    ------
+    tuple of (str, list)
+        A city and a list of (UserName, Mail) tuples of its subscribers, as
+        returned by get_users_by_city.
+    """
+    conn = get_connection(USERS_DB)
+    conditions = []
+    params = []
+    if cities is not None:
+        cities = list(cities)
+        conditions.append(f"City IN ({', '.join('?' * len(cities))})")
+        params.extend(cities)
+    if alerting:
+        _attach_weather(conn)
+        conditions.append("City IN (SELECT City FROM weather.alerts WHERE Active = 1)")
+
+    c = conn.execute(f"""
+        SELECT City, UserName, Mail
+        FROM users
+        WHERE {' AND '.join(conditions) or '1'}
+        ORDER BY City
+    """, params)
+
+    city, recipients = None, []
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        for row_city, user, mail in rows:
+            if row_city != city or len(recipients) == batch_size:
+                if recipients:
+                    yield city, recipients
+                city, recipients = row_city, []
+            recipients.append((user, mail))
+    if recipients:
+        yield city, recipients
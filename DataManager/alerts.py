@@ -0,0 +1,338 @@
+import json
+import operator
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from .db import DATA_DB, get_connection, transaction
+from .weather_db import RETENTION_HOURS, WARNING_THRESHOLD, queryWeather, to_epoch
+
+# Config file listing the alert rules
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE", "alert_rules.json")
+
+# Rules used when no config file is present: the original heat warning
+DEFAULT_RULES = [
+    {"name": "heat", "metric": "Temperature", "op": ">", "threshold": WARNING_THRESHOLD, "consecutive": 2},
+]
+
+# Metrics rules can test (weather table columns), mapped to their key in the records produced by DataGen
+METRICS = {
+    "Temperature": "Temperature",
+    "feels_like": "Feels_like",
+    "Humidity": "Humidity",
+    "Wind_Speed": "Wind_Speed",
+}
+
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+AGGREGATES = {"mean": np.nanmean, "max": np.nanmax, "min": np.nanmin}
+
+_engine_lock = threading.Lock()
+_engine = None
+
+
+class AlertRule:
+    """
+    Condition on the recent readings of a metric.
+
+    With `window`, the rule is active while the aggregate of the last
+    `window` readings passes the threshold; otherwise while each of the last
+    `consecutive` readings does.
+
+    Parameters
+    ----------
+    name : str
+        The name of the rule, unique within the rule set.
+    metric : str
+        The metric tested, a key of METRICS.
+    op : str
+        The comparison with the threshold, a key of OPERATORS.
+    threshold : float
+        The threshold.
+    consecutive : int, optional
+        Readings in a row that must pass, by default 1.
+    window : int, optional
+        Readings aggregated for a rolling-window rule.
+    aggregate : str, optional
+        The aggregate of a rolling-window rule, a key of AGGREGATES, by default "mean".
+    cities : list of str, optional
+        The cities the rule applies to, by default all of them.
+    """
+
+    def __init__(self, name, metric, op, threshold, consecutive=1, window=None, aggregate="mean", cities=None):
+        if metric not in METRICS:
+            raise ValueError(f"Rule {name!r}: unknown metric {metric!r}")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name!r}: unknown operator {op!r}")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Rule {name!r}: unknown aggregate {aggregate!r}")
+        if (window or consecutive) < 1:
+            raise ValueError(f"Rule {name!r}: at least one reading must be tested")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.consecutive = consecutive
+        self.window = window
+        self.aggregate = aggregate
+        self.cities = set(cities) if cities is not None else None
+
+    @property
+    def length(self):
+        """The number of recent readings the rule looks at."""
+        return self.window or self.consecutive
+
+
+# Load the alert rules from the config file
+def load_rules(path=None):
+    """
+    Load the alert rules.
+
+    The config file is a JSON list of objects with the parameters of
+    AlertRule.
+
+    Parameters
+    ----------
+    path : str, optional
+        The config file, by default ALERT_RULES_FILE.
+
+    Returns
+    -------
+    list of AlertRule
+        The rules, DEFAULT_RULES if the file does not exist.
+    """
+    path = path or ALERT_RULES_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        entries = DEFAULT_RULES
+    return [AlertRule(**entry) for entry in entries]
+
+
+class AlertEngine:
+    """
+    Evaluates alert rules over ring buffers of the recent readings of every city.
+
+    Readings are kept in one array of shape (cities, capacity, metrics), so
+    every rule is evaluated for all cities at once with a few vectorized
+    operations. Only changes of alert state are written to the 'alerts'
+    table, from which readers look them up.
+
+    Parameters
+    ----------
+    rules : list of AlertRule
+        The rules to evaluate.
+    path : str, optional
+        The weather database holding the 'alerts' table, by default DATA_DB.
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    cities : list of str, optional
+        The cities the engine evaluates, e.g. those of one worker's shard,
+        by default every city it is given readings of. Readings of other
+        cities are ignored, so their alert states are left to their owner.
+    """
+
+    def __init__(self, rules, path=DATA_DB, clock=time.time, cities=None):
+        if len({rule.name for rule in rules}) != len(rules):
+            raise ValueError("Alert rule names must be unique")
+        self.rules = rules
+        self.path = path
+        self.clock = clock
+        self.cities = frozenset(cities) if cities is not None else None
+        self.capacity = max([rule.length for rule in rules], default=1)
+        self._metrics = list(METRICS)
+        self._cities = {}
+        self._buffers = np.full((0, self.capacity, len(self._metrics)), np.nan)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._last_times = {}
+        self._lock = threading.Lock()
+        rows = get_connection(path).execute("SELECT City, Rule, Active FROM alerts").fetchall()
+        self._state = {(city, rule): bool(active) for city, rule, active in rows}
+
+    def _row(self, city):
+        # Index of a city in the buffers, growing them for a new city
+        row = self._cities.get(city)
+        if row is None:
+            row = self._cities[city] = len(self._cities)
+            self._buffers = np.concatenate(
+                [self._buffers, np.full((1, self.capacity, len(self._metrics)), np.nan)])
+            self._positions = np.append(self._positions, 0)
+            self._counts = np.append(self._counts, 0)
+        return row
+
+    def push(self, records):
+        """
+        Append readings to the ring buffers.
+
+        Readings that are not newer than the last one of their city (the same
+        observation fetched twice, for instance) or of a city the engine does
+        not evaluate are skipped.
+
+        Parameters
+        ----------
+        records : iterable of dict
+            Weather records as produced by DataGen, in chronological order
+            per city.
+        """
+        with self._lock:
+            for record in records:
+                city = record["City"]
+                if self.cities is not None and city not in self.cities:
+                    continue
+                observed = to_epoch(record["DateTime"])
+                if observed <= self._last_times.get(city, -1):
+                    continue
+                self._last_times[city] = observed
+                row = self._row(city)
+                self._buffers[row, self._positions[row]] = [
+                    np.nan if record.get(key) is None else record[key] for key in METRICS.values()]
+                self._positions[row] = (self._positions[row] + 1) % self.capacity
+                self._counts[row] = min(self._counts[row] + 1, self.capacity)
+
+    def _recent(self, length):
+        # The last `length` readings of every city, oldest first: shape (cities, length, metrics)
+        offsets = np.arange(-length, 0)
+        slots = (self._positions[:, None] + offsets) % self.capacity
+        return self._buffers[np.arange(len(self._cities))[:, None], slots]
+
+    def evaluate(self):
+        """
+        Evaluate every rule for every city and persist the alert state changes.
+
+        Returns
+        -------
+        list of dict
+            The changes, with the keys City, Rule, Active and Value (the
+            latest reading of the rule's metric).
+        """
+        with self._lock:
+            cities = list(self._cities)
+            changes = []
+            for rule in self.rules:
+                column = self._metrics.index(rule.metric)
+                readings = self._recent(rule.length)[:, :, column]
+                compare = OPERATORS[rule.op]
+                if rule.window:
+                    # Cities without readings of the metric aggregate to NaN, which fails every comparison
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore", RuntimeWarning)
+                        passed = compare(AGGREGATES[rule.aggregate](readings, axis=1), rule.threshold)
+                else:
+                    passed = compare(readings, rule.threshold).all(axis=1)
+                active = passed & (self._counts >= rule.length)
+                if rule.cities is not None:
+                    active &= np.isin(cities, list(rule.cities))
+
+                for row in np.flatnonzero(active != self._previous(cities, rule.name)):
+                    city = cities[row]
+                    self._state[(city, rule.name)] = bool(active[row])
+                    latest = readings[row, -1]
+                    changes.append({"City": city, "Rule": rule.name, "Active": bool(active[row]),
+                                    "Value": None if np.isnan(latest) else float(latest)})
+
+            if changes:
+                now = int(self.clock())
+                with transaction(self.path) as conn:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO alerts (City, Rule, Active, Since, Value)
+                        VALUES (:City, :Rule, :Active, :Since, :Value)
+                    """, [{**change, "Since": now} for change in changes])
+            return changes
+
+    def _previous(self, cities, rule):
+        # Current alert state of a rule for every city
+        return np.array([self._state.get((city, rule), False) for city in cities], dtype=bool)
+
+    def ingest(self, records):
+        """
+        Push the readings of an ingestion round and evaluate the rules.
+
+        Parameters
+        ----------
+        records : iterable of dict
+            Weather records as produced by DataGen.
+
+        Returns
+        -------
+        list of dict
+            The alert state changes, as returned by evaluate.
+        """
+        self.push(records)
+        return self.evaluate()
+
+    def warm_up(self, cities=None):
+        """
+        Fill the ring buffers with the stored readings of the last RETENTION_HOURS.
+
+        Parameters
+        ----------
+        cities : list of str, optional
+            The cities to load, by default those the engine evaluates.
+        """
+        if cities is None and self.cities is not None:
+            cities = sorted(self.cities)
+        df = queryWeather(cities=cities, start=int(self.clock()) - RETENTION_HOURS * 3600,
+                          columns=["City", "DateTime", *METRICS])
+        df = df.rename(columns={metric: key for metric, key in METRICS.items()})
+        self.push({**record, "DateTime": record["DateTime"].to_pydatetime()}
+                  for record in df.to_dict("records"))
+
+
+# Get the alert engine evaluated after each ingestion round
+def get_alert_engine(cities=None):
+    """
+    Return the process-wide alert engine, creating it on first use.
+
+    The engine evaluates the rules of load_rules and starts from the stored
+    readings of the last RETENTION_HOURS. It is built again if asked for
+    other cities, e.g. after a worker has been given its shard.
+
+    Parameters
+    ----------
+    cities : list of str, optional
+        The cities to evaluate, by default every city.
+
+    Returns
+    -------
+    AlertEngine
+        The shared engine.
+    """
+    global _engine
+    cities = frozenset(cities) if cities is not None else None
+    if _engine is None or _engine.cities != cities:
+        with _engine_lock:
+            if _engine is None or _engine.cities != cities:
+                engine = AlertEngine(load_rules(), cities=cities)
+                engine.warm_up()
+                _engine = engine
+    return _engine
+
+
+# Get the active alerts
+def activeAlerts(city=None):
+    """
+    Return the active alerts, as persisted by the alert engine.
+
+    Parameters
+    ----------
+    city : str, optional
+        The city to return the alerts of, by default all of them.
+
+    Returns
+    -------
+    list of dict
+        One dictionary per active alert with the keys City, Rule, Since
+        (Unix time the alert became active) and Value.
+    """
+    conn = get_connection(DATA_DB)
+    if city is None:
+        rows = conn.execute("SELECT City, Rule, Since, Value FROM alerts WHERE Active = 1").fetchall()
+    else:
+        rows = conn.execute("SELECT City, Rule, Since, Value FROM alerts WHERE City = ? AND Active = 1",
+                            (city,)).fetchall()
+    return [dict(zip(["City", "Rule", "Since", "Value"], row)) for row in rows]
@@ -0,0 +1,156 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+
+# Config file listing the monitored cities
+CITIES_FILE = os.getenv("CITIES_FILE", "cities.json")
+
+# Cities monitored when no config file is present
+DEFAULT_CITIES = ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]
+
+# Number of points each shard gets on the consistent hash ring
+RING_REPLICAS = 100
+
+_lock = threading.Lock()
+_cache = {}
+
+
+# Load the city registry from the config file
+def load_registry(path=None):
+    """
+    Load the registry of monitored cities.
+
+    The config file is a JSON list whose entries are either a city name or an
+    object with the keys "name" and, optionally, "id" (the OpenWeatherMap
+    city ID) and "country". The parsed registry is cached until the file
+    changes on disk.
+
+    Parameters
+    ----------
+    path : str, optional
+        The config file, by default CITIES_FILE.
+
+    Returns
+    -------
+    list of dict
+        One dictionary per city with the keys name, id (None if unknown)
+        and country (None if unknown), in file order.
+    """
+    path = path or CITIES_FILE
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return [{"name": name, "id": None, "country": None} for name in DEFAULT_CITIES]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        registry = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"name": entry}
+            registry.append({"name": entry["name"], "id": entry.get("id"), "country": entry.get("country")})
+        _cache[path] = (mtime, registry)
+        return registry
+
+
+# Get the names of the monitored cities
+def city_names(path=None):
+    """
+    Return the names of the monitored cities.
+
+    Parameters
+    ----------
+    path : str, optional
+        The config file, by default CITIES_FILE.
+
+    Returns
+    -------
+    list of str
+        The city names, in registry order.
+    """
+    return [entry["name"] for entry in load_registry(path)]
+
+
+# Get the OWM city IDs known to the registry
+def registry_ids(path=None):
+    """
+    Return the OpenWeatherMap city IDs listed in the registry.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping city names to city IDs, for the entries that
+        have one.
+    """
+    return {entry["name"]: int(entry["id"]) for entry in load_registry(path) if entry["id"] is not None}
+
+
+def _hash(key):
+    # Stable across processes and hosts, unlike the built-in hash()
+    return int.from_bytes(hashlib.md5(str(key).encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring assigning keys to shards.
+
+    Adding or removing a shard only moves the keys of the neighbouring ring
+    segments, so most cities keep their worker when the worker count changes.
+
+    Parameters
+    ----------
+    shards : int
+        The number of shards.
+    replicas : int, optional
+        Points per shard on the ring, by default RING_REPLICAS.
+    """
+
+    def __init__(self, shards, replicas=RING_REPLICAS):
+        if shards < 1:
+            raise ValueError("The number of shards must be at least 1")
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}-{replica}"), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_of(self, key):
+        """Return the shard owning a key."""
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+# Get the cities handled by one shard
+def cities_for_shard(shard, shards, path=None):
+    """
+    Return the cities one ingestion worker is responsible for.
+
+    Cities are assigned by consistent hash of their city ID (or name, if the
+    ID is unknown), so every city belongs to exactly one shard.
+
+    Parameters
+    ----------
+    shard : int
+        The index of the shard, from 0 to shards - 1.
+    shards : int
+        The total number of shards.
+    path : str, optional
+        The config file, by default CITIES_FILE.
+
+    Returns
+    -------
+    list of str
+        The names of the cities owned by the shard.
+    """
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} is out of range for {shards} shards")
+    ring = HashRing(shards)
+    return [entry["name"] for entry in load_registry(path)
+            if ring.shard_of(entry["id"] if entry["id"] is not None else entry["name"]) == shard]
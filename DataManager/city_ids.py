@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import threading
+
+# File in which resolved city IDs are cached between runs
+CITY_IDS_FILE = os.getenv("CITY_IDS_FILE", "city_ids.json")
+
+_lock = threading.Lock()
+
+
+# Load the cached city name -> OWM city ID mapping from disk
+def load_city_ids(path=None):
+    """
+    Load the cached mapping of city names to OpenWeatherMap city IDs.
+
+    Parameters
+    ----------
+    path : str, optional
+        The cache file to read, by default CITY_IDS_FILE.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping city names to integer city IDs. Empty if the
+        cache file does not exist or cannot be read.
+    """
+    path = path or CITY_IDS_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {city: int(city_id) for city, city_id in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+# Save the city name -> OWM city ID mapping to disk
+def save_city_ids(city_ids, path=None):
+    """
+    Save the mapping of city names to OpenWeatherMap city IDs to disk.
+
+    The file is written to a temporary file of its own first and then moved
+    into place, so neither a crash nor another process saving at the same
+    time leaves a half-written cache behind.
+
+    Parameters
+    ----------
+    city_ids : dict
+        A dictionary mapping city names to integer city IDs.
+    path : str, optional
+        The cache file to write, by default CITY_IDS_FILE.
+    """
+    path = path or CITY_IDS_FILE
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(city_ids, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# Resolve city names to OWM city IDs using pyowm's bundled registry
+def resolve_city_ids(cities, registry, country=None, path=None, known=None):
+    """
+    Resolve city names to OpenWeatherMap city IDs.
+
+    Names already present in the on-disk cache are returned straight from it.
+    The remaining names are looked up in pyowm's bundled city ID registry
+    (no network request is made) and the cache is updated with the results.
+
+    Parameters
+    ----------
+    cities : list of str
+        The city names to resolve.
+    registry : pyowm.commons.cityidregistry.CityIDRegistry or callable or None
+        The registry used to look up names missing from the cache, or a
+        function returning it, called only if a name is missing (building
+        pyowm's registry is slow and may fail). None leaves missing names
+        unresolved.
+    country : str, optional
+        Two-letter country code used to pick between cities sharing a name.
+    path : str, optional
+        The cache file to use, by default CITY_IDS_FILE.
+    known : dict, optional
+        City IDs that are already known (e.g. from the city registry); they
+        take precedence over the cache and the lookup.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping every resolvable city name to its city ID.
+        Names that the registry does not know are left out.
+    """
+    known = known or {}
+    with _lock:
+        city_ids = {**load_city_ids(path), **known}
+        missing = [city for city in cities if city not in city_ids]
+
+        if missing and registry is not None:
+            if not hasattr(registry, "ids_for"):
+                registry = registry()
+            for city in missing:
+                matches = registry.ids_for(city, country=country, matching="exact")
+                if not matches and country:
+                    # Fall back to a match in any country
+                    matches = registry.ids_for(city, matching="exact")
+                if matches:
+                    city_ids[city] = int(matches[0][0])
+            # Another process may have saved IDs since the cache was read
+            save_city_ids({**load_city_ids(path), **city_ids}, path)
+
+    return {city: city_ids[city] for city in cities if city in city_ids}
@@ -0,0 +1,100 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+# Database files used by the DataManager modules
+DATA_DB = os.getenv("WEATHER_DB", "Data.db")
+REPORT_DB = os.getenv("REPORT_DB", "report.db")
+USERS_DB = os.getenv("USERS_DB", "Users.db")
+
+# Page cache per connection, in KiB
+CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_KIB", 32768))
+
+# Bytes of each database file mapped into memory
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+# Milliseconds a connection waits for a lock before raising "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+_local = threading.local()
+
+
+def _configure(conn):
+    # WAL lets readers and the writer work at the same time; with WAL,
+    # synchronous=NORMAL only syncs on checkpoints and is still crash-safe
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+# Get the calling thread's connection to a database
+def get_connection(path):
+    """
+    Return the calling thread's persistent connection to a database.
+
+    Connections are opened once per thread, process and database file, and
+    configured for concurrent use (WAL journal, synchronous=NORMAL, a sized
+    page cache, memory-mapped I/O and a busy timeout), so the Streamlit
+    readers and the ingestion worker do not block each other. Do not close
+    the returned connection; use close_connections instead.
+
+    Parameters
+    ----------
+    path : str
+        The database file, usually DATA_DB, REPORT_DB or USERS_DB.
+
+    Returns
+    -------
+    sqlite3.Connection
+        The connection.
+    """
+    # Connections must not be shared with a forked child process
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+
+    key = os.path.abspath(path)
+    conn = _local.connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        _configure(conn)
+        _local.connections[key] = conn
+    return conn
+
+
+# Run a block of statements in a single transaction
+@contextlib.contextmanager
+def transaction(path):
+    """
+    Context manager running its block in one transaction on a database.
+
+    The transaction is committed when the block completes and rolled back if
+    it raises.
+
+    Parameters
+    ----------
+    path : str
+        The database file.
+
+    Yields
+    ------
+    sqlite3.Connection
+        The calling thread's connection to the database.
+    """
+    conn = get_connection(path)
+    with conn:
+        yield conn
+
+
+# Close the calling thread's connections
+def close_connections():
+    """Close every connection opened by the calling thread."""
+    if getattr(_local, "pid", None) != os.getpid():
+        return
+    for conn in _local.connections.values():
+        conn.close()
+    _local.connections = {}
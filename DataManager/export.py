@@ -0,0 +1,223 @@
+import csv
+import io
+import zlib
+
+import numpy as np
+
+from .db import REPORT_DB, get_connection
+from .frames import CATEGORY, DATE, UNIX_TIME, local_time
+from .report_db import REPORT_COLUMNS
+from .retention import HISTORY_COLUMNS, TIERS, routeHistory
+from .storage import get_backend
+
+# Rows fetched from the cursor and encoded at a time
+EXPORT_CHUNK_ROWS = 10000
+
+# Datasets that can be exported, with the kinds of their columns
+EXPORT_DATASETS = {
+    "history": HISTORY_COLUMNS,
+    "reports": REPORT_COLUMNS,
+}
+
+# Export formats, with their MIME types
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file collecting what the Parquet writer writes, to be drained between row groups
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _report_query(cities, start, end):
+    # The query reading the daily reports and its parameters
+    conditions = []
+    params = []
+    if cities is not None:
+        conditions.append(f"City IN ({', '.join('?' * len(cities))})")
+        params.extend(cities)
+    if start is not None:
+        conditions.append("DateTime >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append("DateTime < ?")
+        params.append(end.isoformat())
+    sql = f"""
+        SELECT {', '.join(REPORT_COLUMNS)}
+        FROM reports
+        WHERE {' AND '.join(conditions) or '1'}
+        ORDER BY DateTime, City
+    """
+    return sql, params
+
+
+# Stream the rows of a dataset in chunks
+def exportRows(dataset, cities=None, start=None, end=None, resolution=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Read a dataset from its database, `chunk_rows` rows at a time.
+
+    Parameters
+    ----------
+    dataset : str
+        A key of EXPORT_DATASETS: "history" for the weather history, as
+        returned by weatherHistory from the storage backend, or "reports"
+        for the daily reports.
+    cities : list of str, optional
+        The cities to export, by default all of them.
+    start : datetime.datetime or datetime.date, optional
+        The earliest time (history) or date (reports) to export, inclusive.
+    end : datetime.datetime or datetime.date, optional
+        The latest time or date to export, exclusive.
+    resolution : str, optional
+        The resolution of the history, "raw", "hour" or "day", by default
+        chosen by routeHistory.
+    chunk_rows : int, optional
+        Rows per chunk, by default EXPORT_CHUNK_ROWS.
+
+    Yields
+    ------
+    dict
+        The columns of one chunk, by name, as NumPy arrays; history times
+        are naive local datetime64 and report dates ISO text.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Unknown export dataset {dataset!r}, expected one of {', '.join(EXPORT_DATASETS)}")
+    kinds = EXPORT_DATASETS[dataset]
+    if dataset == "history":
+        resolution = resolution or routeHistory(start)
+        if resolution != "raw" and resolution not in TIERS:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected 'raw', 'hour' or 'day'")
+        # Read through the storage backend, which may hold history SQLite no longer has
+        cursors = get_backend().history_cursors(cities, start, end, resolution)
+    else:
+        c = get_connection(REPORT_DB).cursor()
+        c.execute(*_report_query(cities, start, end))
+        cursors = [c]
+
+    for c in cursors:
+        columns = [description[0] for description in c.description]
+        while True:
+            rows = c.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunk = {}
+            for column, values in zip(columns, zip(*rows)):
+                if kinds[column] == UNIX_TIME:
+                    chunk[column] = local_time(values)
+                elif kinds[column] in (CATEGORY, DATE):
+                    chunk[column] = np.array(values, dtype=object)
+                else:
+                    chunk[column] = np.array(values, dtype=np.float64 if kinds[column] == np.float32 else kinds[column])
+            yield chunk
+
+
+def _csv_chunks(chunks, columns):
+    # Encode chunks as CSV text, starting with the header
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        values = []
+        for column in chunk.values():
+            if column.dtype.kind == "M":
+                column = np.char.replace(np.datetime_as_string(column, unit="s"), "T", " ")
+            elif column.dtype.kind == "f":
+                # Missing values are left empty rather than written as nan
+                column = np.where(np.isnan(column), None, column)
+            values.append(column)
+        writer.writerows(zip(*values))
+        yield buffer.getvalue().encode()
+
+
+def _parquet_chunks(chunks, columns, kinds):
+    # Encode chunks as the row groups of a Parquet file
+    # Imported here because pyarrow is only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {CATEGORY: pa.string(), UNIX_TIME: pa.timestamp("s"), DATE: pa.date32()}
+    schema = pa.schema([(column, types.get(kinds[column]) or pa.from_numpy_dtype(np.dtype(kinds[column])))
+                        for column in columns])
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            arrays = [pa.array(chunk[column]).cast(field.type) if kinds[column] == DATE
+                      else pa.array(chunk[column], type=field.type, from_pandas=True)
+                      for column, field in zip(columns, schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# Stream a dataset as an export file
+def streamExport(dataset, fmt="csv", cities=None, start=None, end=None, resolution=None,
+                 chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Stream a dataset as the bytes of a CSV, gzip-compressed CSV or Parquet file.
+
+    Rows are read from the database cursor and encoded `chunk_rows` at a
+    time, each chunk becoming a block of CSV lines or a Parquet row group,
+    so memory use does not depend on the size of the table and the first
+    bytes are ready before the query has been read through.
+
+    Parameters
+    ----------
+    dataset : str
+        "history" or "reports", see exportRows.
+    fmt : str, optional
+        The file format, a key of EXPORT_FORMATS, by default "csv".
+    cities, start, end, resolution, chunk_rows
+        The selection, see exportRows.
+
+    Yields
+    ------
+    bytes
+        The successive parts of the file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Unknown export dataset {dataset!r}, expected one of {', '.join(EXPORT_DATASETS)}")
+    kinds = EXPORT_DATASETS[dataset]
+    chunks = exportRows(dataset, cities, start, end, resolution, chunk_rows)
+    if fmt == "parquet":
+        yield from _parquet_chunks(chunks, list(kinds), kinds)
+        return
+
+    parts = _csv_chunks(chunks, list(kinds))
+    if fmt == "csv":
+        yield from parts
+        return
+
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
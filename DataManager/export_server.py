@@ -0,0 +1,226 @@
+"""An HTTP endpoint streaming exports straight to the browser.
+
+Streamlit cannot answer a download with a stream: st.download_button needs
+the whole file before the button is drawn. The Report page therefore links
+to this endpoint instead, which writes the parts of streamExport to the
+response as they are encoded, so nothing is held in memory or spooled to
+disk whatever the size of the export.
+
+    GET /export?dataset=history&format=csv.gz&city=Delhi&start=2024-05-01T00:00:00&end=...&resolution=hour
+
+Usage:
+    python -m DataManager.export_server --port 8502
+"""
+import argparse
+import datetime
+import itertools
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from .export import EXPORT_FORMATS, streamExport
+
+# Address the export endpoint listens on ("0.0.0.0" to serve other machines)
+EXPORT_HOST = os.getenv("EXPORT_HOST", "127.0.0.1")
+EXPORT_PORT = int(os.getenv("EXPORT_PORT", 8502))
+
+# Address the browser reaches the endpoint at, e.g. behind a proxy; by default the host
+# the page was loaded from, on EXPORT_PORT (see export_base)
+EXPORT_URL = os.getenv("EXPORT_URL")
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Find the address of the endpoint as seen from the browser
+def export_base(host=None):
+    """
+    Return the address the browser reaches the export endpoint at.
+
+    Parameters
+    ----------
+    host : str, optional
+        The Host header of the request that loaded the page, e.g.
+        "weather.example.com:8501". The endpoint is assumed to be on the same
+        host, on EXPORT_PORT.
+
+    Returns
+    -------
+    str
+        EXPORT_URL if set, else the endpoint on the page's host, or on
+        localhost if the host is unknown.
+    """
+    if EXPORT_URL:
+        return EXPORT_URL
+    hostname = urlsplit(f"//{host}").hostname if host else None
+    if hostname and ":" in hostname:
+        # IPv6 addresses keep their brackets in URLs
+        hostname = f"[{hostname}]"
+    return f"http://{hostname or 'localhost'}:{EXPORT_PORT}"
+
+
+# Build the link downloading an export
+def export_url(dataset, fmt="csv", cities=None, start=None, end=None, resolution=None, base=None):
+    """
+    Build the URL the browser downloads an export from.
+
+    Parameters
+    ----------
+    dataset, fmt, cities, start, end, resolution
+        The export, see streamExport; `start` and `end` are dates or
+        datetimes.
+    base : str, optional
+        The address of the endpoint, by default export_base().
+
+    Returns
+    -------
+    str
+        The URL.
+    """
+    params = [("dataset", dataset), ("format", fmt)]
+    params.extend(("city", city) for city in cities or [])
+    if start is not None:
+        params.append(("start", start.isoformat()))
+    if end is not None:
+        params.append(("end", end.isoformat()))
+    if resolution is not None:
+        params.append(("resolution", resolution))
+    return f"{(base or export_base()).rstrip('/')}/export?{urlencode(params)}"
+
+
+def _parse_export(query):
+    # The arguments of streamExport from the query string of a request
+    params = parse_qs(query)
+    dataset = params.get("dataset", [""])[0]
+    fmt = params.get("format", ["csv"])[0]
+    # History is selected by time, the daily reports by date
+    parse = datetime.datetime.fromisoformat if dataset == "history" else datetime.date.fromisoformat
+    start = parse(params["start"][0]) if "start" in params else None
+    end = parse(params["end"][0]) if "end" in params else None
+    return dict(dataset=dataset, fmt=fmt, cities=params.get("city"), start=start, end=end,
+                resolution=params.get("resolution", [None])[0])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # One download, on its own thread
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/export":
+            self.send_error(404)
+            return
+        try:
+            export = _parse_export(url.query)
+            parts = streamExport(**export)
+            # The first part runs the query, so a bad selection is still answered with an error
+            first = next(parts, b"")
+        except (ValueError, KeyError) as e:
+            self.send_error(400, explain=str(e))
+            return
+        except ImportError as e:
+            # Parquet exports need pyarrow, which is optional
+            self.send_error(501, explain=str(e))
+            return
+
+        name = f"{export['dataset']}.{export['fmt']}"
+        self.send_response(200)
+        self.send_header("Content-Type", EXPORT_FORMATS[export["fmt"]])
+        self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for part in itertools.chain([first], parts):
+                if part:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+            self.wfile.write(b"0\r\n\r\n")
+        except ConnectionError:
+            # The browser cancelled the download
+            parts.close()
+            self.close_connection = True
+
+
+class ExportServer(ThreadingHTTPServer):
+    """
+    HTTP server streaming exports, serving each download on its own thread.
+
+    Parameters
+    ----------
+    host : str, optional
+        The address to listen on, by default EXPORT_HOST.
+    port : int, optional
+        The port to listen on, by default EXPORT_PORT; 0 for any free port
+        (see `port`).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host=EXPORT_HOST, port=EXPORT_PORT):
+        super().__init__((host, port), _Handler)
+        self._thread = None
+
+    @property
+    def port(self):
+        """The port the server listens on."""
+        return self.server_address[1]
+
+    def start(self):
+        """Serve on a background thread and return the server."""
+        self._thread = threading.Thread(target=self.serve_forever, name="export-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self.shutdown()
+        self.server_close()
+
+
+# Start the process-wide export server
+def ensure_export_server():
+    """
+    Start the export endpoint on a background thread, once per process.
+
+    If the port is taken, e.g. by the endpoint of another Streamlit
+    process, that one is assumed to serve the downloads.
+
+    Returns
+    -------
+    ExportServer or None
+        The server started by this process, if any.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ExportServer().start()
+                print(f"Export endpoint listening on {EXPORT_HOST}:{_server.port}")
+            except OSError as e:
+                print(f"Export endpoint not started on {EXPORT_HOST}:{EXPORT_PORT}: {e}")
+                return None
+    return _server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=EXPORT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=EXPORT_PORT, help="port to listen on")
+    args = parser.parse_args()
+
+    server = ExportServer(args.host, args.port)
+    print(f"Export endpoint listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# Rows fetched from the cursor at a time by read_frame
+FRAME_BATCH_SIZE = 10000
+
+# Local UTC offsets only change on quarter hours, so they are looked up once per quarter hour
+_OFFSET_STEP = 900
+
+# Column kinds understood by read_frame besides NumPy dtypes
+CATEGORY = "category"  # text, stored as integer codes into the distinct values
+UNIX_TIME = "unix_time"  # integer Unix time, returned as naive local datetime64
+DATE = "date"  # ISO date text, returned as datetime64
+
+
+class _CodeColumn:
+    # Text column kept as integer codes into a growing table of distinct values
+
+    def __init__(self, capacity):
+        self.codes = np.empty(capacity, dtype=np.int32)
+        self.values = {}
+
+    def resize(self, capacity):
+        self.codes = _resized(self.codes, capacity)
+
+    def store(self, start, values):
+        # Factorize the batch, then map its distinct values to the codes of the whole column
+        batch_codes, uniques = pd.factorize(np.array(values, dtype=object))
+        lookup = self.values
+        mapping = np.array([lookup.setdefault(value, len(lookup)) for value in uniques] + [-1], dtype=np.int32)
+        self.codes[start:start + len(values)] = mapping[batch_codes]
+
+    def categorical(self, length):
+        return pd.Categorical.from_codes(self.codes[:length], categories=list(self.values))
+
+
+def _resized(array, capacity):
+    resized = np.empty(capacity, dtype=array.dtype)
+    count = min(len(array), capacity)
+    resized[:count] = array[:count]
+    return resized
+
+
+# Read the rows of a cursor into a compactly typed DataFrame
+def read_frame(cursor, dtypes, size=None, batch_size=FRAME_BATCH_SIZE):
+    """
+    Read the result of an executed query into a DataFrame, column by column.
+
+    Rows are fetched `batch_size` at a time and written straight into one
+    preallocated array per column, so the result set is never held as a list
+    of Python tuples. Text columns become categoricals (integer codes plus
+    the distinct values), timestamps datetime64 and numbers the requested
+    NumPy dtype, e.g. float32.
+
+    Parameters
+    ----------
+    cursor : sqlite3.Cursor
+        A cursor on which the query has been executed.
+    dtypes : dict
+        The kind of every selected column, by name: CATEGORY, UNIX_TIME, DATE
+        or a NumPy dtype. Missing values of integer columns are not supported.
+    size : int, optional
+        The number of rows if known, so the arrays are allocated once.
+        Otherwise they grow geometrically and are trimmed at the end.
+    batch_size : int, optional
+        Rows fetched from the cursor at a time, by default FRAME_BATCH_SIZE.
+
+    Returns
+    -------
+    pd.DataFrame
+        The result, with the selected columns in order.
+    """
+    columns = [description[0] for description in cursor.description]
+    capacity = size if size is not None else batch_size
+    arrays = []
+    for column in columns:
+        kind = dtypes[column]
+        if kind in (CATEGORY, DATE):
+            arrays.append(_CodeColumn(capacity))
+        elif kind == UNIX_TIME:
+            arrays.append(np.empty(capacity, dtype=np.int64))
+        else:
+            arrays.append(np.empty(capacity, dtype=kind))
+
+    length = 0
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        end = length + len(batch)
+        if end > capacity:
+            capacity = max(end, capacity * 2)
+            for index, array in enumerate(arrays):
+                if isinstance(array, _CodeColumn):
+                    array.resize(capacity)
+                else:
+                    arrays[index] = _resized(array, capacity)
+        for array, values in zip(arrays, zip(*batch)):
+            if isinstance(array, _CodeColumn):
+                array.store(length, values)
+            else:
+                array[length:end] = values
+        length = end
+
+    data = {}
+    for column, array in zip(columns, arrays):
+        kind = dtypes[column]
+        if kind == CATEGORY:
+            data[column] = array.categorical(length)
+        elif kind == DATE:
+            # Parse each distinct date once
+            dates = pd.to_datetime(list(array.values)).to_numpy().astype("datetime64[s]")
+            codes = array.codes[:length]
+            values = np.full(length, np.datetime64("NaT"), dtype="datetime64[s]")
+            values[codes >= 0] = dates[codes[codes >= 0]]
+            data[column] = values
+        elif kind == UNIX_TIME:
+            data[column] = local_time(array[:length])
+        else:
+            data[column] = array[:length] if length == len(array) else array[:length].copy()
+    return pd.DataFrame(data, columns=columns)
+
+
+# Convert Unix times to local datetimes
+def local_time(epochs):
+    """
+    Convert Unix times to naive local datetimes, as shown on the dashboard.
+
+    Parameters
+    ----------
+    epochs : array-like of int
+        The Unix times.
+
+    Returns
+    -------
+    np.ndarray
+        The local times as datetime64[s], without time zone.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    steps, inverse = np.unique(epochs // _OFFSET_STEP, return_inverse=True)
+    offsets = np.array([time.localtime(step * _OFFSET_STEP).tm_gmtoff for step in steps.tolist()], dtype=np.int64)
+    return (epochs + offsets[inverse].reshape(epochs.shape)).astype("datetime64[s]")
+
+
+# Concatenate two frames read by read_frame
+def concat_frames(first, second):
+    """
+    Append one frame to another, keeping categorical columns categorical.
+
+    pd.concat turns categoricals with different categories into object
+    columns; here their categories are merged instead.
+
+    Parameters
+    ----------
+    first, second : pd.DataFrame
+        Frames with the same columns.
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows of both frames, with a fresh index.
+    """
+    data = {}
+    for column in first.columns:
+        if isinstance(first[column].dtype, pd.CategoricalDtype):
+            # An all-missing column has no categories to infer their dtype from, so take the other's
+            head, tail = first[column], second[column]
+            if not len(head.cat.categories):
+                head = head.cat.set_categories(tail.cat.categories)
+            elif not len(tail.cat.categories):
+                tail = tail.cat.set_categories(head.cat.categories)
+            data[column] = pd.api.types.union_categoricals([head, tail], ignore_order=True)
+        else:
+            data[column] = np.concatenate([first[column].to_numpy(), second[column].to_numpy()])
+    return pd.DataFrame(data, columns=first.columns)
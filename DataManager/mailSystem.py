@@ -1,11 +1,252 @@
 import os
 import smtplib
+import ssl
+import threading
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+# SMTP server the mails are sent through
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+
+# Whether sessions are upgraded with STARTTLS ("0" for local servers without TLS, see Benchmarks/smtp_server.py)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+
+# Authenticated sessions kept open at most, i.e. mails being sent at once
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 3))
+
+# Messages sent on a session before it is replaced by a new one (Gmail allows 100)
+SMTP_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MESSAGES_PER_SESSION", 100))
+
+# Seconds an unused session is kept before it is closed rather than reused
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", 60))
+
+# Seconds to wait on the server before giving up
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hung_up(error):
+    # Whether a send failed because the server closed the session, rather than refused the message;
+    # smtplib closes the connection itself when MAIL, RCPT or DATA is answered with 421
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(code == 421 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return True
+
+
+class _Session:
+    # An open, authenticated SMTP connection and how much it has been used
+
+    def __init__(self, server, now):
+        self.server = server
+        self.sent = 0
+        self.last_used = now
+
+
+class SMTPPool:
+    """
+    Pool of persistent, authenticated SMTP sessions reused across messages.
+
+    A session is connected (EHLO, STARTTLS, EHLO, LOGIN) when no idle one is
+    available, and returned to the pool after each message, so a batch of
+    mails costs one handshake and login per session rather than per mail.
+    At most `size` sessions are open at once; further senders wait for one
+    to be returned. A session is closed after `messages_per_session`
+    messages, or when it has been idle for longer than `idle_seconds`. If
+    the server has dropped a session, or closed it with a 421 reply, the
+    message is sent again once on a new one.
+
+    Parameters
+    ----------
+    host : str, optional
+        The SMTP server, by default SMTP_SERVER.
+    port : int, optional
+        Its port, by default SMTP_PORT.
+    user : str, optional
+        The login, by default none (no AUTH).
+    password : str, optional
+        The password of `user`.
+    size : int, optional
+        The most sessions open at once, by default SMTP_POOL_SIZE.
+    messages_per_session : int, optional
+        Messages sent on a session before it is closed, by default
+        SMTP_MESSAGES_PER_SESSION.
+    starttls : bool, optional
+        Whether sessions are upgraded with STARTTLS, by default
+        SMTP_STARTTLS.
+    idle_seconds : float, optional
+        Seconds an unused session is kept, by default SMTP_IDLE_SECONDS.
+    timeout : float, optional
+        Socket timeout in seconds, by default SMTP_TIMEOUT.
+    clock : callable, optional
+        Returns the current time in seconds, by default time.monotonic.
+    """
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, user=None, password=None, size=SMTP_POOL_SIZE,
+                 messages_per_session=SMTP_MESSAGES_PER_SESSION, starttls=SMTP_STARTTLS,
+                 idle_seconds=SMTP_IDLE_SECONDS, timeout=SMTP_TIMEOUT, clock=time.monotonic):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.messages_per_session = messages_per_session
+        self.starttls = starttls
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self.clock = clock
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        # Sessions opened so far, e.g. for the benchmark
+        self.connects = 0
+
+    def _connect(self):
+        # Open and authenticate a new session
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            if self.user:
+                server.login(self.user, self.password)
+        except BaseException:
+            server.close()
+            raise
+        with self._lock:
+            self.connects += 1
+        return _Session(server, self.clock())
+
+    @staticmethod
+    def _close(session):
+        # Say goodbye if the server is still listening
+        try:
+            session.server.quit()
+        except (smtplib.SMTPException, OSError):
+            session.server.close()
+
+    def _checkout(self):
+        # Take the most recently used idle session, closing the ones idle for too long
+        now = self.clock()
+        stale = []
+        session = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if now - candidate.last_used <= self.idle_seconds:
+                    session = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self._close(candidate)
+        return session or self._connect()
+
+    def _checkin(self, session):
+        # Return a session to the pool, or close it once it has sent its share
+        session.last_used = self.clock()
+        if session.sent >= self.messages_per_session:
+            self._close(session)
+            return
+        with self._lock:
+            self._idle.append(session)
+
+    def send(self, msg):
+        """
+        Send a message on a pooled session.
+
+        Parameters
+        ----------
+        msg : email.message.Message
+            The message, with its From and To headers set.
+
+        Raises
+        ------
+        smtplib.SMTPException or OSError
+            If the message could not be sent, even on a new session.
+        """
+        with self._slots:
+            session = self._checkout()
+            for attempt in range(2):
+                try:
+                    session.server.send_message(msg)
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError, smtplib.SMTPRecipientsRefused,
+                        smtplib.SMTPResponseException) as e:
+                    if not _hung_up(e):
+                        # The server refused this message, but the session is still usable
+                        self._checkin(session)
+                        raise
+                    # The server hung up, e.g. on an idle or over-long session; retry once on a new one
+                    session.server.close()
+                    if attempt:
+                        raise
+                    session = self._connect()
+                except BaseException:
+                    session.server.close()
+                    raise
+            session.sent += 1
+            self._checkin(session)
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close(session)
+
+
+# Build the mail pool configured by environment variables
+def mail_pool_from_env():
+    """
+    Build the mail pool configured by environment variables.
+
+    The server is SMTP_SERVER and SMTP_PORT, logged in to as SENDER_MAIL
+    with SENDER_PASSWORD; see the SMTP_* constants for the other settings.
+
+    Returns
+    -------
+    SMTPPool
+        The pool.
+    """
+    return SMTPPool(user=os.getenv('SENDER_MAIL'), password=os.getenv('SENDER_PASSWORD'))
+
+
+# Get the process-wide mail pool
+def get_mail_pool():
+    """Return the process-wide mail pool, building it from the environment on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = mail_pool_from_env()
+    return _pool
+
+
+# Replace the process-wide mail pool
+def set_mail_pool(pool):
+    """
+    Replace the process-wide mail pool, closing the idle sessions of the old one.
+
+    Parameters
+    ----------
+    pool : SMTPPool or None
+        The pool send_email should use from now on, or None to build it
+        from the environment again on next use.
+    """
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None and old is not pool:
+        old.close()
+
 
 def send_email(subject, body, to):
-    """Send an email using Gmail SMTP server.
+    """Send an email through the pooled SMTP sessions of get_mail_pool.
 
     Parameters:
     - subject (str): The subject of the email
@@ -15,29 +256,18 @@ def send_email(subject, body, to):
     Returns:
     - None
     """
-    # Set up the server
-    # Please note that using environment variables for sensitive information
-    # is recommended for production use.
-    smtp_server = 'smtp.gmail.com'
-    port = 587
-    sender_email = os.getenv('SENDER_MAIL')
-    password = os.getenv('SENDER_PASSWORD')
+    pool = get_mail_pool()
 
     # Create the email message
     msg = MIMEMultipart()
-    msg['From'] = sender_email
+    msg['From'] = pool.user or os.getenv('SENDER_MAIL')
     msg['To'] = to
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
 
     try:
-        # Connect to the server and send the email
-        with smtplib.SMTP(smtp_server, port) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(sender_email, password)
-            server.send_message(msg)
+        # Send on an open session, connecting and logging in only if none is free
+        pool.send(msg)
 
         print(f"Email sent successfully to {to}")
 
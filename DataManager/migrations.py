@@ -0,0 +1,35 @@
+from .db import transaction
+
+
+# Bring a database schema up to date
+def migrate(path, migrations):
+    """
+    Apply the pending schema migrations of a database.
+
+    The schema version is kept in SQLite's `user_version` header field.
+    Migration N (counting from 1) is applied when the version is below N,
+    and the version is bumped in the same transaction, so a failed migration
+    leaves the database untouched. The transaction is started with BEGIN
+    IMMEDIATE, so when several processes start at once one of them migrates
+    and the others wait and then find nothing left to do.
+
+    Parameters
+    ----------
+    path : str
+        The database file.
+    migrations : list of list of str
+        The migrations in order, each a list of SQL statements.
+
+    Returns
+    -------
+    int
+        The schema version after migrating.
+    """
+    with transaction(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(migrations[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        return max(version, len(migrations))
@@ -0,0 +1,196 @@
+import collections
+import json
+import os
+import threading
+import time
+
+from .db import get_connection, transaction
+from .providers import WeatherProvider
+
+# SQLite file backing the on-disk level of the observation cache
+CACHE_DB = os.getenv("OBS_CACHE_DB", "ObsCache.db")
+
+# Seconds an observation stays fresh after its reference time (OWM refreshes about every 10 minutes)
+CACHE_TTL = float(os.getenv("OBS_CACHE_TTL", 600))
+
+
+class ObservationCache:
+    """
+    Two-level cache of weather records keyed by city.
+
+    Records are kept in an in-process LRU dictionary backed by a small SQLite
+    file, so they survive restarts and are shared between processes. A record
+    is fresh until `ttl` seconds after its observation's Reference_time, but
+    at least `min_ttl` seconds after it was stored, so a station that reports
+    late is not re-fetched on every call.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Records kept in memory before the least recently used is evicted.
+    max_disk_entries : int, optional
+        Records kept on disk before the ones expiring first are evicted.
+    ttl : float, optional
+        Freshness window after the observation's reference time, by default CACHE_TTL.
+    min_ttl : float, optional
+        Minimum freshness window after storing a record, by default 60.
+    path : str, optional
+        The SQLite file, by default CACHE_DB. None keeps the cache in memory only.
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    """
+
+    def __init__(self, max_entries=1024, max_disk_entries=100000, ttl=CACHE_TTL, min_ttl=60, path=CACHE_DB,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.min_ttl = min_ttl
+        self.path = path
+        self.clock = clock
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if path:
+            with transaction(path) as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS observations (City TEXT PRIMARY KEY, Expires REAL, Record TEXT)")
+                conn.execute("CREATE INDEX IF NOT EXISTS observations_expires ON observations (Expires)")
+
+    def _remember(self, city, expires, record):
+        # Insert into the in-memory LRU, evicting the least recently used entries
+        self._memory[city] = (expires, record)
+        self._memory.move_to_end(city)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, city, count_miss=True):
+        """
+        Return the cached record of a city if it is still fresh.
+
+        Parameters
+        ----------
+        city : str
+            The city to look up.
+        count_miss : bool, optional
+            Count a miss in the statistics, by default True.
+
+        Returns
+        -------
+        dict or None
+            A copy of the cached weather record, or None on a miss.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(city)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(city)
+                self._stats["hits"] += 1
+                return dict(entry[1])
+            if entry:
+                del self._memory[city]
+
+        if self.path:
+            row = get_connection(self.path).execute(
+                "SELECT Expires, Record FROM observations WHERE City = ? AND Expires > ?", (city, now)).fetchone()
+            if row:
+                record = json.loads(row[1])
+                with self._lock:
+                    self._remember(city, row[0], record)
+                    self._stats["disk_hits"] += 1
+                return dict(record)
+
+        if count_miss:
+            with self._lock:
+                self._stats["misses"] += 1
+        return None
+
+    def put(self, record):
+        """
+        Store a weather record under its city.
+
+        Parameters
+        ----------
+        record : dict
+            A weather record as returned by a provider.
+        """
+        now = self.clock()
+        reference_time = record.get("Reference_time") or now
+        expires = max(reference_time + self.ttl, now + self.min_ttl)
+        with self._lock:
+            self._remember(record["City"], expires, dict(record))
+
+        if self.path:
+            with transaction(self.path) as conn:
+                conn.execute("INSERT OR REPLACE INTO observations (City, Expires, Record) VALUES (?, ?, ?)",
+                             (record["City"], expires, json.dumps(record)))
+                # Keep the file bounded: drop expired records, then the ones expiring first
+                conn.execute("DELETE FROM observations WHERE Expires <= ?", (now,))
+                conn.execute("""
+                    DELETE FROM observations WHERE City IN (
+                        SELECT City FROM observations ORDER BY Expires DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_disk_entries,))
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns
+        -------
+        dict
+            Counts of memory hits, disk hits, misses and memory evictions,
+            plus the overall hit ratio.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+class CachingProvider(WeatherProvider):
+    """
+    Wrapper answering repeated requests for a city from an ObservationCache.
+
+    Concurrent requests for the same uncached city are collapsed into a
+    single call to the wrapped provider.
+    """
+
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self._locks = collections.defaultdict(threading.Lock)
+        self._locks_lock = threading.Lock()
+
+    def _city_lock(self, city):
+        with self._locks_lock:
+            return self._locks[city]
+
+    def fetch(self, city):
+        record = self.cache.get(city)
+        if record is not None:
+            return record
+        with self._city_lock(city):
+            # Another thread may have fetched the city while we waited
+            record = self.cache.get(city, count_miss=False)
+            if record is None:
+                record = self.provider.fetch(city)
+                self.cache.put(record)
+            return record
+
+    def fetch_many(self, cities, pool=None):
+        records = {}
+        missing = []
+        for city in cities:
+            record = self.cache.get(city)
+            if record is None:
+                missing.append(city)
+            else:
+                records[city] = record
+        if missing:
+            fetched = self.provider.fetch_many(missing, pool=pool)
+            for record in fetched.values():
+                self.cache.put(record)
+            records.update(fetched)
+        return records
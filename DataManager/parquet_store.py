@@ -0,0 +1,276 @@
+import datetime
+import os
+import threading
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from .db import DATA_DB, get_connection
+from .frames import CATEGORY, UNIX_TIME, concat_frames, local_time, read_frame
+from .retention import HISTORY_COLUMNS, _hour_start
+from .sqlite_store import SQLiteBackend
+from .weather_db import (WEATHER_COLUMNS, date_of, day_of, getWatermark, setWatermark, to_epoch,
+                         weather_filter)
+
+# Hours an observation waits in SQLite before sync copies it to Parquet. It must stay well
+# below RETENTION_HOURS, as raw observations are deleted from SQLite after that
+EXPORT_HOURS = float(os.getenv("PARQUET_EXPORT_HOURS", 12))
+
+# Observations read from SQLite and written to Parquet at a time by sync
+EXPORT_BATCH_SIZE = 1000000
+
+# Watermarks: the last weather rowid copied to Parquet, and the time from which Parquet
+# holds every observation (the oldest one SQLite still had on the first copy)
+EXPORTED = "parquet_exported"
+COVERED_FROM = "parquet_covered_from"
+
+# Columns of the Parquet files; Day is the partition directory
+PARQUET_COLUMNS = {
+    "Id": np.int64,
+    "City": CATEGORY,
+    "Day": np.int32,
+    "DateTime": np.int64,
+    "Temperature": np.float32,
+    "Temperature_max": np.float32,
+    "Temperature_min": np.float32,
+    "Weather": CATEGORY,
+    "feels_like": np.float32,
+    "Wind_Speed": np.float32,
+    "Humidity": np.float32,
+}
+
+# Columns of the 'observations' view queried by the backend
+_OBSERVED = [column for column in PARQUET_COLUMNS if column != "Id"]
+
+# Start of the local hour, in the session time zone, which DuckDB takes from the system
+_HOUR = "CAST(epoch(date_trunc('hour', to_timestamp(DateTime))) AS BIGINT)"
+
+
+def _quoted(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _midnight(day):
+    # Unix time of the start of a local day bucket
+    return int(datetime.datetime.combine(date_of(day), datetime.time()).timestamp())
+
+
+def _typed(df, dtypes):
+    # Convert a DuckDB result to the kinds read_frame builds
+    for column in df.columns:
+        kind = dtypes[column]
+        if kind == CATEGORY:
+            codes, uniques = pd.factorize(df[column].to_numpy())
+            df[column] = pd.Categorical.from_codes(codes, categories=list(uniques))
+        elif kind == UNIX_TIME:
+            df[column] = local_time(df[column].to_numpy())
+        else:
+            df[column] = df[column].astype(kind)
+    return df
+
+
+class ParquetBackend(SQLiteBackend):
+    """
+    Backend answering the history reads from a columnar copy of the observations.
+
+    sync copies the observations from SQLite to a Parquet dataset
+    partitioned by local day (`Day=<day>/part-*.parquet`) and sorted by city
+    within each file, where, unlike in SQLite, they are kept at full
+    resolution forever. Partitioning by city as well would leave one small
+    file per city per day, and listing them would dominate every query. Reads
+    run on DuckDB over the copied observations plus the ones SQLite received
+    since, split at the rowid watermark of the last copy, so they see every
+    observation exactly once while the copy is running. History older than
+    the first copy is read from the SQLite rollups.
+
+    Observations are only written to Parquet in large batches, every
+    EXPORT_HOURS, so a partition holds a few files rather than one per
+    ingestion round.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the Parquet dataset.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._duck = duckdb.connect()
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        with self._lock:
+            exported = getWatermark(EXPORTED)
+            conn = get_connection(DATA_DB)
+            oldest = conn.execute("SELECT DateTime FROM weather WHERE rowid > ? ORDER BY rowid LIMIT 1",
+                                  (exported,)).fetchone()
+            if oldest is None or (not force and oldest[0] > time.time() - EXPORT_HOURS * 3600):
+                return 0
+
+            last = conn.execute("SELECT MAX(rowid) FROM weather").fetchone()[0]
+            if not exported:
+                first = conn.execute("SELECT MIN(DateTime) FROM weather").fetchone()[0]
+                setWatermark(COVERED_FROM, first)
+
+            duck = self._duck.cursor()
+            copied = 0
+            for low in range(exported, last, EXPORT_BATCH_SIZE):
+                high = min(low + EXPORT_BATCH_SIZE, last)
+                c = conn.cursor()
+                c.execute(f"""
+                    SELECT rowid AS {', '.join(PARQUET_COLUMNS)}
+                    FROM weather
+                    WHERE rowid > ? AND rowid <= ?
+                """, (low, high))
+                batch = read_frame(c, PARQUET_COLUMNS)
+                if len(batch):
+                    # Files are named after the batch, so a copy interrupted before the
+                    # watermark moved is overwritten when it is retried
+                    duck.register("batch", batch)
+                    duck.execute(f"""
+                        COPY (SELECT * REPLACE (CAST(City AS VARCHAR) AS City, CAST(Weather AS VARCHAR) AS Weather)
+                              FROM batch ORDER BY City, DateTime)
+                        TO {_quoted(self.directory)}
+                        (FORMAT parquet, PARTITION_BY (Day), OVERWRITE_OR_IGNORE,
+                         FILENAME_PATTERN 'part-{low}-{{i}}')
+                    """)
+                    duck.unregister("batch")
+                setWatermark(EXPORTED, high)
+                copied += len(batch)
+            return copied
+
+    def _observations(self, cities, start, end):
+        # DuckDB cursor with the view 'observations' of the observations in the range
+        exported = getWatermark(EXPORTED)
+        where, params = weather_filter(cities, start, end)
+        c = get_connection(DATA_DB).cursor()
+        c.execute(f"SELECT {', '.join(_OBSERVED)} FROM weather WHERE rowid > ? AND {where}", [exported, *params])
+
+        duck = self._duck.cursor()
+        duck.register("recent", read_frame(c, PARQUET_COLUMNS))
+        columns = ", ".join(_OBSERVED)
+        sources = [f"SELECT {columns} FROM recent"]
+        if exported:
+            files = _quoted(os.path.join(self.directory, "**", "*.parquet"))
+            sources.insert(0, f"""
+                SELECT {columns}
+                FROM read_parquet({files}, hive_partitioning = true, union_by_name = true)
+                WHERE Id <= {int(exported)}""")
+        duck.execute(f"CREATE TEMP VIEW observations AS {' UNION ALL BY NAME '.join(sources)}")
+        return duck
+
+    def _filter(self, cities, start, end):
+        # Condition on the observations view; the Day bounds let DuckDB skip partitions
+        conditions = []
+        params = []
+        if cities is not None:
+            conditions.append(f"City IN ({', '.join('?' * len(cities))})")
+            params.extend(cities)
+        if start is not None:
+            conditions.append("DateTime >= ? AND Day >= ?")
+            params.extend([start, day_of(start)])
+        if end is not None:
+            conditions.append("DateTime < ? AND Day <= ?")
+            params.extend([end, day_of(end - 1)])
+        return " AND ".join(conditions) or "true", params
+
+    def query_weather(self, cities, start, end, columns, order, limit):
+        start = to_epoch(start) if start is not None else None
+        end = to_epoch(end) if end is not None else None
+        duck = self._observations(cities, start, end)
+        where, params = self._filter(cities, start, end)
+        sql = f"SELECT {', '.join(columns)} FROM observations WHERE {where} ORDER BY DateTime {order.upper()}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return _typed(duck.execute(sql, params).df(), WEATHER_COLUMNS)
+
+    def _split_history(self, cities, start, end, resolution):
+        # Split a history at the first bucket Parquet holds entirely: the (start, end) range to
+        # read from the SQLite rollups, or None, and the DuckDB cursor and query for the rest, or None
+        start = to_epoch(start) if start is not None else None
+        end = to_epoch(end) if end is not None else None
+        if not getWatermark(EXPORTED):
+            return (start, end), None
+        covered_from = getWatermark(COVERED_FROM)
+
+        # The first bucket Parquet holds entirely; older ones come from the SQLite rollups
+        if resolution == "day":
+            boundary = _midnight(day_of(covered_from - 1) + 1)
+        elif resolution == "hour":
+            boundary = _hour_start(covered_from - 1) + 3600
+        else:
+            boundary = covered_from
+        older = None
+        if start is None or start < boundary:
+            older = (start, boundary if end is None else min(end, boundary))
+            if end is not None and end <= boundary:
+                return older, None
+            start = boundary
+
+        if resolution == "day":
+            # Whole local days, as in the daily rollups
+            start = _midnight(day_of(start))
+            end = _midnight(day_of(end - 1) + 1) if end is not None else None
+        elif resolution == "hour":
+            start = _hour_start(start)
+        duck = self._observations(cities, start, end)
+        where, params = self._filter(cities, start, end)
+
+        if resolution == "raw":
+            sql = f"""
+                SELECT City, DateTime, Temperature AS min_temp, Temperature AS max_temp, Temperature AS avg_temp,
+                       1 AS count, Weather AS dominant_weather
+                FROM observations
+                WHERE {where}
+                ORDER BY DateTime
+            """
+        else:
+            bucket = "Day" if resolution == "day" else _HOUR
+            bucket_time = ("CAST(epoch(CAST(DATE '1970-01-01' + CAST(b.Bucket AS INTEGER) AS TIMESTAMPTZ)) AS BIGINT)"
+                           if resolution == "day" else "b.Bucket")
+            sql = f"""
+                WITH selected AS (
+                    SELECT City, {bucket} AS Bucket, Temperature, COALESCE(Weather, 'Unknown') AS Weather
+                    FROM observations
+                    WHERE {where}
+                ),
+                buckets AS (
+                    SELECT City, Bucket, MIN(Temperature) AS min_temp, MAX(Temperature) AS max_temp,
+                           AVG(Temperature) AS avg_temp, COUNT(Temperature) AS count
+                    FROM selected
+                    GROUP BY City, Bucket
+                ),
+                dominant AS (
+                    SELECT City, Bucket, Weather,
+                           ROW_NUMBER() OVER (PARTITION BY City, Bucket ORDER BY COUNT(*) DESC, Weather) AS position
+                    FROM selected
+                    GROUP BY City, Bucket, Weather
+                )
+                SELECT b.City, {bucket_time} AS DateTime, b.min_temp, b.max_temp, b.avg_temp, b.count,
+                       d.Weather AS dominant_weather
+                FROM buckets b
+                LEFT JOIN dominant d ON d.City = b.City AND d.Bucket = b.Bucket AND d.position = 1
+                ORDER BY b.Bucket, b.City
+            """
+        return older, (duck, sql, params)
+
+    def weather_history(self, cities, start, end, resolution):
+        older, newer = self._split_history(cities, start, end, resolution)
+        frames = []
+        if older is not None:
+            frames.append(super().weather_history(cities, *older, resolution))
+        if newer is not None:
+            duck, sql, params = newer
+            frames.append(_typed(duck.execute(sql, params).df(), HISTORY_COLUMNS))
+        return frames[0] if len(frames) == 1 else concat_frames(*frames)
+
+    def history_cursors(self, cities, start, end, resolution):
+        older, newer = self._split_history(cities, start, end, resolution)
+        if older is not None:
+            yield from super().history_cursors(cities, *older, resolution)
+        if newer is not None:
+            duck, sql, params = newer
+            yield duck.execute(sql, params)
@@ -0,0 +1,511 @@
+import concurrent.futures
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+import pyowm
+from pyowm.commons.exceptions import NotFoundError, UnauthorizedError
+from pyowm.utils.config import get_default_config
+
+from .cities import registry_ids
+from .city_ids import resolve_city_ids
+from .ratelimit import CallGuard, CircuitBreaker, TokenBucket
+
+# Seconds pyowm waits on a single HTTP request before giving up
+OWM_TIMEOUT = float(os.getenv("OWM_TIMEOUT", 5))
+
+# Country code used to disambiguate city names when resolving city IDs
+CITY_COUNTRY = os.getenv("OWM_COUNTRY", "IN")
+
+# Maximum number of city IDs the OWM group endpoint accepts per request
+GROUP_SIZE = 20
+
+# Calls per minute allowed by the OpenWeatherMap plan (60 on the free plan)
+OWM_CALLS_PER_MINUTE = float(os.getenv("OWM_CALLS_PER_MINUTE", 60))
+
+# Calls that may be made back to back, by default a tenth of a minute's quota
+OWM_BURST = int(os.getenv("OWM_BURST", max(1, int(OWM_CALLS_PER_MINUTE // 6))))
+
+# Consecutive failed calls after which OWM calls are short-circuited
+OWM_BREAKER_THRESHOLD = int(os.getenv("OWM_BREAKER_THRESHOLD", 5))
+
+# Name of the file, inside a recording directory, holding the recorded observations
+RECORDING_FILE = "observations.jsonl"
+
+_owm_lock = threading.Lock()
+_owm = None
+_weather_manager = None
+_provider = None
+_provider_lock = threading.Lock()
+
+# Rate limiter, retry policy and circuit breaker shared by every OWM call
+owm_guard = CallGuard(
+    TokenBucket(OWM_CALLS_PER_MINUTE, burst=OWM_BURST),
+    CircuitBreaker(failure_threshold=OWM_BREAKER_THRESHOLD),
+    non_retryable=(NotFoundError, UnauthorizedError),
+)
+
+
+# Limit this process to its share of the OpenWeatherMap quota
+def share_owm_quota(shares):
+    """
+    Limit the OWM calls of this process to a share of the plan's quota.
+
+    Each process has its own owm_guard, so workers sharing one API key,
+    such as the shards of a sharded worker, must split OWM_CALLS_PER_MINUTE
+    and OWM_BURST between them to stay within the plan together.
+
+    Parameters
+    ----------
+    shares : int
+        The number of processes sharing the quota equally.
+    """
+    owm_guard.limiter = TokenBucket(OWM_CALLS_PER_MINUTE / shares, burst=max(1, OWM_BURST // shares))
+
+
+# Function to get the process-wide OpenWeatherMap client
+def get_owm():
+    """
+    Return the shared pyowm client, creating it on first use.
+
+    Returns
+    -------
+    owm : pyowm.OWM
+        The shared OpenWeatherMap client.
+
+    """
+    global _owm
+    if _owm is None:
+        with _owm_lock:
+            if _owm is None:
+                config = get_default_config()
+                config["connection"]["timeout_secs"] = OWM_TIMEOUT
+                _owm = pyowm.OWM(os.getenv("OPENWEATHER_API_KEY"), config)
+    return _owm
+
+
+# Function to get the process-wide OpenWeatherMap weather manager
+def get_weather_manager():
+    """
+    Return the shared pyowm weather manager, creating it on first use.
+
+    The OWM client (and the HTTP session behind it) is built once per process
+    and reused by every call, so fetching a round of cities does not pay the
+    client and connection setup cost once per city.
+
+    Returns
+    -------
+    manager : pyowm.weatherapi25.weather_manager.WeatherManager
+        The shared weather manager.
+
+    """
+    global _weather_manager
+    if _weather_manager is None:
+        owm = get_owm()
+        with _owm_lock:
+            if _weather_manager is None:
+                _weather_manager = owm.weather_manager()
+    return _weather_manager
+
+
+# Function to call the OpenWeatherMap API for the specified city
+def owm_api_call(city):
+    """
+    Call the OpenWeatherMap API for the specified city and retrieve the
+    current weather data.
+
+    Parameters
+    ----------
+    city : str
+        The city for which to retrieve the weather data.
+
+    Returns
+    -------
+    observation : pyowm.weatherapi25.observation.Observation
+        The pyowm observation object containing the current weather data.
+
+    """
+    # Retrieve the current weather for the specified city using the shared client
+    return get_weather_manager().weather_at_place(city)
+
+
+# Function to call the OpenWeatherMap group endpoint for several city IDs
+def owm_group_call(city_ids):
+    """
+    Call the OpenWeatherMap API for several cities at once, by city ID.
+
+    The IDs are sent to the group endpoint in chunks of GROUP_SIZE, so N
+    cities cost ceil(N / GROUP_SIZE) requests instead of N, and OWM does not
+    have to geocode a place name for each of them.
+
+    Parameters
+    ----------
+    city_ids : list of int
+        The OpenWeatherMap city IDs for which to retrieve the weather data.
+
+    Returns
+    -------
+    observations : dict
+        A dictionary mapping each returned city ID to its pyowm observation.
+
+    """
+    manager = get_weather_manager()
+    observations = {}
+    for i in range(0, len(city_ids), GROUP_SIZE):
+        for observation in manager.weather_at_ids(city_ids[i:i + GROUP_SIZE]):
+            observations[observation.location.id] = observation
+    return observations
+
+
+# Function to turn a pyowm observation into a plain weather record
+def observation_record(city, observation):
+    """
+    Extract the relevant weather data for a city from a pyowm observation.
+
+    Parameters
+    ----------
+    city : str
+        The city the observation belongs to.
+    observation : pyowm.weatherapi25.observation.Observation
+        The observation returned by the OpenWeatherMap API.
+
+    Returns
+    -------
+    dict
+        A JSON-serializable weather record with the keys City,
+        Reference_time (Unix time of the observation), Temperature,
+        Temperature_max, Temperature_min, Weather, Feels_like, Wind_Speed
+        and Humidity.
+
+    """
+    weather = observation.weather
+    temperature = weather.temperature("celsius")
+    return {
+        "City": city,
+        "Reference_time": weather.reference_time(),
+        "Temperature": temperature["temp"],
+        "Temperature_max": temperature["temp_max"],
+        "Temperature_min": temperature["temp_min"],
+        "Weather": weather.detailed_status,
+        "Feels_like": temperature["feels_like"],
+        "Wind_Speed": weather.wind()["speed"],
+        "Humidity": weather.humidity
+    }
+
+
+class WeatherProvider:
+    """
+    A source of current weather observations.
+
+    Providers return plain weather records (see observation_record), so the
+    rest of the ingestion pipeline does not depend on where they come from.
+    """
+
+    def fetch(self, city):
+        """
+        Return the current weather record for a city.
+
+        Parameters
+        ----------
+        city : str
+            The city for which to retrieve the weather data.
+
+        Returns
+        -------
+        dict
+            The weather record for the city.
+        """
+        raise NotImplementedError
+
+    def fetch_many(self, cities, pool=None):
+        """
+        Return the current weather records for several cities.
+
+        Cities that fail are left out of the result, so callers can retry
+        them individually.
+
+        Parameters
+        ----------
+        cities : list of str
+            The cities for which to retrieve the weather data.
+        pool : concurrent.futures.Executor, optional
+            An executor on which requests may be run concurrently.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping city names to weather records.
+        """
+        records = {}
+        for city in cities:
+            try:
+                records[city] = self.fetch(city)
+            except Exception as e:
+                print(f"Failed to fetch {city}: {e!r}")
+        return records
+
+
+class OWMProvider(WeatherProvider):
+    """
+    Weather provider backed by the live OpenWeatherMap API.
+
+    Every request goes through owm_guard, so it is rate limited to
+    OWM_CALLS_PER_MINUTE, retried on transient errors and short-circuited
+    with CircuitOpenError while the API keeps failing.
+    """
+
+    def fetch(self, city):
+        return observation_record(city, owm_guard.call(owm_api_call, city))
+
+    def fetch_many(self, cities, pool=None):
+        # Resolve names to IDs offline, building pyowm's registry only if a name is still unknown
+        try:
+            city_ids = resolve_city_ids(cities, lambda: get_owm().city_id_registry(), country=CITY_COUNTRY,
+                                        known=registry_ids())
+        except Exception as e:
+            # Cities left unresolved are fetched one by one by the caller
+            print(f"Failed to resolve city IDs: {e!r}")
+            city_ids = resolve_city_ids(cities, None, known=registry_ids())
+
+        # Fetch the resolved IDs through the group endpoint
+        names_by_id = {city_id: city for city, city_id in city_ids.items()}
+        ids = list(names_by_id)
+        chunks = [ids[i:i + GROUP_SIZE] for i in range(0, len(ids), GROUP_SIZE)]
+
+        results = []
+        if pool is None:
+            for chunk in chunks:
+                try:
+                    results.append(owm_guard.call(owm_group_call, chunk))
+                except Exception as e:
+                    print(f"Failed to fetch a group of cities: {e!r}")
+        else:
+            futures = [pool.submit(owm_guard.call, owm_group_call, chunk) for chunk in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"Failed to fetch a group of cities: {e!r}")
+
+        records = {}
+        for observations in results:
+            for city_id, observation in observations.items():
+                city = names_by_id.get(city_id, observation.location.name)
+                records[city] = observation_record(city, observation)
+        return records
+
+
+class RecordingProvider(WeatherProvider):
+    """
+    Wrapper that saves every record returned by another provider to disk.
+
+    Records are appended as JSON lines to RECORDING_FILE inside `directory`,
+    which can later be served by ReplayProvider.
+    """
+
+    def __init__(self, provider, directory):
+        self.provider = provider
+        self.path = os.path.join(directory, RECORDING_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _record(self, records):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def fetch(self, city):
+        record = self.provider.fetch(city)
+        self._record([record])
+        return record
+
+    def fetch_many(self, cities, pool=None):
+        records = self.provider.fetch_many(cities, pool=pool)
+        self._record(records.values())
+        return records
+
+
+class ReplayProvider(WeatherProvider):
+    """
+    Offline provider serving records saved by RecordingProvider.
+
+    The recorded records of each city are served in order and the sequence
+    starts over once exhausted. Cities that were never recorded get the
+    records of a recorded city, renamed, so any city list can be replayed.
+
+    Parameters
+    ----------
+    directory : str
+        The recording directory to serve.
+    latency : float, optional
+        Seconds each request takes, by default 0.
+    jitter : float, optional
+        Maximum random seconds added to the latency of each request.
+    rebase_time : bool, optional
+        Stamp served records with the current time instead of the recorded
+        one, by default True, so replayed data looks fresh to the pipeline.
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    """
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, rebase_time=True, clock=time.time):
+        self.latency = latency
+        self.jitter = jitter
+        self.rebase_time = rebase_time
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._records = {}
+        with open(os.path.join(directory, RECORDING_FILE), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._records.setdefault(record["City"], []).append(record)
+        if not self._records:
+            raise ValueError(f"No recorded observations in {directory}")
+        self._cycles = {city: itertools.cycle(records) for city, records in self._records.items()}
+        self._fallback = itertools.cycle(list(self._records))
+
+    def _wait(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _next(self, city):
+        with self._lock:
+            if city not in self._cycles:
+                source = next(self._fallback)
+                self._cycles[city] = itertools.cycle(
+                    [{**record, "City": city} for record in self._records[source]])
+            record = dict(next(self._cycles[city]))
+        if self.rebase_time:
+            record["Reference_time"] = int(self.clock())
+        return record
+
+    def fetch(self, city):
+        self._wait()
+        return self._next(city)
+
+    def fetch_many(self, cities, pool=None):
+        # A batch costs one request's worth of latency, like the group endpoint
+        self._wait()
+        return {city: self._next(city) for city in cities}
+
+
+class SyntheticProvider(WeatherProvider):
+    """
+    Offline provider generating plausible random weather records.
+
+    Each city follows its own random walk, so successive readings change
+    gradually. Useful for load tests that need many cities without any
+    recording.
+
+    Parameters
+    ----------
+    latency : float, optional
+        Seconds each request takes, by default 0.
+    jitter : float, optional
+        Maximum random seconds added to the latency of each request.
+    seed : int, optional
+        Seed for the random generator, for reproducible runs.
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    """
+
+    STATUSES = ["clear sky", "few clouds", "scattered clouds", "broken clouds", "haze", "light rain", "mist"]
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None, clock=time.time):
+        self.latency = latency
+        self.jitter = jitter
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._temps = {}
+
+    def fetch(self, city):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            temp = self._temps.get(city, self._random.uniform(15, 35)) + self._random.uniform(-0.5, 0.5)
+            self._temps[city] = temp
+            return {
+                "City": city,
+                "Reference_time": int(self.clock()),
+                "Temperature": round(temp, 2),
+                "Temperature_max": round(temp + self._random.uniform(0, 2), 2),
+                "Temperature_min": round(temp - self._random.uniform(0, 2), 2),
+                "Weather": self._random.choice(self.STATUSES),
+                "Feels_like": round(temp + self._random.uniform(-2, 3), 2),
+                "Wind_Speed": round(self._random.uniform(0, 10), 2),
+                "Humidity": self._random.randint(20, 95)
+            }
+
+
+# Function to build the provider selected by the environment
+def provider_from_env():
+    """
+    Build the weather provider selected by environment variables.
+
+    WEATHER_PROVIDER picks the source ("owm" by default, "replay" or
+    "synthetic"). Replay reads WEATHER_REPLAY_DIR, and both offline
+    providers take WEATHER_PROVIDER_LATENCY and WEATHER_PROVIDER_JITTER in
+    seconds. If WEATHER_RECORD_DIR is set, the provider is wrapped in a
+    RecordingProvider writing to that directory. Unless WEATHER_CACHE is
+    "0", the result is put behind a CachingProvider so repeated requests
+    for a city within its freshness window never leave the process.
+
+    Returns
+    -------
+    WeatherProvider
+        The configured provider.
+    """
+    kind = os.getenv("WEATHER_PROVIDER", "owm")
+    latency = float(os.getenv("WEATHER_PROVIDER_LATENCY", 0))
+    jitter = float(os.getenv("WEATHER_PROVIDER_JITTER", 0))
+
+    if kind == "owm":
+        provider = OWMProvider()
+    elif kind == "replay":
+        provider = ReplayProvider(os.getenv("WEATHER_REPLAY_DIR", "recordings"), latency=latency, jitter=jitter)
+    elif kind == "synthetic":
+        provider = SyntheticProvider(latency=latency, jitter=jitter)
+    else:
+        raise ValueError(f"Unknown weather provider: {kind}")
+
+    record_dir = os.getenv("WEATHER_RECORD_DIR")
+    if record_dir:
+        provider = RecordingProvider(provider, record_dir)
+
+    if os.getenv("WEATHER_CACHE", "1") != "0":
+        # Imported here because obs_cache builds on this module
+        from .obs_cache import CachingProvider, ObservationCache
+        provider = CachingProvider(provider, ObservationCache())
+    return provider
+
+
+# Function to get the provider used by the ingestion pipeline
+def get_provider():
+    """Return the process-wide weather provider, building it from the environment on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = provider_from_env()
+    return _provider
+
+
+# Function to replace the provider used by the ingestion pipeline
+def set_provider(provider):
+    """
+    Replace the process-wide weather provider.
+
+    Parameters
+    ----------
+    provider : WeatherProvider
+        The provider getWeather and callCities should use from now on.
+    """
+    global _provider
+    _provider = provider
@@ -0,0 +1,223 @@
+import threading
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is short-circuited because the circuit breaker is open."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Parameters
+    ----------
+    calls_per_minute : float
+        The sustained number of calls allowed per minute.
+    burst : int, optional
+        The number of calls that may be made back to back, by default 1.
+    clock : callable, optional
+        Monotonic clock returning seconds, by default time.monotonic.
+    sleep : callable, optional
+        Function used to wait for a token, by default time.sleep.
+    """
+
+    def __init__(self, calls_per_minute, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = calls_per_minute / 60
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # Refill the bucket and take a token if one is available, else return the wait time
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+
+        Returns
+        -------
+        bool
+            True if the call had to wait (was throttled), False otherwise.
+        """
+        throttled = False
+        while True:
+            with self._lock:
+                wait = self._take()
+            if wait <= 0:
+                return throttled
+            throttled = True
+            self.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker with exponential backoff.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. It then lets a single trial
+    call through (half-open): success closes it again, failure reopens it for
+    twice as long as the previous time, up to `max_timeout`.
+
+    Parameters
+    ----------
+    failure_threshold : int, optional
+        Consecutive failures that open the breaker, by default 5.
+    reset_timeout : float, optional
+        Seconds the breaker stays open the first time, by default 30.
+    max_timeout : float, optional
+        Longest time in seconds the breaker stays open, by default 600.
+    clock : callable, optional
+        Monotonic clock returning seconds, by default time.monotonic.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, max_timeout=600, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self._trips += 1
+        timeout = min(self.max_timeout, self.reset_timeout * 2 ** (self._trips - 1))
+        self._open_until = self.clock() + timeout
+        self.state = self.OPEN
+
+    def allow(self):
+        """
+        Check whether a call may go through.
+
+        Returns
+        -------
+        bool
+            False while the breaker is open, or while another trial call is
+            already running in the half-open state.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() >= self._open_until:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Record a successful call, closing the breaker."""
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trips = 0
+
+    def record_failure(self):
+        """Record a failed call, opening the breaker if needed."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self._failures += 1
+            if self.state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+
+class CallGuard:
+    """
+    Runs calls through a rate limiter, a retry policy and a circuit breaker.
+
+    Parameters
+    ----------
+    limiter : TokenBucket
+        Rate limiter every attempt (including retries) takes a token from.
+    breaker : CircuitBreaker
+        Circuit breaker short-circuiting calls while the remote side is down.
+    retries : int, optional
+        Number of retries after a failed attempt, by default 2.
+    retry_backoff : float, optional
+        Seconds before the first retry; doubles for every further retry.
+    non_retryable : tuple of type, optional
+        Exceptions that are raised straight away. They mean the remote side
+        answered (e.g. "city not found"), so they do not count as failures
+        for the circuit breaker either.
+    sleep : callable, optional
+        Function used to wait between retries, by default time.sleep.
+    """
+
+    def __init__(self, limiter, breaker, retries=2, retry_backoff=1.0, non_retryable=(), sleep=time.sleep):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.non_retryable = tuple(non_retryable)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "throttled": 0, "retried": 0, "short_circuited": 0, "failed": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        """
+        Return the call counters.
+
+        Returns
+        -------
+        dict
+            Counts of calls, throttled attempts (that had to wait for the rate
+            limiter), retried attempts, short-circuited calls and failed calls.
+        """
+        with self._lock:
+            return dict(self._stats, breaker=self.breaker.state)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Call `fn(*args, **kwargs)` under the rate limit, retry policy and breaker.
+
+        Raises
+        ------
+        CircuitOpenError
+            If the circuit breaker is open.
+        Exception
+            The last exception raised by `fn` once all retries are used up.
+        """
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("Too many recent failures, call short-circuited")
+
+        self._count("calls")
+        for attempt in range(self.retries + 1):
+            if self.limiter.acquire():
+                self._count("throttled")
+            try:
+                result = fn(*args, **kwargs)
+            except self.non_retryable:
+                self.breaker.record_success()
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    self._count("failed")
+                    self.breaker.record_failure()
+                    raise
+                self._count("retried")
+                self.sleep(self.retry_backoff * 2 ** attempt)
+            else:
+                self.breaker.record_success()
+                return result
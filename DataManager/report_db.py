@@ -1,6 +1,34 @@
-import sqlite3
-
-import pandas as pd
+import numpy as np
+
+from DataManager.db import REPORT_DB, get_connection, transaction
+from DataManager.frames import CATEGORY, DATE, read_frame
+from DataManager.migrations import migrate
+
+# Kinds read_frame builds the report columns as
+REPORT_COLUMNS = {
+    "City": CATEGORY,
+    "DateTime": DATE,
+    "min_temp": np.float32,
+    "max_temp": np.float32,
+    "avg_temp": np.float32,
+    "dominant_weather": CATEGORY,
+}
+
+# Schema migrations of the report database, applied in order by initialize_db
+MIGRATIONS = [
+    # 1: the original 'reports' table, one report per city per day
+    ['''CREATE TABLE IF NOT EXISTS reports (
+           City TEXT,
+           DateTime TEXT,
+           min_temp REAL,
+           max_temp REAL,
+           avg_temp REAL,
+           dominant_weather TEXT,
+           PRIMARY KEY (City, DateTime)  -- Ensure uniqueness on these columns
+       )'''],
+    # 2: date range reads across all cities, e.g. by the exports (see export.py)
+    ["CREATE INDEX reports_datetime ON reports (DateTime)"],
+]
 
 
 # Initialize the SQLite database and create the 'reports' table if it doesn't exist
@@ -17,31 +45,20 @@ def initialize_db():
         avg_temp: The average temperature in the report.
         dominant_weather: The dominant weather condition in the report.
     The City and DateTime columns are set as the primary key to ensure that there is only one report per city per day.
+    The schema is brought up to date by applying the pending MIGRATIONS.
     """
-    conn = sqlite3.connect('report.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS reports (
-                    City TEXT,
-                    DateTime TEXT,
-                    min_temp REAL,
-                    max_temp REAL,
-                    avg_temp REAL,
-                    dominant_weather TEXT,
-                    PRIMARY KEY (City, DateTime)  -- Ensure uniqueness on these columns
-                );
-                ''')
-    conn.commit()
-    conn.close()
+    migrate(REPORT_DB, MIGRATIONS)
 
 
 # Add or update a weather summary report for a given city
-def addSummary(city, datetime, min_temp, max_temp, avg_temp, dominant_weather):
+def addSummary(city, datetime, *, min_temp, max_temp, avg_temp, dominant_weather):
     """
     Add or update a weather summary report for a given city.
 
     This function adds or updates a weather summary report for the given city.
     If the city and datetime pair already exists, the existing record is updated.
-    Otherwise, a new record is inserted into the 'reports' table.
+    Otherwise, a new record is inserted into the 'reports' table. The
+    temperatures are keyword-only, so they cannot be passed in the wrong order.
 
     Parameters
     ----------
@@ -62,17 +79,38 @@ def addSummary(city, datetime, min_temp, max_temp, avg_temp, dominant_weather):
     -------
     None
     """
-    conn = sqlite3.connect('report.db')
-    c = conn.cursor()
+    with transaction(REPORT_DB) as conn:
+        c = conn.cursor()
 
-    # Insert or replace the new data into the reports table
-    c.execute('''INSERT OR REPLACE INTO reports 
-                 (City, DateTime, min_temp, max_temp, avg_temp, dominant_weather)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (city, datetime, min_temp, max_temp, avg_temp, dominant_weather))
+        # Insert or replace the new data into the reports table
+        c.execute('''INSERT OR REPLACE INTO reports 
+                     (City, DateTime, min_temp, max_temp, avg_temp, dominant_weather)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  (city, datetime, min_temp, max_temp, avg_temp, dominant_weather))
 
-    conn.commit()
-    conn.close()
+
+# Add or update many weather summary reports at once
+def addSummaries(summaries):
+    """
+    Add or update many weather summary reports in one transaction.
+
+    Parameters
+    ----------
+    summaries : iterable of dict
+        The reports, with the keys City, DateTime, min_temp, max_temp,
+        avg_temp and dominant_weather, as returned by weather_db.Summary.
+
+    Returns
+    -------
+    int
+        The number of reports written.
+    """
+    with transaction(REPORT_DB) as conn:
+        c = conn.executemany('''INSERT OR REPLACE INTO reports
+                                (City, DateTime, min_temp, max_temp, avg_temp, dominant_weather)
+                                VALUES (:City, :DateTime, :min_temp, :max_temp, :avg_temp, :dominant_weather)''',
+                             summaries)
+        return c.rowcount
 
 
 # Retrieve all weather summary reports and return them as a DataFrame
@@ -81,24 +119,19 @@ def getSummary():
     Retrieve all weather summary reports and return them as a DataFrame.
 
     This function executes a query to fetch all data from the 'reports' table
-    and returns the result as a DataFrame.
+    and streams the result into a DataFrame typed as listed in REPORT_COLUMNS.
 
     Returns
     -------
     df : pandas.DataFrame
         A DataFrame containing all weather summary reports.
     """
-    conn = sqlite3.connect('report.db')
+    conn = get_connection(REPORT_DB)
     c = conn.cursor()
 
     # Execute a query to fetch all data from the 'reports' table
     c.execute("SELECT * FROM reports")
-    data = c.fetchall()
-
-    # Get column names
-    col_names = [description[0] for description in c.description]
-    conn.close()
 
-    # Create a DataFrame using the fetched data and column names
-    df = pd.DataFrame(data, columns=col_names)
+    # Create a DataFrame from the fetched data
+    df = read_frame(c, REPORT_COLUMNS)
     return df
@@ -0,0 +1,285 @@
+import time
+
+import numpy as np
+
+from .db import DATA_DB, get_connection, transaction
+from .frames import CATEGORY, UNIX_TIME, read_frame
+from .storage import get_backend
+from .weather_db import RETENTION_HOURS, day_of, to_epoch
+
+# Days of hourly rollups kept; daily rollups are kept forever
+HOURLY_RETENTION_DAYS = 90
+
+# Unix time of the start of the local hour a raw observation falls in
+_HOUR = "DateTime - CAST(strftime('%s', DateTime, 'unixepoch', 'localtime') AS INTEGER) % 3600"
+
+# Rollup tiers: the table, its bucket column and the bucket of a raw observation. Hourly
+# rollups are filled by applyRetention; daily ones are kept up to date on insert by
+# triggers (see weather_db.MIGRATIONS), so they never need raw rows added
+TIERS = {
+    "hour": ("weather_hourly", "Hour", _HOUR),
+    "day": ("weather_daily", "Day", None),
+}
+
+# Kinds read_frame builds the weatherHistory columns as
+HISTORY_COLUMNS = {
+    "City": CATEGORY,
+    "DateTime": UNIX_TIME,
+    "min_temp": np.float32,
+    "max_temp": np.float32,
+    "avg_temp": np.float32,
+    "count": np.int64,
+    "dominant_weather": CATEGORY,
+}
+
+
+def _hour_start(epoch):
+    # Start of the local hour a Unix time falls in
+    return epoch - (epoch + time.localtime(epoch).tm_gmtoff) % 3600
+
+
+def _roll_up(conn, table, bucket, raw_bucket, cutoff):
+    # Merge the raw observations older than the cutoff into the hourly tier
+    conn.execute(f"""
+        INSERT INTO {table} (City, {bucket}, Day, Temperature_min, Temperature_max, Temperature_sum, Count)
+        SELECT City, {raw_bucket} AS Bucket, MIN(Day), MIN(Temperature), MAX(Temperature), SUM(Temperature),
+               COUNT(Temperature)
+        FROM weather
+        WHERE DateTime < ?
+        GROUP BY City, Bucket
+        ON CONFLICT (City, {bucket}) DO UPDATE SET
+            Temperature_min = MIN(COALESCE(Temperature_min, excluded.Temperature_min),
+                                  COALESCE(excluded.Temperature_min, Temperature_min)),
+            Temperature_max = MAX(COALESCE(Temperature_max, excluded.Temperature_max),
+                                  COALESCE(excluded.Temperature_max, Temperature_max)),
+            Temperature_sum = COALESCE(Temperature_sum, 0) + COALESCE(excluded.Temperature_sum, 0),
+            Count = Count + excluded.Count
+    """, (cutoff,))
+    conn.execute(f"""
+        INSERT INTO {table}_conditions (City, {bucket}, Weather, Count)
+        SELECT City, {raw_bucket} AS Bucket, COALESCE(Weather, 'Unknown') AS Condition, COUNT(*)
+        FROM weather
+        WHERE DateTime < ?
+        GROUP BY City, Bucket, Condition
+        ON CONFLICT (City, {bucket}, Weather) DO UPDATE SET Count = Count + excluded.Count
+    """, (cutoff,))
+
+
+# Roll up and remove aged observations
+def applyRetention(now=None):
+    """
+    Move aged weather data down the retention tiers.
+
+    Raw observations are kept for RETENTION_HOURS, rounded down to the start
+    of a local hour. Older ones are merged into the hourly rollups (minimum,
+    maximum, sum and count of the temperature, plus a histogram of the
+    weather conditions) and deleted. Merging makes the rollups incremental:
+    an observation that arrives late for an hour that was already rolled up
+    is added to it on the next run. The daily rollups already hold every
+    observation, as they are maintained on insert. Hourly rollups are kept
+    for HOURLY_RETENTION_DAYS, daily rollups forever. Everything runs in one
+    transaction.
+
+    Parameters
+    ----------
+    now : float, optional
+        The current Unix time, by default time.time().
+
+    Returns
+    -------
+    int
+        The number of raw observations rolled up.
+    """
+    now = int(time.time() if now is None else now)
+    cutoff = _hour_start(now - RETENTION_HOURS * 3600)
+    with transaction(DATA_DB) as conn:
+        for table, bucket, raw_bucket in TIERS.values():
+            if raw_bucket is not None:
+                _roll_up(conn, table, bucket, raw_bucket, cutoff)
+        rolled_up = conn.execute("DELETE FROM weather WHERE DateTime < ?", (cutoff,)).rowcount
+
+        hourly_cutoff = now - HOURLY_RETENTION_DAYS * 86400
+        conn.execute("DELETE FROM weather_hourly WHERE Hour < ?", (hourly_cutoff,))
+        conn.execute("DELETE FROM weather_hourly_conditions WHERE Hour < ?", (hourly_cutoff,))
+    return rolled_up
+
+
+# Pick the cheapest tier holding a time range
+def routeHistory(start, now=None):
+    """
+    Pick the tier answering a history query starting at a given time.
+
+    Each tier keeps a shorter stretch of time at a finer resolution, so the
+    cheapest tier that still reaches back to `start` is the coarsest one
+    needed: raw observations within RETENTION_HOURS, hourly rollups within
+    HOURLY_RETENTION_DAYS, daily rollups beyond.
+
+    Parameters
+    ----------
+    start : datetime.datetime or int or None
+        The start of the queried range, None for all time.
+    now : float, optional
+        The current Unix time, by default time.time().
+
+    Returns
+    -------
+    str
+        "raw", "hour" or "day".
+    """
+    if start is None:
+        return "day"
+    age = (time.time() if now is None else now) - to_epoch(start)
+    if age <= RETENTION_HOURS * 3600:
+        return "raw"
+    if age <= HOURLY_RETENTION_DAYS * 86400:
+        return "hour"
+    return "day"
+
+
+def _range_filter(column, cities, start, end, params):
+    # Named-parameter condition on a city column and a time or bucket column
+    conditions = []
+    if cities is not None:
+        names = [f":city{index}" for index in range(len(cities))]
+        conditions.append(f"City IN ({', '.join(names)})")
+        params.update(zip((name[1:] for name in names), cities))
+    if start is not None:
+        conditions.append(f"{column} >= :start_{column}")
+    if end is not None:
+        conditions.append(f"{column} < :end_{column}")
+    return " AND ".join(conditions) or "1"
+
+
+# Query the weather history at the resolution of the cheapest tier
+def weatherHistory(cities=None, start=None, end=None, resolution=None):
+    """
+    Retrieve the temperature history of cities, from whichever tier fits.
+
+    On SQLite, the hourly tier is completed with the raw observations not
+    rolled up yet, aggregated to the same buckets, so the result reaches up
+    to `end`. The query is answered by the storage backend (see storage.py).
+
+    Parameters
+    ----------
+    cities : list of str, optional
+        The cities to return, by default all of them.
+    start : datetime.datetime or int, optional
+        The earliest time to return (inclusive).
+    end : datetime.datetime or int, optional
+        The latest time to return (exclusive).
+    resolution : str, optional
+        "raw", "hour" or "day", by default chosen by routeHistory.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per city and bucket (per observation for "raw"), with the
+        columns City, DateTime (start of the bucket, local time), min_temp,
+        max_temp, avg_temp, count and dominant_weather, ordered by time.
+    """
+    resolution = resolution or routeHistory(start)
+    if resolution != "raw" and resolution not in TIERS:
+        raise ValueError(f"Unknown resolution {resolution!r}, expected 'raw', 'hour' or 'day'")
+    return get_backend().weather_history(cities, start, end, resolution)
+
+
+def _weather_history(cities, start, end, resolution):
+    # weatherHistory on the SQLite tiers
+    c = get_connection(DATA_DB).cursor()
+    c.execute(*history_query(cities, start, end, resolution))
+    return read_frame(c, HISTORY_COLUMNS)
+
+
+# Build the SQLite query behind weatherHistory
+def history_query(cities, start, end, resolution):
+    """
+    Build the SQLite query reading a weather history from the tiers.
+
+    Parameters
+    ----------
+    cities : list of str or None
+        The cities to return, None for all of them.
+    start, end : datetime.datetime or int or None
+        The time range, as for weatherHistory.
+    resolution : str
+        "raw", "hour" or "day".
+
+    Returns
+    -------
+    tuple of (str, dict)
+        The query and its named parameters. It selects the columns of
+        HISTORY_COLUMNS, with DateTime as Unix time.
+    """
+    start = to_epoch(start) if start is not None else None
+    end = to_epoch(end) if end is not None else None
+    params = {"start_DateTime": start, "end_DateTime": end}
+    raw_where = _range_filter("DateTime", cities, start, end, params)
+
+    if resolution == "raw":
+        sql = f"""
+            SELECT City, DateTime, Temperature AS min_temp, Temperature AS max_temp, Temperature AS avg_temp,
+                   1 AS count, Weather AS dominant_weather
+            FROM weather
+            WHERE {raw_where}
+            ORDER BY DateTime
+        """
+    else:
+        table, bucket, raw_bucket = TIERS[resolution]
+        if bucket == "Day":
+            params.update({"start_Day": day_of(start) if start is not None else None,
+                           "end_Day": day_of(end - 1) + 1 if end is not None else None})
+            bucket_time = "CAST(strftime('%s', date(Bucket * 86400, 'unixepoch'), 'utc') AS INTEGER)"
+        else:
+            params.update({"start_Hour": _hour_start(start) if start is not None else None, "end_Hour": end})
+            bucket_time = "Bucket"
+        rollup_where = _range_filter(bucket, cities, start, end, params)
+        raw_buckets = raw_conditions = ""
+        if raw_bucket is not None:
+            raw_buckets = f"""
+                UNION ALL
+                SELECT City, {raw_bucket} AS Bucket, MIN(Temperature), MAX(Temperature), SUM(Temperature),
+                       COUNT(Temperature)
+                FROM weather
+                WHERE {raw_where}
+                GROUP BY City, Bucket"""
+            raw_conditions = f"""
+                    UNION ALL
+                    SELECT City, {raw_bucket} AS Bucket, COALESCE(Weather, 'Unknown'), COUNT(*)
+                    FROM weather
+                    WHERE {raw_where}
+                    GROUP BY City, Bucket, Weather"""
+        sql = f"""
+            WITH buckets AS (
+                SELECT City, {bucket} AS Bucket, Temperature_min AS low, Temperature_max AS high,
+                       Temperature_sum AS total, Count AS n
+                FROM {table}
+                WHERE {rollup_where}{raw_buckets}
+            ),
+            conditions AS (
+                SELECT City, Bucket, Weather, SUM(n) AS n
+                FROM (
+                    SELECT City, {bucket} AS Bucket, Weather, Count AS n
+                    FROM {table}_conditions
+                    WHERE {rollup_where}{raw_conditions}
+                )
+                GROUP BY City, Bucket, Weather
+            ),
+            dominant AS (
+                SELECT City, Bucket, Weather,
+                       ROW_NUMBER() OVER (PARTITION BY City, Bucket ORDER BY n DESC, Weather) AS position
+                FROM conditions
+            )
+            SELECT City, {bucket_time} AS DateTime, MIN(low) AS min_temp, MAX(high) AS max_temp,
+                   SUM(total) / SUM(n) AS avg_temp, SUM(n) AS count, MAX(Weather) AS dominant_weather
+            FROM (
+                -- Stacking the dominant weather under the buckets groups both in one pass, where
+                -- a join of the two CTEs would be a nested loop over unindexed results
+                SELECT City, Bucket, low, high, total, n, NULL AS Weather FROM buckets
+                UNION ALL
+                SELECT City, Bucket, NULL, NULL, NULL, 0, Weather FROM dominant WHERE position = 1
+            )
+            GROUP BY City, Bucket
+            ORDER BY Bucket, City
+        """
+    return sql, params
+
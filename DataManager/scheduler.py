@@ -0,0 +1,201 @@
+import heapq
+import random
+import threading
+import time
+
+
+class PollScheduler:
+    """
+    Per-city polling scheduler ordered by next-due time.
+
+    Every city has its own polling interval, adapted after each fetch:
+    cities close to the warning threshold or whose temperature is changing
+    quickly are polled at `min_interval`, cities with stable conditions back
+    off gradually towards `max_interval`, and failed fetches are retried
+    early with exponential backoff. Each interval is spread by a random
+    jitter so cities do not fall due in bursts.
+
+    Parameters
+    ----------
+    base_interval : float, optional
+        Seconds between polls of a city without history, by default 600.
+    min_interval : float, optional
+        Shortest interval, used for cities that need close watching.
+    max_interval : float, optional
+        Longest interval a stable city backs off to.
+    retry_interval : float, optional
+        Seconds before the first retry of a failed city. Doubles with every
+        consecutive failure, up to `base_interval`.
+    warning_threshold : float, optional
+        Temperature in degree Celsius above which warnings are raised.
+    warning_margin : float, optional
+        Cities within this many degrees of the threshold are polled at
+        `min_interval`.
+    fast_change : float, optional
+        Temperature change, in degree Celsius per hour, above which a city is
+        considered to be changing quickly.
+    backoff : float, optional
+        Factor by which the interval of a stable city grows after each poll.
+    jitter : float, optional
+        Relative random spread applied to every interval, by default 0.1 (±10%).
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    rng : random.Random, optional
+        Random generator used for the jitter.
+    """
+
+    def __init__(self, base_interval=600, min_interval=300, max_interval=3600, retry_interval=60,
+                 warning_threshold=35, warning_margin=3, fast_change=2, backoff=1.5, jitter=0.1,
+                 clock=time.time, rng=None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+        self.warning_threshold = warning_threshold
+        self.warning_margin = warning_margin
+        self.fast_change = fast_change
+        self.backoff = backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._heap = []
+        self._state = {}
+
+    def _jittered(self, interval):
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, city, due):
+        # Older heap entries of the city become stale and are skipped when popped
+        state = self._state[city]
+        state["due"] = due
+        state["in_flight"] = False
+        heapq.heappush(self._heap, (due, city))
+
+    def add(self, city, last_update=None):
+        """
+        Start tracking a city.
+
+        Parameters
+        ----------
+        city : str
+            The city to poll.
+        last_update : float, optional
+            Unix time of the city's latest stored observation. The city falls
+            due one jittered base interval after it, or immediately if unknown.
+        """
+        with self._lock:
+            if city in self._state:
+                return
+            self._state[city] = {"interval": self.base_interval, "failures": 0,
+                                 "last_temp": None, "last_time": last_update}
+            if last_update is None:
+                due = self.clock()
+            else:
+                due = last_update + self._jittered(self.base_interval)
+            self._push(city, due)
+
+    def remove(self, city):
+        """Stop tracking a city."""
+        with self._lock:
+            self._state.pop(city, None)
+
+    def cities(self):
+        """Return the tracked cities."""
+        with self._lock:
+            return list(self._state)
+
+    def due(self, now=None):
+        """
+        Pop every city whose next poll is due.
+
+        The returned cities are not scheduled again until record_success or
+        record_failure is called for them.
+
+        Parameters
+        ----------
+        now : float, optional
+            The current Unix time, by default clock().
+
+        Returns
+        -------
+        list of str
+            The due cities, most overdue first.
+        """
+        now = self.clock() if now is None else now
+        cities = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, city = heapq.heappop(self._heap)
+                state = self._state.get(city)
+                if state is None or state["in_flight"] or state["due"] != due:
+                    continue
+                state["in_flight"] = True
+                cities.append(city)
+        return cities
+
+    def seconds_until_next(self, now=None):
+        """Return the number of seconds until the next city falls due, or None if nothing is scheduled."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            pending = [state["due"] for state in self._state.values() if not state["in_flight"]]
+        if not pending:
+            return None
+        return max(0.0, min(pending) - now)
+
+    def record_success(self, city, temperature, now=None):
+        """
+        Reschedule a city after a successful fetch, adapting its interval.
+
+        Parameters
+        ----------
+        city : str
+            The city that was fetched.
+        temperature : float
+            The fetched temperature in degree Celsius.
+        now : float, optional
+            The current Unix time, by default clock().
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            state = self._state.get(city)
+            if state is None:
+                return
+
+            change_rate = 0.0
+            if state["last_temp"] is not None and state["last_time"] is not None and now > state["last_time"]:
+                hours = (now - state["last_time"]) / 3600
+                change_rate = abs(temperature - state["last_temp"]) / hours
+
+            if temperature >= self.warning_threshold - self.warning_margin or change_rate >= self.fast_change:
+                # Close to a warning or changing quickly: watch closely
+                interval = self.min_interval
+            elif state["last_temp"] is None:
+                # First reading, nothing to compare against yet
+                interval = self.base_interval
+            else:
+                # Stable conditions: back off gradually
+                interval = min(self.max_interval, max(self.min_interval, state["interval"] * self.backoff))
+
+            state.update(interval=interval, failures=0, last_temp=temperature, last_time=now)
+            self._push(city, now + self._jittered(interval))
+
+    def record_failure(self, city, now=None):
+        """
+        Reschedule a city after a failed fetch, retrying it early.
+
+        Parameters
+        ----------
+        city : str
+            The city whose fetch failed.
+        now : float, optional
+            The current Unix time, by default clock().
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            state = self._state.get(city)
+            if state is None:
+                return
+            state["failures"] += 1
+            delay = min(self.base_interval, self.retry_interval * 2 ** (state["failures"] - 1))
+            self._push(city, now + self._jittered(delay))
@@ -0,0 +1,24 @@
+from .db import DATA_DB, get_connection
+from .retention import _weather_history, history_query
+from .storage import StorageBackend
+from .weather_db import _query_weather
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend answering every read from the SQLite weather database.
+
+    Raw observations are only kept for RETENTION_HOURS, so longer histories
+    come from the hourly and daily rollups (see retention.py).
+    """
+
+    def query_weather(self, cities, start, end, columns, order, limit):
+        return _query_weather(cities, start, end, columns, order, limit)
+
+    def weather_history(self, cities, start, end, resolution):
+        return _weather_history(cities, start, end, resolution)
+
+    def history_cursors(self, cities, start, end, resolution):
+        c = get_connection(DATA_DB).cursor()
+        c.execute(*history_query(cities, start, end, resolution))
+        yield c
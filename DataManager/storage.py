@@ -0,0 +1,110 @@
+import os
+import threading
+
+# Engine answering the history reads of weather_db and retention: "sqlite" or "parquet"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# Directory of the Parquet dataset used by the "parquet" backend
+PARQUET_DIR = os.getenv("PARQUET_DIR", "weather_parquet")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class StorageBackend:
+    """
+    Engine answering the weather history reads.
+
+    Observations are always written to the SQLite weather database, which
+    handles deduplication, alerts and the retention tiers. A backend answers
+    queryWeather and weatherHistory, the reads that scan long time ranges,
+    as well as the history exports, and may keep its own copy of the
+    observations, brought up to date by sync.
+    """
+
+    def query_weather(self, cities, start, end, columns, order, limit):
+        """Answer weather_db.queryWeather, whose parameters have been validated."""
+        raise NotImplementedError
+
+    def weather_history(self, cities, start, end, resolution):
+        """Answer retention.weatherHistory, whose resolution has been resolved."""
+        raise NotImplementedError
+
+    def history_cursors(self, cities, start, end, resolution):
+        """
+        Execute the query of retention.weatherHistory, for reading it in chunks.
+
+        Yields
+        ------
+        cursor
+            Executed cursors (sqlite3 or DuckDB) selecting the columns of
+            HISTORY_COLUMNS, DateTime as Unix time, whose rows in turn make
+            up the history in time order.
+        """
+        raise NotImplementedError
+
+    def sync(self, force=False):
+        """
+        Copy the observations stored since the last call into the backend.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Copy them even if the backend would rather wait for more.
+
+        Returns
+        -------
+        int
+            The number of observations copied.
+        """
+        return 0
+
+
+# Build the storage backend selected by the environment
+def backend_from_env():
+    """
+    Build the storage backend selected by STORAGE_BACKEND.
+
+    "sqlite" (the default) answers every read from the weather database.
+    "parquet" keeps a columnar copy of the observations in PARQUET_DIR,
+    queried with DuckDB.
+
+    Returns
+    -------
+    StorageBackend
+        The configured backend.
+    """
+    # Imported here because the backends build on the modules that dispatch to them
+    if STORAGE_BACKEND == "sqlite":
+        from .sqlite_store import SQLiteBackend
+        return SQLiteBackend()
+    if STORAGE_BACKEND == "parquet":
+        from .parquet_store import ParquetBackend
+        return ParquetBackend(PARQUET_DIR)
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+
+# Get the storage backend answering the history reads
+def get_backend():
+    """Return the process-wide storage backend, building it from the environment on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+    return _backend
+
+
+# Replace the storage backend answering the history reads
+def set_backend(backend):
+    """
+    Replace the process-wide storage backend.
+
+    Parameters
+    ----------
+    backend : StorageBackend or None
+        The backend to use, or None to build it from the environment again.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
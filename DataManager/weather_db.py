@@ -1,9 +1,225 @@
 import datetime
-import sqlite3
+import itertools
+import time
+
+import numpy as np
+
+from DataManager.db import DATA_DB, get_connection, transaction
+from DataManager.frames import CATEGORY, UNIX_TIME, read_frame
+from DataManager.migrations import migrate
+from DataManager.report_db import addSummaries
+from DataManager.storage import get_backend
+
+# Temperature in degree Celsius above which a warning is triggered
+WARNING_THRESHOLD = 35
+
+# Hours of raw observations kept before they are rolled up (see retention.py)
+RETENTION_HOURS = 24
+
+# Rows written per transaction by addWeatherMany
+BULK_BATCH_SIZE = 5000
+
+# Day buckets count local calendar days from this date
+EPOCH_DATE = datetime.date(1970, 1, 1)
+
+# Columns that queryWeather can return, with the kinds read_frame builds them as;
+# float32 keeps about 7 significant digits, far more than the sensors report
+WEATHER_COLUMNS = {
+    "City": CATEGORY,
+    "DateTime": UNIX_TIME,
+    "Temperature": np.float32,
+    "Temperature_max": np.float32,
+    "Temperature_min": np.float32,
+    "Weather": CATEGORY,
+    "feels_like": np.float32,
+    "Wind_Speed": np.float32,
+    "Humidity": np.float32,
+    "Day": np.int32,
+}
+
+# Schema migrations of the weather database, applied in order by initialize_db
+MIGRATIONS = [
+    # 1: the original 'weather' table
+    ['''CREATE TABLE IF NOT EXISTS weather (
+           City TEXT, 
+           DateTime TEXT, 
+           Temperature REAL, 
+           Temperature_max REAL, 
+           Temperature_min REAL, 
+           Weather TEXT, 
+           feels_like REAL,
+           Wind_Speed REAL, 
+           Humidity REAL)'''],
+    # 2: one row per city and observation time, dropping duplicates stored by older versions
+    ["DELETE FROM weather WHERE rowid NOT IN (SELECT MIN(rowid) FROM weather GROUP BY City, DateTime)",
+     "CREATE UNIQUE INDEX IF NOT EXISTS weather_city_datetime ON weather (City, DateTime)"],
+    # 3: indexes for the hot queries: latest entry and retention by time, and a covering
+    #    index for the per-city temperature and weather-status lookups and aggregates
+    ["CREATE INDEX IF NOT EXISTS weather_datetime ON weather (DateTime)",
+     "CREATE INDEX IF NOT EXISTS weather_city_datetime_cover ON weather (City, DateTime, Temperature, Weather)"],
+    # 4: DateTime as integer UTC Unix time instead of local-time text, plus the precomputed local
+    #    day bucket; the covering index is keyed on the day for the daily summaries
+    ["""CREATE TABLE weather_v4 (
+           City TEXT,
+           DateTime INTEGER,
+           Temperature REAL,
+           Temperature_max REAL,
+           Temperature_min REAL,
+           Weather TEXT,
+           feels_like REAL,
+           Wind_Speed REAL,
+           Humidity REAL,
+           Day INTEGER)""",
+     """INSERT OR IGNORE INTO weather_v4
+        SELECT City, CAST(strftime('%s', DateTime, 'utc') AS INTEGER), Temperature, Temperature_max,
+               Temperature_min, Weather, feels_like, Wind_Speed, Humidity,
+               CAST(julianday(DateTime) - julianday('1970-01-01') AS INTEGER)
+        FROM weather
+        WHERE strftime('%s', DateTime, 'utc') IS NOT NULL""",
+     "DROP TABLE weather",
+     "ALTER TABLE weather_v4 RENAME TO weather",
+     "CREATE UNIQUE INDEX weather_city_datetime ON weather (City, DateTime)",
+     "CREATE INDEX weather_datetime ON weather (DateTime)",
+     "CREATE INDEX weather_city_day_cover ON weather (City, Day, Temperature, Weather)"],
+    # 5: hourly and daily rollups of the observations removed by retention (see retention.py);
+    #    Hour is the Unix time the local hour starts at, Day the local day bucket
+    ["""CREATE TABLE weather_hourly (
+           City TEXT,
+           Hour INTEGER,
+           Day INTEGER,
+           Temperature_min REAL,
+           Temperature_max REAL,
+           Temperature_sum REAL,
+           Count INTEGER,
+           PRIMARY KEY (City, Hour))""",
+     """CREATE TABLE weather_hourly_conditions (
+           City TEXT,
+           Hour INTEGER,
+           Weather TEXT,
+           Count INTEGER,
+           PRIMARY KEY (City, Hour, Weather))""",
+     """CREATE TABLE weather_daily (
+           City TEXT,
+           Day INTEGER,
+           Temperature_min REAL,
+           Temperature_max REAL,
+           Temperature_sum REAL,
+           Count INTEGER,
+           PRIMARY KEY (City, Day))""",
+     """CREATE TABLE weather_daily_conditions (
+           City TEXT,
+           Day INTEGER,
+           Weather TEXT,
+           Count INTEGER,
+           PRIMARY KEY (City, Day, Weather))""",
+     "CREATE INDEX weather_hourly_hour ON weather_hourly (Hour)",
+     "CREATE INDEX weather_hourly_conditions_hour ON weather_hourly_conditions (Hour)",
+     "CREATE INDEX weather_daily_day ON weather_daily (Day)",
+     "CREATE INDEX weather_daily_conditions_day ON weather_daily_conditions (Day)"],
+    # 6: progress markers of incremental jobs, e.g. the last weather rowid summarized by allSummary
+    ["CREATE TABLE watermarks (Name TEXT PRIMARY KEY, Value INTEGER)"],
+    # 7: the daily rollups become running aggregates of every observation, kept up to date
+    #    by triggers in the same transaction as each insert; fold in the rows not rolled up yet
+    ["""INSERT INTO weather_daily (City, Day, Temperature_min, Temperature_max, Temperature_sum, Count)
+        SELECT City, Day, MIN(Temperature), MAX(Temperature), SUM(Temperature), COUNT(Temperature)
+        FROM weather
+        WHERE true
+        GROUP BY City, Day
+        ON CONFLICT (City, Day) DO UPDATE SET
+            Temperature_min = MIN(COALESCE(Temperature_min, excluded.Temperature_min),
+                                  COALESCE(excluded.Temperature_min, Temperature_min)),
+            Temperature_max = MAX(COALESCE(Temperature_max, excluded.Temperature_max),
+                                  COALESCE(excluded.Temperature_max, Temperature_max)),
+            Temperature_sum = COALESCE(Temperature_sum, 0) + COALESCE(excluded.Temperature_sum, 0),
+            Count = Count + excluded.Count""",
+     """INSERT INTO weather_daily_conditions (City, Day, Weather, Count)
+        SELECT City, Day, COALESCE(Weather, 'Unknown') AS Condition, COUNT(*)
+        FROM weather
+        WHERE true
+        GROUP BY City, Day, Condition
+        ON CONFLICT (City, Day, Weather) DO UPDATE SET Count = Count + excluded.Count""",
+     """CREATE TRIGGER weather_daily_insert AFTER INSERT ON weather
+        BEGIN
+            INSERT INTO weather_daily (City, Day, Temperature_min, Temperature_max, Temperature_sum, Count)
+            VALUES (NEW.City, NEW.Day, NEW.Temperature, NEW.Temperature, NEW.Temperature,
+                    NEW.Temperature IS NOT NULL)
+            ON CONFLICT (City, Day) DO UPDATE SET
+                Temperature_min = MIN(COALESCE(Temperature_min, excluded.Temperature_min),
+                                      COALESCE(excluded.Temperature_min, Temperature_min)),
+                Temperature_max = MAX(COALESCE(Temperature_max, excluded.Temperature_max),
+                                      COALESCE(excluded.Temperature_max, Temperature_max)),
+                Temperature_sum = COALESCE(Temperature_sum, 0) + COALESCE(excluded.Temperature_sum, 0),
+                Count = Count + excluded.Count;
+            INSERT INTO weather_daily_conditions (City, Day, Weather, Count)
+            VALUES (NEW.City, NEW.Day, COALESCE(NEW.Weather, 'Unknown'), 1)
+            ON CONFLICT (City, Day, Weather) DO UPDATE SET Count = Count + 1;
+        END"""],
+    # 8: alert states, written by the alert engine (see alerts.py) when they change
+    ["""CREATE TABLE alerts (
+           City TEXT,
+           Rule TEXT,
+           Active INTEGER,
+           Since INTEGER,
+           Value REAL,
+           PRIMARY KEY (City, Rule))"""],
+]
+
+
+# Convert a timestamp to Unix time
+def to_epoch(value):
+    """
+    Convert a timestamp to integer Unix time.
+
+    Parameters
+    ----------
+    value : datetime.datetime or int or float
+        The timestamp. Naive datetimes are taken to be in local time.
+
+    Returns
+    -------
+    int
+        The seconds since 1970-01-01 00:00 UTC.
+    """
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return int(value)
 
-import pandas as pd
 
-from DataManager.report_db import addSummary
+# Get the day bucket of a Unix time
+def day_of(epoch):
+    """
+    Return the day bucket of a Unix time: the number of the local calendar
+    day it falls on, counted from 1970-01-01.
+
+    Parameters
+    ----------
+    epoch : int
+        The Unix time.
+
+    Returns
+    -------
+    int
+        The day bucket.
+    """
+    return (datetime.date.fromtimestamp(epoch) - EPOCH_DATE).days
+
+
+# Get the date of a day bucket
+def date_of(day):
+    """
+    Return the calendar date of a day bucket.
+
+    Parameters
+    ----------
+    day : int
+        The day bucket, as returned by day_of.
+
+    Returns
+    -------
+    datetime.date
+        The date.
+    """
+    return EPOCH_DATE + datetime.timedelta(days=day)
 
 
 # Initialize the SQLite database and create the 'weather' table if it doesn't exist
@@ -13,7 +229,7 @@ def initialize_db():
 
     The 'weather' table contains the following columns:
     City: The city for which the weather data is recorded.
-    DateTime: The date and time when the weather data was recorded.
+    DateTime: The time of the observation, as integer UTC Unix time.
     Temperature: The current temperature in degree Celsius.
     Temperature_max: The maximum temperature in degree Celsius for the day.
     Temperature_min: The minimum temperature in degree Celsius for the day.
@@ -21,21 +237,13 @@ def initialize_db():
     feels_like: The feels like temperature in degree Celsius.
     Wind_Speed: The wind speed in km/h.
     Humidity: The humidity percentage.
+    Day: The local calendar day of the observation, as days since 1970-01-01.
+
+    Rows are unique on (City, DateTime), DateTime being the time of the
+    observation itself. The schema is brought up to date by applying the
+    pending MIGRATIONS.
     """
-    conn = sqlite3.connect('Data.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS weather (
-                 City TEXT, 
-                 DateTime TEXT, 
-                 Temperature REAL, 
-                 Temperature_max REAL, 
-                 Temperature_min REAL, 
-                 Weather TEXT, 
-                 feels_like REAL,
-                 Wind_Speed REAL, 
-                 Humidity REAL)''')
-    conn.commit()
-    conn.close()
+    migrate(DATA_DB, MIGRATIONS)
 
 
 # Add a new weather record to the 'weather' table
@@ -44,12 +252,17 @@ def addWeather(City, DateTime, Temperature, Temperature_max, Temperature_min, We
     """
     Add a new weather record to the 'weather' table.
 
+    OWM only refreshes a station about every 10 minutes, so the same
+    observation is often fetched more than once. Records whose city and
+    observation time are already stored are skipped.
+
     Parameters
     ----------
     City : str
         The city for which the weather data is recorded.
-    DateTime : str
-        The date and time when the weather data was recorded.
+    DateTime : datetime.datetime or int
+        The time of the observation (its reference time), as a datetime or
+        Unix time. Naive datetimes are taken to be in local time.
     Temperature : float
         The current temperature in degree Celsius.
     Temperature_max : float
@@ -64,15 +277,68 @@ def addWeather(City, DateTime, Temperature, Temperature_max, Temperature_min, We
         The wind speed in km/h.
     Humidity : float
         The humidity percentage.
+
+    Returns
+    -------
+    bool
+        True if the record was inserted, False if it was already stored.
     """
-    conn = sqlite3.connect('Data.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO weather VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-              (
-                  City, DateTime, Temperature, Temperature_max, Temperature_min, Weather, feels_like, Wind_Speed,
-                  Humidity))
-    conn.commit()
-    conn.close()
+    epoch = to_epoch(DateTime)
+    with transaction(DATA_DB) as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT OR IGNORE INTO weather (City, DateTime, Temperature, Temperature_max, Temperature_min, Weather,
+                                           feels_like, Wind_Speed, Humidity, Day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (City, epoch, Temperature, Temperature_max, Temperature_min, Weather, feels_like, Wind_Speed,
+              Humidity, day_of(epoch)))
+        inserted = c.rowcount == 1
+
+    return inserted
+
+
+# Add many weather records to the 'weather' table at once
+def addWeatherMany(observations, batch_size=BULK_BATCH_SIZE):
+    """
+    Add many weather records to the 'weather' table at once.
+
+    The records are written with executemany, `batch_size` rows per
+    transaction, so a whole ingestion round is a single commit, and an
+    iterator of any length (e.g. a backfill) is consumed in bounded memory.
+    As with addWeather, records already stored are skipped.
+
+    Parameters
+    ----------
+    observations : iterable of dict
+        The weather records, with the keys City, DateTime, Temperature,
+        Temperature_max, Temperature_min, Weather, Feels_like, Wind_Speed and
+        Humidity, as produced by DataGen and returned by lastWeather.
+    batch_size : int, optional
+        Rows written per transaction, by default BULK_BATCH_SIZE.
+
+    Returns
+    -------
+    int
+        The number of records inserted.
+    """
+    rows = ((observation["City"], epoch, observation["Temperature"], observation["Temperature_max"],
+             observation["Temperature_min"], observation["Weather"], observation["Feels_like"],
+             observation["Wind_Speed"], observation["Humidity"], day_of(epoch))
+            for observation in observations
+            for epoch in (to_epoch(observation["DateTime"]),))
+
+    inserted = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return inserted
+        with transaction(DATA_DB) as conn:
+            c = conn.executemany("""
+                INSERT OR IGNORE INTO weather (City, DateTime, Temperature, Temperature_max, Temperature_min, Weather,
+                                               feels_like, Wind_Speed, Humidity, Day)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            inserted += c.rowcount
 
 
 # Retrieve all weather data from the 'weather' table and return it as a DataFrame
@@ -80,33 +346,118 @@ def getWeather():
     """
     Retrieve all weather data from the 'weather' table and return it as a DataFrame.
 
+    The columns are typed as listed in WEATHER_COLUMNS, with DateTime in
+    local time. The rows are streamed from the cursor into arrays sized by
+    a row count taken first.
+
     Returns
     -------
     pd.DataFrame
         A DataFrame containing the weather data.
     """
-    # Connect to the database
-    conn = sqlite3.connect('Data.db')
+    # Get the thread's connection to the database
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
 
-    # Fetch all data from the 'weather' table
-    c.execute("SELECT * FROM weather")
-    data = c.fetchall()
+    # Count the rows, so the column arrays are allocated once
+    size = c.execute("SELECT COUNT(*) FROM weather").fetchone()[0]
 
-    # Get column names from the database
-    col_names = [description[0] for description in c.description]
+    # Fetch all data from the 'weather' table straight into a DataFrame
+    c.execute("""
+        SELECT City, DateTime, Temperature, Temperature_max, Temperature_min, Weather, feels_like, Wind_Speed,
+               Humidity
+        FROM weather
+    """)
+    df = read_frame(c, WEATHER_COLUMNS, size=size)
 
-    # Close the database connection
-    conn.close()
+    # Return the DataFrame
+    return df
 
-    # Create a DataFrame using the fetched data and column names
-    df = pd.DataFrame(data, columns=col_names)
 
-    # Print the DataFrame for debugging purposes
-    print(df)
+# Build the WHERE clause selecting weather rows by city and time
+def weather_filter(cities=None, start=None, end=None):
+    """
+    Build the SQL condition selecting weather rows by city and time range.
 
-    # Return the DataFrame
-    return df
+    Parameters
+    ----------
+    cities : list of str, optional
+        The cities to select, by default all of them.
+    start : datetime.datetime or int, optional
+        The earliest observation time to select (inclusive).
+    end : datetime.datetime or int, optional
+        The latest observation time to select (exclusive).
+
+    Returns
+    -------
+    tuple of (str, list)
+        The condition, to follow WHERE, and its parameters.
+    """
+    conditions = []
+    params = []
+    if cities is not None:
+        conditions.append(f"City IN ({', '.join('?' * len(cities))})")
+        params.extend(cities)
+    if start is not None:
+        conditions.append("DateTime >= ?")
+        params.append(to_epoch(start))
+    if end is not None:
+        conditions.append("DateTime < ?")
+        params.append(to_epoch(end))
+    return " AND ".join(conditions) or "1", params
+
+
+# Query weather data by city, time range and columns
+def queryWeather(cities=None, start=None, end=None, columns=None, order="asc", limit=None):
+    """
+    Retrieve selected weather data as a DataFrame.
+
+    Every filter, the column projection, the ordering and the limit are
+    applied by the storage backend (see storage.py), so only the requested
+    values are read and converted. The columns are typed as listed in
+    WEATHER_COLUMNS.
+
+    Parameters
+    ----------
+    cities : list of str, optional
+        The cities to return, by default all of them.
+    start : datetime.datetime or int, optional
+        The earliest observation time to return (inclusive).
+    end : datetime.datetime or int, optional
+        The latest observation time to return (exclusive).
+    columns : list of str, optional
+        The columns to return, keys of WEATHER_COLUMNS, by default every
+        column but Day.
+    order : str, optional
+        "asc" or "desc", the order of observation time, by default "asc".
+    limit : int, optional
+        The maximum number of rows to return, by default no limit.
+
+    Returns
+    -------
+    pd.DataFrame
+        The data, with DateTime as naive local time.
+    """
+    columns = list(columns or [column for column in WEATHER_COLUMNS if column != "Day"])
+    unknown = [column for column in columns if column not in WEATHER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown weather columns: {', '.join(unknown)}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order {order!r}, expected 'asc' or 'desc'")
+    return get_backend().query_weather(cities, start, end, columns, order, limit)
+
+
+def _query_weather(cities, start, end, columns, order, limit):
+    # queryWeather on SQLite, using the (City, DateTime) index
+    where, params = weather_filter(cities, start, end)
+    sql = f"SELECT {', '.join(columns)} FROM weather WHERE {where} ORDER BY DateTime {order.upper()}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    c = get_connection(DATA_DB).cursor()
+    c.execute(sql, params)
+    return read_frame(c, WEATHER_COLUMNS)
 
 
 # Check if the weather data should be updated (if more than 6 minutes have passed)
@@ -124,145 +475,196 @@ def shouldUpdateWeather():
     bool
         True if the weather data should be updated, False otherwise.
     """
-    # Connect to the database
-    conn = sqlite3.connect('Data.db')
+    # Get the thread's connection to the database
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
 
     # Retrieve the last entry from the 'weather' table
     c.execute("SELECT DateTime FROM weather ORDER BY DateTime DESC LIMIT 1")
     last_entry = c.fetchone()
 
-    # Close the database connection
-    conn.close()
-
     # If no entry exists, update the weather
     if not last_entry:
         return True
 
-    # Calculate the time difference since the last entry
-    last_datetime = datetime.datetime.strptime(last_entry[0], '%Y-%m-%d %H:%M:%S.%f')
-    time_difference = datetime.datetime.now() - last_datetime
-
     # Return True if more than 6 minutes (360 seconds) have passed
-    return time_difference.total_seconds() >= 360
+    return time.time() - last_entry[0] >= 360
 
 
-# Delete weather data older than 24 hours
-def dropDataBefore24Hours():
+# Retrieve the latest weather entry of a city
+def lastWeather(city):
     """
-    Deletes weather data older than 24 hours from the database.
+    Retrieve the latest stored weather entry of a city.
+
+    Parameters
+    ----------
+    city : str
+        The city for which to retrieve the entry.
 
-    This function is called periodically to ensure that the database does not
-    grow indefinitely.
+    Returns
+    -------
+    dict or None
+        A dictionary with the keys City, DateTime, Temperature,
+        Temperature_max, Temperature_min, Weather, Feels_like, Wind_Speed and
+        Humidity, or None if the city has no entries.
     """
-    # Connect to the database
-    conn = sqlite3.connect('Data.db')
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
+    c.execute("""
+        SELECT City, DateTime, Temperature, Temperature_max, Temperature_min, Weather, feels_like, Wind_Speed, Humidity
+        FROM weather
+        WHERE City = ?
+        ORDER BY DateTime DESC
+        LIMIT 1
+    """, (city,))
+    row = c.fetchone()
 
-    # Delete all weather data older than 24 hours
-    c.execute("DELETE FROM weather WHERE DateTime < datetime('now', '-24 hours')")
+    if row is None:
+        return None
+    keys = ["City", "DateTime", "Temperature", "Temperature_max", "Temperature_min", "Weather", "Feels_like",
+            "Wind_Speed", "Humidity"]
+    entry = dict(zip(keys, row))
+    entry["DateTime"] = datetime.datetime.fromtimestamp(entry["DateTime"])
+    return entry
+
+
+# Get the time of the latest weather entry of every city
+def lastUpdates():
+    """
+    Retrieve the time of the latest weather entry of every city.
 
-    # Commit the changes
-    conn.commit()
+    Returns
+    -------
+    dict
+        A dictionary mapping each city to the datetime of its latest entry.
+    """
+    conn = get_connection(DATA_DB)
+    c = conn.cursor()
+    c.execute("SELECT City, MAX(DateTime) FROM weather GROUP BY City")
+    rows = c.fetchall()
 
-    # Close the database connection
-    conn.close()
+    return {city: datetime.datetime.fromtimestamp(last) for city, last in rows}
 
 
-# Check if a warning should be triggered (if the last two temperatures are above 35°C)
+# Check if a warning should be triggered (if an alert rule is active for the city)
 def Warning(city):
     """
     Check if a warning should be triggered for the specified city.
 
-    This function checks the last two temperature entries for the specified
-    city and returns True if both temperatures are above 35°C, indicating a
-    warning should be triggered.
+    The alert rules are evaluated by the alert engine after each ingestion
+    round (see alerts.py), which persists their state in the 'alerts' table;
+    this is a lookup of that state. With the default rules, a warning is
+    triggered when the last two temperatures are above WARNING_THRESHOLD.
 
     Parameters
     ----------
     city : str
-        The city for which to check the temperatures.
+        The city for which to check the alerts.
 
     Returns
     -------
     bool
         True if a warning should be triggered, False otherwise.
     """
-    conn = sqlite3.connect('Data.db')
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
-    c.execute("SELECT Temperature FROM weather WHERE City = ? ORDER BY DateTime DESC LIMIT 2", (city,))
-    last_two_temps = c.fetchall()
-    conn.close()
+    c.execute("SELECT EXISTS (SELECT 1 FROM alerts WHERE City = ? AND Active = 1)", (city,))
+    return bool(c.fetchone()[0])
+
+
+# Get the value of a watermark
+def getWatermark(name):
+    """
+    Return the value of a watermark, the progress marker of an incremental job.
+
+    Parameters
+    ----------
+    name : str
+        The name of the watermark.
 
-    # If there are less than 2 temperature entries, do not trigger a warning
-    if len(last_two_temps) < 2:
-        return False
+    Returns
+    -------
+    int
+        The value, 0 if it was never set.
+    """
+    row = get_connection(DATA_DB).execute("SELECT Value FROM watermarks WHERE Name = ?", (name,)).fetchone()
+    return row[0] if row else 0
 
-    # Trigger a warning if both of the last two temperatures are above 35°C
-    return last_two_temps[0][0] > 35 and last_two_temps[1][0] > 35
 
+# Set the value of a watermark
+def setWatermark(name, value):
+    """
+    Set the value of a watermark.
 
+    Parameters
+    ----------
+    name : str
+        The name of the watermark.
+    value : int
+        The new value.
+    """
+    with transaction(DATA_DB) as conn:
+        conn.execute("INSERT OR REPLACE INTO watermarks (Name, Value) VALUES (?, ?)", (name, value))
+
+
+# Generate the daily summaries of every day that received new weather data
 def allSummary():
     """
-    Fetches summary statistics for each city for every day.
+    Fetches summary statistics for each city for every day with new data.
 
-    This function fetches the maximum, minimum, and average temperatures for each
-    city for every day since the data has been collected. It also fetches the
-    most frequent weather status for each day for each city. The resulting data
-    is stored in the 'reports' database table.
+    Only the days of the weather rows added since the previous run (rows
+    above the "allSummary" watermark, a weather rowid) are summarized. Their
+    maximum, minimum and average temperatures and most frequent weather
+    status are read from the running daily aggregates in a single set-based
+    query, and the resulting reports are stored in the 'reports' table in
+    one transaction.
 
     Returns
     -------
-    None
+    int
+        The number of reports written.
     """
-    conn = sqlite3.connect('Data.db')
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
 
-    # Fetch summary statistics for each city for every day
-    c.execute("""
-        SELECT 
-            City, 
-            Date(DateTime) AS Date, 
-            MAX(Temperature) AS max_temp, 
-            MIN(Temperature) AS min_temp, 
-            AVG(Temperature) AS avg_temp
-        FROM weather
-        GROUP BY City, Date(DateTime)
-    """)
-    daily_summaries = c.fetchall()
-
-    for summary in daily_summaries:
-        city = summary[0]
-        date = summary[1]
-        max_temp = summary[2]
-        min_temp = summary[3]
-        avg_temp = summary[4]
+    watermark = getWatermark("allSummary")
+    top = c.execute("SELECT MAX(rowid) FROM weather").fetchone()[0] or 0
+    if top < watermark:
+        # The table was emptied or rebuilt, so rowids started over
+        watermark = 0
+    if top == watermark:
+        return 0
 
-        # Fetch the most frequent weather status for each day for this city
-        c.execute("""
-            SELECT Weather
-            FROM weather
-            WHERE City = ? AND Date(DateTime) = ?
-            GROUP BY Weather
-            ORDER BY COUNT(*) DESC
-            LIMIT 1
-        """, (city, date))
-        mode_status = c.fetchone()
-
-        # Set the most frequent weather status, or default to 'Unknown'
-        dominant_weather = mode_status[0] if mode_status else "Unknown"
-
-        # Save the summary for this city using addSummary
-        addSummary(
-            city,
-            date,
-            max_temp,
-            min_temp,
-            avg_temp,
-            dominant_weather
+    # Fetch the summary of every (city, day) that received rows above the watermark
+    c.execute("""
+        WITH dirty AS (
+            SELECT DISTINCT City, Day FROM weather WHERE rowid > ? AND rowid <= ?
+        ),
+        dominant AS (
+            SELECT r.City, r.Day, r.Weather,
+                   ROW_NUMBER() OVER (PARTITION BY r.City, r.Day ORDER BY r.Count DESC, r.Weather) AS position
+            FROM dirty JOIN weather_daily_conditions r ON r.City = dirty.City AND r.Day = dirty.Day
         )
-
-    conn.close()
+        SELECT a.City, a.Day, a.Temperature_max, a.Temperature_min, a.Temperature_sum / a.Count, d.Weather
+        FROM dirty
+        JOIN weather_daily a ON a.City = dirty.City AND a.Day = dirty.Day
+        LEFT JOIN dominant d ON d.City = a.City AND d.Day = a.Day AND d.position = 1
+    """, (watermark, top))
+
+    summaries = [{
+        "City": city,
+        "DateTime": date_of(day).isoformat(),
+        "max_temp": max_temp,
+        "min_temp": min_temp,
+        "avg_temp": avg_temp,
+        # Default to 'Unknown' if no weather status was recorded
+        "dominant_weather": dominant_weather or "Unknown"
+    } for city, day, max_temp, min_temp, avg_temp, dominant_weather in c.fetchall()]
+
+    # Save all summaries at once, then move the watermark past the rows they cover
+    written = addSummaries(summaries)
+    setWatermark("allSummary", top)
+    return written
 
 
 # Generate a daily weather summary for a given city
@@ -270,6 +672,10 @@ def Summary(city):
     """
     Generate a daily weather summary for the given city.
 
+    The summary is read from the running daily aggregates, which are updated
+    with every inserted observation, so the cost does not depend on how many
+    readings the day holds.
+
     :param city: The city for which to generate the summary.
     :return: A dictionary with the following keys:
         City: The city for which the summary was generated.
@@ -279,29 +685,27 @@ def Summary(city):
         avg_temp: The average temperature recorded for that day.
         dominant_weather: The most frequent weather status for that day.
     """
-    conn = sqlite3.connect('Data.db')
+    conn = get_connection(DATA_DB)
     c = conn.cursor()
+    today = day_of(time.time())
 
     # Fetch the summary statistics for the current day
     c.execute("""
-        SELECT City, Date(DateTime), MAX(Temperature), MIN(Temperature), AVG(Temperature)
-        FROM weather
-        WHERE City = ? AND Date(DateTime) = Date('now')
-        GROUP BY Date(DateTime)
-    """, (city,))
+        SELECT City, Day, Temperature_max, Temperature_min, Temperature_sum / Count
+        FROM weather_daily
+        WHERE City = ? AND Day = ?
+    """, (city, today))
     daily_summaries = c.fetchone()
 
     # Fetch the most frequent weather status for the current day
     c.execute("""
         SELECT Weather
-        FROM weather
-        WHERE City = ? AND Date(DateTime) = Date('now')
-        GROUP BY Weather
-        ORDER BY COUNT(*) DESC
+        FROM weather_daily_conditions
+        WHERE City = ? AND Day = ?
+        ORDER BY Count DESC, Weather
         LIMIT 1
-    """, (city,))
+    """, (city, today))
     mode_status = c.fetchone()
-    conn.close()
 
     # Set the most frequent weather status, or default to 'Unknown'
     dominant_weather = mode_status[0] if mode_status else "Unknown"
@@ -309,7 +713,7 @@ def Summary(city):
     # Return a dictionary with the daily summary
     return {
         "City": daily_summaries[0],
-        "DateTime": daily_summaries[1],
+        "DateTime": date_of(daily_summaries[1]).isoformat(),
         "max_temp": daily_summaries[2],
         "min_temp": daily_summaries[3],
         "avg_temp": daily_summaries[4],
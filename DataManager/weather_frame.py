@@ -0,0 +1,104 @@
+import threading
+import time
+
+import numpy as np
+
+from .db import DATA_DB, get_connection
+from .frames import concat_frames, local_time, read_frame
+from .weather_db import RETENTION_HOURS, WEATHER_COLUMNS, to_epoch, weather_filter
+
+
+class WeatherFrameCache:
+    """
+    Incrementally refreshed DataFrame of the 'weather' table.
+
+    The last loaded frame is kept together with a watermark, the highest
+    rowid read so far. Rows only ever get appended with a higher rowid
+    (backfilled observations included), so each refresh reads just the rows
+    above the watermark and drops the ones that fell out of retention, and
+    costs time proportional to the new data rather than to the table size.
+    The table is reloaded in full if it shrank below the watermark, e.g.
+    after it was emptied or rebuilt.
+
+    Parameters
+    ----------
+    cities : list of str, optional
+        The cities to keep, by default all of them.
+    columns : list of str, optional
+        The columns to keep, keys of weather_db.WEATHER_COLUMNS, by default
+        every column but Day. DateTime is always included.
+    retention : float, optional
+        Seconds of observations kept in the frame, by default RETENTION_HOURS.
+    path : str, optional
+        The weather database, by default DATA_DB.
+    clock : callable, optional
+        Function returning the current Unix time, by default time.time.
+    """
+
+    def __init__(self, cities=None, columns=None, retention=RETENTION_HOURS * 3600, path=DATA_DB, clock=time.time):
+        columns = list(columns or [column for column in WEATHER_COLUMNS if column != "Day"])
+        if "DateTime" not in columns:
+            columns.insert(0, "DateTime")
+        self.cities = cities
+        self.columns = columns
+        self.retention = retention
+        self.path = path
+        self.clock = clock
+        self._frame = None
+        self._watermark = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def _read(self, watermark, cutoff):
+        # Fetch the rows above the watermark that are still within retention
+        where, params = weather_filter(self.cities, start=cutoff)
+        c = get_connection(self.path).cursor()
+        c.execute(f"""
+            SELECT rowid, {", ".join(self.columns)}
+            FROM weather
+            WHERE rowid > ? AND {where}
+            ORDER BY rowid
+        """, [watermark, *params])
+        frame = read_frame(c, {**WEATHER_COLUMNS, "rowid": np.int64})
+        last = int(frame["rowid"].iloc[-1]) if len(frame) else watermark
+        return frame.drop(columns="rowid"), last
+
+    def refresh(self):
+        """
+        Bring the frame up to date with the 'weather' table.
+
+        Returns
+        -------
+        pd.DataFrame
+            The weather data, with DateTime as naive local time. The frame is
+            shared between callers and must not be modified in place.
+        """
+        cutoff = to_epoch(self.clock() - self.retention)
+        with self._lock:
+            top = get_connection(self.path).execute("SELECT MAX(rowid) FROM weather").fetchone()[0] or 0
+            if top < self._watermark:
+                # The table was emptied or rebuilt, start over
+                self._frame = None
+                self._watermark = 0
+                self._oldest = None
+
+            if top > self._watermark or self._frame is None:
+                # Rows of other cities up to the top rowid are skipped for good
+                new, last = self._read(self._watermark, cutoff)
+                self._watermark = max(top, last)
+                if self._frame is None or not len(self._frame):
+                    self._frame = new
+                elif len(new):
+                    self._frame = concat_frames(self._frame, new)
+                if len(new):
+                    oldest = new["DateTime"].min()
+                    self._oldest = oldest if self._oldest is None else min(self._oldest, oldest)
+
+            # Evict the rows that fell out of retention
+            cutoff_time = local_time([cutoff])[0]
+            if self._oldest is not None and self._oldest < cutoff_time:
+                self._frame = self._frame[self._frame["DateTime"] >= cutoff_time].reset_index(drop=True)
+                self._oldest = self._frame["DateTime"].min() if len(self._frame) else None
+
+            return self._frame
+
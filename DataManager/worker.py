@@ -0,0 +1,300 @@
+"""Standalone ingestion worker.
+
+Owns fetching, retention and aggregation so the Streamlit pages only ever
+read from the databases. Run it next to the app with:
+
+    python -m DataManager.worker
+
+The city registry can be split across several workers by consistent hash:
+
+    python -m DataManager.worker --shards 4             # 4 local processes
+    python -m DataManager.worker --shards 4 --shard 2   # one shard, e.g. per host
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from .DataGen import callCities, get_scheduler, track_cities
+from .cities import cities_for_shard
+from .obs_cache import CachingProvider
+from .providers import get_provider, owm_guard, share_owm_quota
+from .report_db import initialize_db as r_db
+from .retention import applyRetention
+from .storage import get_backend
+from .weather_db import allSummary
+from .weather_db import initialize_db as w_db
+
+# File recording the shard layout of the running workers; each shard locks its own file next to it
+LOCK_FILE = os.getenv("WORKER_LOCK_FILE", "worker.lock")
+
+# Longest time the worker sleeps between two checks of the scheduler
+MAX_SLEEP = 60
+
+# Seconds between two retention passes
+RETENTION_INTERVAL = 600
+
+# Seconds between two rebuilds of the daily reports
+AGGREGATE_INTERVAL = 900
+
+
+class WorkerLockError(RuntimeError):
+    """Raised when another worker already holds the lock."""
+
+
+def _lock(lock_file, blocking=False):
+    # Lock an open file exclusively; raises OSError if it is locked elsewhere and not blocking
+    if os.name == "nt":
+        import msvcrt
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _held(path):
+    # Whether a lock file is currently locked by a worker
+    if not os.path.exists(path):
+        return False
+    with open(path, "a+") as lock_file:
+        try:
+            _lock(lock_file)
+        except OSError:
+            return True
+    return False
+
+
+def shard_lock_path(shard, shards, path=None):
+    """Return the lock file of one shard of a layout, next to the layout lock `path`."""
+    return f"{path or LOCK_FILE}.{shard}-of-{shards}"
+
+
+# Take an exclusive, cross-process lock on a file
+def acquire_lock(path=None):
+    """
+    Take an exclusive lock on a lock file without blocking.
+
+    The lock is held by the operating system for as long as the returned file
+    stays open, and is released automatically if the process dies.
+
+    Parameters
+    ----------
+    path : str, optional
+        The lock file, by default LOCK_FILE.
+
+    Returns
+    -------
+    file
+        The open lock file. Keep a reference to it for as long as the lock
+        must be held.
+
+    Raises
+    ------
+    WorkerLockError
+        If another process already holds the lock.
+    """
+    path = path or LOCK_FILE
+    lock_file = open(path, "a+")
+    try:
+        _lock(lock_file)
+    except OSError:
+        lock_file.close()
+        raise WorkerLockError(f"Another worker holds {path}")
+
+    # Record the owner for whoever inspects the lock file
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+# Take the locks of one worker of a shard layout
+def acquire_worker_lock(shard=0, shards=1, path=None):
+    """
+    Check the shard layout of the running workers and take one shard's lock.
+
+    Every worker starts through the layout lock `path`, which records the
+    number of shards the running workers split the registry into. A worker
+    is refused while workers of a different layout still hold their shard
+    locks, so an unsharded worker cannot run next to a sharded set, nor two
+    sets with different numbers of shards, fetching the same cities. The
+    worker then takes the lock of its own shard (see shard_lock_path), so
+    each shard has exactly one active worker, and records its layout.
+
+    Parameters
+    ----------
+    shard : int, optional
+        The shard of the worker, by default 0.
+    shards : int, optional
+        The number of shards of the layout, by default 1 (unsharded).
+    path : str, optional
+        The layout lock file, by default LOCK_FILE.
+
+    Returns
+    -------
+    file
+        The open shard lock file. Keep a reference to it for as long as
+        the worker runs.
+
+    Raises
+    ------
+    WorkerLockError
+        If workers of another layout are running, or another worker holds
+        the shard.
+    """
+    path = path or LOCK_FILE
+    with open(path, "a+") as layout_file:
+        # Workers check and update the layout one at a time
+        _lock(layout_file, blocking=True)
+        layout_file.seek(0)
+        match = re.fullmatch(r"shards=(\d+)", layout_file.read().strip())
+        running = int(match[1]) if match else None
+        if running not in (None, shards) and any(_held(shard_lock_path(i, running, path)) for i in range(running)):
+            raise WorkerLockError(f"Workers with {running} shard(s) are running, cannot start one with {shards}")
+
+        lock_file = acquire_lock(shard_lock_path(shard, shards, path))
+        layout_file.seek(0)
+        layout_file.truncate()
+        layout_file.write(f"shards={shards}")
+        layout_file.flush()
+    return lock_file
+
+
+# Run the ingestion loop until stopped
+def run(stop_event=None, once=False, maintenance=True):
+    """
+    Run the ingestion loop.
+
+    Each iteration fetches the cities the scheduler reports as due, then
+    syncs the storage backend, applies retention and rebuilds the daily
+    reports when their intervals have elapsed, and finally sleeps until the
+    next city falls due.
+
+    Parameters
+    ----------
+    stop_event : threading.Event, optional
+        Event that ends the loop when set.
+    once : bool, optional
+        Run a single iteration and return, by default False.
+    maintenance : bool, optional
+        Run retention and aggregation, by default True. With several shards
+        only shard 0 does, since both work on the whole table.
+    """
+    stop_event = stop_event or threading.Event()
+    last_retention = last_aggregate = 0.0
+
+    while not stop_event.is_set():
+        try:
+            callCities()
+        except Exception as e:
+            print(f"Ingestion round failed: {e!r}")
+
+        now = time.time()
+        if maintenance and now - last_retention >= RETENTION_INTERVAL:
+            try:
+                # Copy the observations to the storage backend before retention deletes them
+                get_backend().sync()
+                applyRetention()
+                last_retention = now
+            except Exception as e:
+                print(f"Retention failed: {e!r}")
+        if now - last_aggregate >= AGGREGATE_INTERVAL:
+            if maintenance:
+                try:
+                    allSummary()
+                except Exception as e:
+                    print(f"Aggregation failed: {e!r}")
+            last_aggregate = now
+            print(f"OWM call stats: {owm_guard.stats()}")
+            provider = get_provider()
+            if isinstance(provider, CachingProvider):
+                print(f"Observation cache stats: {provider.cache.stats()}")
+
+        if once:
+            break
+
+        wait = get_scheduler().seconds_until_next()
+        stop_event.wait(MAX_SLEEP if wait is None else min(MAX_SLEEP, max(1.0, wait)))
+
+
+# Run one worker, optionally restricted to a shard of the city registry
+def run_worker(shard=None, shards=1, once=False):
+    """
+    Run one ingestion worker until it is stopped.
+
+    Parameters
+    ----------
+    shard : int, optional
+        The shard of the city registry to ingest, or None for every city.
+    shards : int, optional
+        The total number of shards, by default 1.
+    once : bool, optional
+        Run a single iteration and return, by default False.
+    """
+    load_dotenv()
+
+    # One lock per shard, after checking that no worker of another layout is running
+    try:
+        lock_file = acquire_worker_lock(0, 1) if shard is None else acquire_worker_lock(shard, shards)
+    except WorkerLockError as e:
+        print(e)
+        sys.exit(1)
+
+    w_db()
+    r_db()
+
+    if shard is not None:
+        cities = cities_for_shard(shard, shards)
+        track_cities(cities)
+        # The shards share one API key, so each gets its part of the quota
+        share_owm_quota(shards)
+        print(f"Shard {shard}/{shards} owns {len(cities)} cities")
+
+    # Stop cleanly on Ctrl+C and on termination by a process manager
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    print(f"Ingestion worker started (pid {os.getpid()})")
+    try:
+        run(stop_event, once=once, maintenance=shard in (None, 0))
+    finally:
+        lock_file.close()
+    print("Ingestion worker stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather ingestion worker")
+    parser.add_argument("--once", action="store_true", help="run a single ingestion round and exit")
+    parser.add_argument("--shards", type=int, default=1, help="number of shards the city registry is split into")
+    parser.add_argument("--shard", type=int, help="run only this shard (default: run every shard locally)")
+    args = parser.parse_args()
+
+    if args.shard is not None or args.shards == 1:
+        run_worker(args.shard if args.shards > 1 else None, args.shards, once=args.once)
+        return
+
+    # Run every shard in its own process to use several cores
+    processes = [multiprocessing.Process(target=run_worker, args=(shard, args.shards, args.once),
+                                         name=f"worker-{shard}")
+                 for shard in range(args.shards)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from DataManager import weather_db
+from DataManager.alerts import AlertEngine, AlertRule, activeAlerts, load_rules
+from DataManager.db import DATA_DB, close_connections, get_connection
+
+
+def reading(city, minutes, temperature, humidity=40, feels_like=None):
+    return {"City": city, "DateTime": datetime.datetime(2024, 5, 1, 12) + datetime.timedelta(minutes=minutes),
+            "Temperature": temperature, "Temperature_max": temperature, "Temperature_min": temperature,
+            "Weather": "haze", "Feels_like": temperature if feels_like is None else feels_like,
+            "Wind_Speed": 3, "Humidity": humidity}
+
+
+class AlertEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_consecutive_rule(self):
+        """The default heat rule needs two readings in a row above the threshold."""
+        engine = AlertEngine(load_rules())
+        self.assertEqual(engine.ingest([reading("Delhi", 0, 36), reading("Pune", 0, 30)]), [])
+        self.assertFalse(weather_db.Warning("Delhi"))
+
+        changes = engine.ingest([reading("Delhi", 10, 37), reading("Pune", 10, 36)])
+        self.assertEqual([(change["City"], change["Active"], change["Value"]) for change in changes],
+                         [("Delhi", True, 37)])
+        self.assertTrue(weather_db.Warning("Delhi"))
+        self.assertFalse(weather_db.Warning("Pune"))
+
+        # The same observation fetched again is not counted twice
+        self.assertEqual(engine.ingest([reading("Pune", 10, 36)]), [])
+
+        changes = engine.ingest([reading("Delhi", 20, 30), reading("Pune", 20, 37)])
+        self.assertEqual({(change["City"], change["Active"]) for change in changes},
+                         {("Delhi", False), ("Pune", True)})
+        self.assertEqual([alert["City"] for alert in activeAlerts()], ["Pune"])
+
+    def test_window_rule(self):
+        """A rolling-window rule tests the aggregate of the last readings, for its cities only."""
+        rules = [AlertRule("humid", "Humidity", ">=", 80, window=3, aggregate="mean", cities=["Mumbai"]),
+                 AlertRule("feels", "feels_like", ">", 40)]
+        engine = AlertEngine(rules)
+        for minutes, humidity in [(0, 70), (10, 90)]:
+            engine.ingest([reading("Mumbai", minutes, 30, humidity), reading("Delhi", minutes, 30, 95)])
+        self.assertEqual(activeAlerts(), [])
+
+        changes = engine.ingest([reading("Mumbai", 20, 30, 85), reading("Delhi", 20, 30, 95, feels_like=42)])
+        self.assertEqual({(change["City"], change["Rule"]) for change in changes},
+                         {("Mumbai", "humid"), ("Delhi", "feels")})
+
+        changes = engine.ingest([reading("Mumbai", 30, 30, 60)])
+        self.assertEqual([(change["Rule"], change["Active"]) for change in changes], [("humid", False)])
+
+    def test_state_survives_restart(self):
+        """A new engine starts from the persisted states and the stored readings."""
+        weather_db.addWeatherMany([reading("Delhi", 0, 36), reading("Delhi", 10, 37)])
+        engine = AlertEngine(load_rules(), clock=lambda: reading("Delhi", 20, 0)["DateTime"].timestamp())
+        engine.warm_up()
+        self.assertEqual(len(engine.evaluate()), 1)
+
+        engine = AlertEngine(load_rules(), clock=lambda: reading("Delhi", 20, 0)["DateTime"].timestamp())
+        engine.warm_up()
+        self.assertEqual(engine.evaluate(), [])
+        self.assertEqual(engine.ingest([reading("Delhi", 20, 38)]), [])
+        self.assertTrue(weather_db.Warning("Delhi"))
+        row = get_connection(DATA_DB).execute("SELECT Active, Value FROM alerts WHERE City = 'Delhi'").fetchone()
+        self.assertEqual(row, (1, 37))
+
+    def test_own_cities(self):
+        """An engine restricted to a shard's cities loads, evaluates and writes only those."""
+        weather_db.addWeatherMany([reading(city, minutes, 37) for city in ["Delhi", "Pune"] for minutes in (0, 10)])
+        engine = AlertEngine(load_rules(), clock=lambda: reading("Delhi", 20, 0)["DateTime"].timestamp(),
+                             cities=["Delhi"])
+        engine.warm_up()
+        self.assertEqual([change["City"] for change in engine.evaluate()], ["Delhi"])
+
+        self.assertEqual(engine.ingest([reading("Pune", 20, 30), reading("Mumbai", 20, 38),
+                                        reading("Mumbai", 30, 38)]), [])
+        self.assertEqual([alert["City"] for alert in activeAlerts()], ["Delhi"])
+
+    def test_load_rules(self):
+        """Rules are read from the config file and validated."""
+        with open("rules.json", "w") as f:
+            json.dump([{"name": "cold", "metric": "Temperature", "op": "<", "threshold": 5, "consecutive": 3}], f)
+        [rule] = load_rules("rules.json")
+        self.assertEqual((rule.name, rule.length), ("cold", 3))
+        self.assertEqual([rule.name for rule in load_rules("missing.json")], ["heat"])
+        with self.assertRaises(ValueError):
+            AlertRule("bad", "Pressure", ">", 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+
+from DataManager.cities import HashRing, cities_for_shard, city_names, load_registry
+
+
+class CityRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Write a registry of 1000 cities, half of them with an OWM city ID."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cities.json")
+        entries = [{"name": f"City{i}", "id": 1000 + i} if i % 2 else f"City{i}" for i in range(1000)]
+        with open(self.path, "w") as f:
+            json.dump(entries, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_registry(self):
+        """Plain names and objects are both accepted."""
+        registry = load_registry(self.path)
+        self.assertEqual(len(registry), 1000)
+        self.assertEqual(registry[0], {"name": "City0", "id": None, "country": None})
+        self.assertEqual(registry[1]["id"], 1001)
+
+    def test_missing_file_falls_back_to_defaults(self):
+        """Without a config file the default cities are monitored."""
+        self.assertIn("Delhi", city_names(os.path.join(self.tmp.name, "missing.json")))
+
+    def test_shards_partition_the_registry(self):
+        """Every city belongs to exactly one shard, and shards are roughly balanced."""
+        shards = [cities_for_shard(shard, 4, self.path) for shard in range(4)]
+        everything = [city for shard in shards for city in shard]
+        self.assertEqual(sorted(everything), sorted(city_names(self.path)))
+        self.assertTrue(all(150 <= len(shard) <= 350 for shard in shards))
+
+    def test_adding_a_shard_moves_few_cities(self):
+        """Growing from 4 to 5 shards keeps most cities on their shard."""
+        before, after = HashRing(4), HashRing(5)
+        moved = sum(before.shard_of(f"City{i}") != after.shard_of(f"City{i}") for i in range(1000))
+        self.assertLess(moved, 350)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import concurrent.futures
+import json
+import os
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from DataManager import providers, weather_db
+from DataManager.DataGen import getWeatherBatch
+from DataManager.city_ids import load_city_ids, resolve_city_ids, save_city_ids
+from DataManager.db import close_connections
+from DataManager.providers import OWMProvider, set_provider
+
+# City IDs of the fake registry, as (id, name, country)
+REGISTRY = [(1273294, "Delhi", "IN"), (1275339, "Mumbai", "IN"), (2988507, "Paris", "FR"),
+            (4717560, "Paris", "US"), (1264527, "Chennai", "IN")]
+
+
+class FakeRegistry:
+    """Stand-in for pyowm's CityIDRegistry, counting its lookups."""
+
+    def __init__(self):
+        self.lookups = []
+
+    def ids_for(self, city_name, country=None, matching="nocase"):
+        self.lookups.append(city_name)
+        return [entry for entry in REGISTRY if entry[1] == city_name and country in (None, entry[2])]
+
+
+def unusable_registry():
+    raise TypeError("'pyowm.commons.cityidregistry' is not a package")
+
+
+def observation(city_id, name, temperature=30):
+    weather = types.SimpleNamespace(
+        temperature=lambda unit: {"temp": temperature, "temp_max": temperature + 1, "temp_min": temperature - 1,
+                                  "feels_like": temperature},
+        reference_time=lambda: 1714564800, detailed_status="haze", wind=lambda: {"speed": 3}, humidity=40)
+    return types.SimpleNamespace(location=types.SimpleNamespace(id=city_id, name=name), weather=weather)
+
+
+class ResolveCityIdsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "city_ids.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookup_and_cache(self):
+        """Missing names are looked up, preferring the country, and cached on disk."""
+        registry = FakeRegistry()
+        city_ids = resolve_city_ids(["Delhi", "Paris", "Atlantis"], registry, country="IN", path=self.path)
+        self.assertEqual(city_ids, {"Delhi": 1273294, "Paris": 2988507})
+        self.assertEqual(load_city_ids(self.path), city_ids)
+
+        # Cached names need no registry at all
+        city_ids = resolve_city_ids(["Paris", "Delhi"], unusable_registry, country="IN", path=self.path)
+        self.assertEqual(city_ids, {"Paris": 2988507, "Delhi": 1273294})
+
+    def test_known_ids(self):
+        """Known IDs win over the cache, and the registry is only built for names still missing."""
+        resolve_city_ids(["Delhi"], FakeRegistry(), path=self.path)
+        city_ids = resolve_city_ids(["Delhi", "Mumbai"], unusable_registry, path=self.path,
+                                    known={"Delhi": 1, "Mumbai": 2})
+        self.assertEqual(city_ids, {"Delhi": 1, "Mumbai": 2})
+
+        registry = FakeRegistry()
+        city_ids = resolve_city_ids(["Delhi", "Chennai"], lambda: registry, path=self.path, known={"Delhi": 1})
+        self.assertEqual(city_ids, {"Delhi": 1, "Chennai": 1264527})
+        self.assertEqual(registry.lookups, ["Chennai"])
+
+    def test_concurrent_saves(self):
+        """Writers saving at the same time, as worker processes do, each move a whole file into place."""
+        def save(i):
+            for j in range(50):
+                save_city_ids({f"City{i}": j, "Delhi": 1273294}, self.path)
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(save, range(4)))
+        self.assertEqual(load_city_ids(self.path)["Delhi"], 1273294)
+        self.assertEqual(os.listdir(self.tmp.name), ["city_ids.json"])
+
+    def test_without_registry(self):
+        """Without a registry, names missing from the cache are left out."""
+        self.assertEqual(resolve_city_ids(["Delhi"], None, path=self.path), {})
+        self.assertFalse(os.path.exists(self.path))
+
+
+class WeatherBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        with open("cities.json", "w") as f:
+            json.dump([{"name": "Delhi", "id": 1273294}, "Mumbai", "Atlantis"], f)
+        weather_db.initialize_db()
+        set_provider(OWMProvider())
+
+        names = {entry[0]: entry[1] for entry in REGISTRY}
+        self.group_calls = []
+
+        def group_call(city_ids):
+            self.group_calls.append(list(city_ids))
+            return {city_id: observation(city_id, names[city_id]) for city_id in city_ids}
+
+        self.registry = FakeRegistry()
+        self.owm = types.SimpleNamespace(city_id_registry=lambda: self.registry)
+        for name, value in [("get_owm", lambda: self.owm), ("owm_group_call", group_call),
+                            ("owm_api_call", lambda city: observation(0, city, temperature=20))]:
+            patcher = mock.patch.object(providers, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        set_provider(None)
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def stored(self):
+        df = weather_db.queryWeather(columns=["City", "Temperature"])
+        return dict(zip(df["City"].astype(str), df["Temperature"]))
+
+    def test_group_and_fallback(self):
+        """Resolved cities come from one group call, the others from per-city calls."""
+        data = getWeatherBatch(["Delhi", "Mumbai", "Atlantis"])
+        self.assertEqual(len(data), 3)
+        self.assertEqual(self.group_calls, [[1273294, 1275339]])
+        self.assertEqual(self.registry.lookups, ["Mumbai", "Atlantis", "Atlantis"])
+        self.assertEqual(self.stored(), {"Delhi": 30, "Mumbai": 30, "Atlantis": 20})
+
+    def test_registry_failure(self):
+        """If pyowm's registry cannot be built, known IDs are still grouped and the rest fetched by name."""
+        self.owm.city_id_registry = unusable_registry
+        data = getWeatherBatch(["Delhi", "Mumbai", "Atlantis"])
+        self.assertEqual(len(data), 3)
+        self.assertEqual(self.group_calls, [[1273294]])
+        self.assertEqual(self.stored(), {"Delhi": 30, "Mumbai": 20, "Atlantis": 20})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import datetime
+import gzip
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import pandas as pd
+
+from DataManager import export_server, report_db, weather_db
+from DataManager.db import close_connections
+from DataManager.export import exportRows, streamExport
+from DataManager.export_server import ExportServer, export_base, export_url
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        report_db.initialize_db()
+        self.start = datetime.datetime.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=5)
+        for city in ["Delhi", "Mumbai"]:
+            for minutes in range(0, 300, 10):
+                weather_db.addWeather(city, self.start + datetime.timedelta(minutes=minutes), 30, 31, 29,
+                                      None if minutes == 0 else "haze", 32, 3, 40)
+        for day in range(3):
+            report_db.addSummary("Delhi", (datetime.date(2024, 5, 1) + datetime.timedelta(days=day)).isoformat(),
+                                 min_temp=20 + day, max_temp=30, avg_temp=25, dominant_weather="haze")
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_chunks(self):
+        """Rows are read in chunks, the first before the query has been read through."""
+        chunks = exportRows("history", cities=["Delhi"], resolution="raw", chunk_rows=8)
+        first = next(chunks)
+        self.assertEqual(len(first["City"]), 8)
+        self.assertEqual(first["DateTime"][0], pd.Timestamp(self.start).to_datetime64())
+        self.assertEqual(sum(len(chunk["City"]) for chunk in chunks), 22)
+
+        parts = list(streamExport("history", "csv", resolution="raw", chunk_rows=8))
+        self.assertEqual(len(parts), 1 + 60 // 8 + 1)
+
+    def test_csv(self):
+        """CSV exports hold the selected rows, with local times and empty missing values."""
+        data = b"".join(streamExport("history", "csv", cities=["Mumbai"], start=self.start,
+                                     end=self.start + datetime.timedelta(hours=1), resolution="raw"))
+        lines = data.decode().splitlines()
+        self.assertEqual(lines[0], "City,DateTime,min_temp,max_temp,avg_temp,count,dominant_weather")
+        self.assertEqual(lines[1], f"Mumbai,{self.start:%Y-%m-%d %H:%M:%S},30.0,30.0,30.0,1,")
+        self.assertEqual(len(lines), 7)
+
+        data = gzip.decompress(b"".join(streamExport("reports", "csv.gz", start=datetime.date(2024, 5, 2))))
+        df = pd.read_csv(io.BytesIO(data))
+        self.assertEqual(list(df["DateTime"]), ["2024-05-02", "2024-05-03"])
+        self.assertEqual(list(df["min_temp"]), [21, 22])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet(self):
+        """Parquet exports write one row group per chunk."""
+        import pyarrow.parquet as pq
+
+        data = b"".join(streamExport("history", "parquet", resolution="hour", chunk_rows=4))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        df = parquet.read().to_pandas()
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df["count"].sum(), 60)
+        self.assertEqual(df["DateTime"][0], pd.Timestamp(self.start))
+
+        df = pd.read_parquet(io.BytesIO(b"".join(streamExport("reports", "parquet", cities=["Mumbai"]))))
+        self.assertEqual(len(df), 0)
+
+    def test_unknown(self):
+        """Unknown datasets and formats are rejected."""
+        with self.assertRaises(ValueError):
+            next(streamExport("users", "csv"))
+        with self.assertRaises(ValueError):
+            next(streamExport("reports", "xlsx"))
+
+    def test_endpoint(self):
+        """The endpoint streams the export as a chunked download, and rejects bad selections."""
+        server = ExportServer("127.0.0.1", 0).start()
+        self.addCleanup(server.stop)
+        base = f"http://127.0.0.1:{server.port}"
+
+        end = self.start + datetime.timedelta(hours=2)
+        url = export_url("history", "csv.gz", cities=["Delhi"], start=self.start, end=end, resolution="raw", base=base)
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+            self.assertEqual(response.headers["Content-Type"], "application/gzip")
+            self.assertIn("attachment", response.headers["Content-Disposition"])
+            data = response.read()
+        expected = b"".join(streamExport("history", "csv", cities=["Delhi"], start=self.start, end=end,
+                                         resolution="raw"))
+        self.assertEqual(gzip.decompress(data), expected)
+
+        url = export_url("reports", "csv", start=datetime.date(2024, 5, 2), base=base)
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(len(response.read().decode().splitlines()), 3)
+
+        for url in [export_url("reports", "xlsx", base=base), f"{base}/export?dataset=history&start=yesterday"]:
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(url)
+            self.assertEqual(raised.exception.code, 400)
+            raised.exception.close()
+
+        # Without pyarrow, Parquet is answered as unsupported rather than with a dropped connection
+        with mock.patch.dict(sys.modules, {"pyarrow": None}):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(export_url("reports", "parquet", base=base))
+        self.assertEqual(raised.exception.code, 501)
+        raised.exception.close()
+
+    def test_endpoint_address(self):
+        """The link points at the host the page was loaded from, unless EXPORT_URL says otherwise."""
+        with mock.patch.object(export_server, "EXPORT_URL", None), \
+                mock.patch.object(export_server, "EXPORT_PORT", 8502):
+            self.assertEqual(export_base("weather.example.com:8501"), "http://weather.example.com:8502")
+            self.assertEqual(export_base("[::1]:8501"), "http://[::1]:8502")
+            self.assertEqual(export_base(None), "http://localhost:8502")
+        with mock.patch.object(export_server, "EXPORT_URL", "https://weather.example.com/downloads"):
+            self.assertEqual(export_base("weather.example.com:8501"), "https://weather.example.com/downloads")
+            self.assertTrue(export_url("reports").startswith("https://weather.example.com/downloads/export?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
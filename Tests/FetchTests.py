@@ -0,0 +1,158 @@
+import concurrent.futures
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from DataManager import DataGen, weather_db
+from DataManager.DataGen import callCities, fetchCities, get_scheduler, track_cities
+from DataManager.db import close_connections
+from DataManager.providers import WeatherProvider, set_provider
+
+# A fixed observation time, so stored rows do not depend on the clock
+REFERENCE_TIME = 1714564800
+
+
+def record(city, temperature=30):
+    return {"City": city, "Reference_time": REFERENCE_TIME, "Temperature": temperature,
+            "Temperature_max": temperature + 1, "Temperature_min": temperature - 1, "Weather": "haze",
+            "Feels_like": temperature, "Wind_Speed": 3, "Humidity": 40}
+
+
+class FakeProvider(WeatherProvider):
+    """A provider with a slow city, held until released, and a failing one."""
+
+    def __init__(self, slow=(), failing=(), latency=0.05):
+        self.slow = set(slow)
+        self.failing = set(failing)
+        self.latency = latency
+        self.release = threading.Event()
+        self.calls = []
+
+    def fetch(self, city):
+        self.calls.append(city)
+        time.sleep(self.latency)
+        if city in self.failing:
+            raise RuntimeError(f"{city} is unavailable")
+        if city in self.slow:
+            self.release.wait()
+        return record(city)
+
+
+class FetchCitiesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        self.provider = FakeProvider(slow=["Kolkata"], failing=["Chennai"])
+        set_provider(self.provider)
+
+    def tearDown(self):
+        self.provider.release.set()
+        set_provider(None)
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_slow_and_failing_cities(self):
+        """A failing city and a city past the timeout do not hold up or spoil the others."""
+        cities = ["Delhi", "Chennai", "Kolkata", "Mumbai"]
+        start = time.perf_counter()
+        data, report = fetchCities(cities, timeout=0.5)
+        self.assertLess(time.perf_counter() - start, 2)
+
+        self.assertEqual(sorted(weather_data["City"] for weather_data in data), ["Delhi", "Mumbai"])
+        self.assertEqual([entry["City"] for entry in report], cities)
+        by_city = {entry["City"]: entry for entry in report}
+        for city in ["Delhi", "Mumbai"]:
+            self.assertIsNone(by_city[city]["Error"])
+            self.assertGreaterEqual(by_city[city]["Latency"], 0.05)
+            self.assertLess(by_city[city]["Latency"], 0.5)
+        self.assertIn("Chennai is unavailable", by_city["Chennai"]["Error"])
+        self.assertEqual((by_city["Kolkata"]["Latency"], by_city["Kolkata"]["Error"]), (None, "Timed out"))
+
+        # Only the cities fetched in time are stored
+        stored = weather_db.queryWeather(columns=["City", "Temperature"])
+        self.assertEqual(sorted(stored["City"].astype(str)), ["Delhi", "Mumbai"])
+
+    def test_failure_latency(self):
+        """A failing city is reported with the time of its own request, not of the round so far."""
+        self.provider.latency = 0.2
+        with mock.patch.object(DataGen, "_get_fetch_pool", return_value=self.pool(1)):
+            data, report = fetchCities(["Delhi", "Mumbai", "Chennai"])
+        by_city = {entry["City"]: entry for entry in report}
+        self.assertIn("Chennai is unavailable", by_city["Chennai"]["Error"])
+        self.assertGreaterEqual(by_city["Chennai"]["Latency"], 0.2)
+        self.assertLess(by_city["Chennai"]["Latency"], 0.4)
+
+    def pool(self, workers):
+        pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_concurrent(self):
+        """Cities are fetched at the same time rather than one after another."""
+        self.provider.latency = 0.2
+        start = time.perf_counter()
+        data, report = fetchCities(["Delhi", "Mumbai", "Pune", "Jaipur"])
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual(len(data), 4)
+        self.assertTrue(all(entry["Error"] is None for entry in report))
+
+
+class FailingProvider(WeatherProvider):
+    """A provider whose batch requests raise."""
+
+    def fetch(self, city):
+        return record(city)
+
+    def fetch_many(self, cities, pool=None):
+        raise ConnectionError("batch endpoint unavailable")
+
+
+class CallCitiesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        set_provider(FakeProvider(latency=0))
+        track_cities(["Delhi", "Mumbai"])
+
+    def tearDown(self):
+        track_cities(None)
+        set_provider(None)
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_failed_round_is_rescheduled(self):
+        """Cities of a round that raised are retried rather than left in flight."""
+        locked = mock.patch.object(DataGen, "addWeatherMany",
+                                   side_effect=sqlite3.OperationalError("database is locked"))
+        for mode in ["concurrent", "sequential", "batch"]:
+            with self.subTest(mode=mode), locked:
+                with self.assertRaises(sqlite3.OperationalError):
+                    callCities(mode=mode)
+                self.assertIsNotNone(get_scheduler().seconds_until_next())
+                self.assertEqual(sorted(get_scheduler().due(now=10 ** 12)), ["Delhi", "Mumbai"])
+                # Put the cities back in the queue for the next mode
+                for city in ["Delhi", "Mumbai"]:
+                    get_scheduler().record_failure(city, now=0)
+
+    def test_failing_batch_falls_back(self):
+        """A batch round whose provider raises fetches the cities one by one."""
+        set_provider(FailingProvider())
+        data = callCities(mode="batch")
+        self.assertEqual(sorted(weather_data["City"] for weather_data in data), ["Delhi", "Mumbai"])
+        self.assertEqual(sorted(get_scheduler().due(now=10 ** 12)), ["Delhi", "Mumbai"])
+
+
+if __name__ == "__main__":
+    unittest.main()
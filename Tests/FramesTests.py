@@ -0,0 +1,60 @@
+import sqlite3
+import unittest
+
+import numpy as np
+
+from DataManager.frames import CATEGORY, DATE, UNIX_TIME, concat_frames, local_time, read_frame
+
+
+class FramesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE t (City TEXT, Time INTEGER, Date TEXT, Value REAL)")
+        self.conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", [
+            (f"City{i % 3}", 1714600000 + i, f"2024-05-0{1 + i % 2}", None if i == 4 else i / 2) for i in range(25)
+        ])
+        self.dtypes = {"City": CATEGORY, "Time": UNIX_TIME, "Date": DATE, "Value": np.float32}
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_read_frame(self):
+        """Rows are read in batches into compactly typed columns, growing the arrays as needed."""
+        df = read_frame(self.conn.execute("SELECT * FROM t ORDER BY Time"), self.dtypes, batch_size=4)
+
+        self.assertEqual(len(df), 25)
+        self.assertEqual(str(df["City"].dtype), "category")
+        self.assertEqual(list(df["City"].cat.categories), ["City0", "City1", "City2"])
+        self.assertEqual(df["City"][5], "City2")
+        self.assertEqual(df["Time"][3], local_time([1714600003])[0])
+        self.assertEqual(str(df["Date"].dtype), "datetime64[s]")
+        self.assertEqual(str(df["Date"][1].date()), "2024-05-02")
+        self.assertEqual(str(df["Value"].dtype), "float32")
+        self.assertTrue(np.isnan(df["Value"][4]))
+        self.assertEqual(df["Value"][24], 12)
+
+    def test_read_frame_with_size(self):
+        """A known row count allocates the arrays once; an empty result keeps the column types."""
+        count = self.conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+        df = read_frame(self.conn.execute("SELECT City, Value FROM t"), self.dtypes, size=count, batch_size=7)
+        self.assertEqual(len(df), 25)
+
+        empty = read_frame(self.conn.execute("SELECT City, Value FROM t WHERE 0"), self.dtypes)
+        self.assertEqual(list(empty.columns), ["City", "Value"])
+        self.assertEqual(str(empty["Value"].dtype), "float32")
+
+    def test_concat_frames(self):
+        """Appending frames with different categories keeps the columns categorical."""
+        first = read_frame(self.conn.execute("SELECT City, Value FROM t WHERE City = 'City0'"), self.dtypes)
+        second = read_frame(self.conn.execute("SELECT City, Value FROM t WHERE City != 'City0'"), self.dtypes)
+        df = concat_frames(first, second)
+
+        self.assertEqual(len(df), 25)
+        self.assertEqual(str(df["City"].dtype), "category")
+        self.assertEqual(sorted(df["City"].cat.categories), ["City0", "City1", "City2"])
+        self.assertEqual(str(df["Value"].dtype), "float32")
+
+
+if __name__ == '__main__':
+    unittest.main()
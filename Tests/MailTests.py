@@ -0,0 +1,120 @@
+import concurrent.futures
+import email
+import smtplib
+import unittest
+from email.mime.text import MIMEText
+
+from Benchmarks.smtp_server import LocalSMTPServer
+from DataManager import mailSystem
+from DataManager.mailSystem import SMTPPool, send_email, set_mail_pool
+
+
+class FakeClock:
+    """A manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def message(to):
+    msg = MIMEText(f"Hello {to}")
+    msg["From"] = "sender@example.com"
+    msg["To"] = to
+    msg["Subject"] = "Weather Report"
+    return msg
+
+
+class SMTPPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalSMTPServer().start()
+
+    def tearDown(self):
+        set_mail_pool(None)
+        self.server.stop()
+
+    def pool(self, **kwargs):
+        pool = SMTPPool("127.0.0.1", self.server.port, user="sender@example.com", password="secret",
+                        starttls=False, timeout=5, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuses_sessions(self):
+        """Messages sent one after another share one connection and login."""
+        pool = self.pool(size=2)
+        for i in range(10):
+            pool.send(message(f"user{i}@example.com"))
+        self.assertEqual(pool.connects, 1)
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual([recipients for recipients, _ in self.server.messages],
+                         [[f"user{i}@example.com"] for i in range(10)])
+
+    def test_session_limits(self):
+        """Sessions are replaced after their message limit and after idling too long."""
+        clock = FakeClock()
+        pool = self.pool(messages_per_session=3, idle_seconds=60, clock=clock)
+        for i in range(7):
+            pool.send(message(f"user{i}@example.com"))
+        self.assertEqual(pool.connects, 3)
+
+        clock.now += 61
+        pool.send(message("late@example.com"))
+        self.assertEqual(pool.connects, 4)
+        self.assertEqual(len(self.server.messages), 8)
+
+    def test_reconnects(self):
+        """A session dropped by the server is replaced and the message sent once."""
+        self.server.drop_after = 2
+        pool = self.pool()
+        for i in range(5):
+            pool.send(message(f"user{i}@example.com"))
+        self.assertEqual([recipients for recipients, _ in self.server.messages],
+                         [[f"user{i}@example.com"] for i in range(5)])
+        self.assertEqual(pool.connects, 3)
+
+    def test_reconnects_after_421(self):
+        """A session closed with a 421 reply to MAIL, RCPT or DATA is replaced and the message sent once."""
+        for command in ["MAIL", "RCPT", "DATA"]:
+            with self.subTest(command=command):
+                self.server.messages.clear()
+                self.server.refuse_after, self.server.refuse_on = 2, command
+                pool = self.pool()
+                for i in range(5):
+                    pool.send(message(f"user{i}@example.com"))
+                self.assertEqual([recipients for recipients, _ in self.server.messages],
+                                 [[f"user{i}@example.com"] for i in range(5)])
+                self.assertEqual(pool.connects, 3)
+
+    def test_refused(self):
+        """A message the server refuses is reported and its session kept."""
+        pool = self.pool()
+        pool.send(message("user@example.com"))
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            pool.send(message("nobody"))
+        pool.send(message("user@example.com"))
+        self.assertEqual(pool.connects, 1)
+
+    def test_concurrent(self):
+        """Concurrent senders never open more sessions than the pool size."""
+        pool = self.pool(size=2)
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda i: pool.send(message(f"user{i}@example.com")), range(40)))
+        self.assertLessEqual(pool.connects, 2)
+        self.assertEqual(len(self.server.messages), 40)
+
+    def test_send_email(self):
+        """send_email goes through the process-wide pool."""
+        set_mail_pool(self.pool())
+        send_email("Weather Warning", "It is hot", "user@example.com")
+        send_email("Weather Warning", "Still hot", "other@example.com")
+        self.assertEqual(mailSystem.get_mail_pool().connects, 1)
+        msg = email.message_from_bytes(self.server.messages[1][1])
+        self.assertEqual((msg["From"], msg["To"], msg["Subject"]),
+                         ("sender@example.com", "other@example.com", "Weather Warning"))
+
+
+if __name__ == "__main__":
+    unittest.main()
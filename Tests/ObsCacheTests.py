@@ -0,0 +1,139 @@
+import concurrent.futures
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from DataManager.db import close_connections
+from DataManager.obs_cache import CachingProvider, ObservationCache
+from DataManager.providers import WeatherProvider
+
+
+class FakeClock:
+    """A manually advanced clock."""
+
+    def __init__(self, now=10000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def record(city, reference_time, temperature=30):
+    return {"City": city, "Reference_time": reference_time, "Temperature": temperature}
+
+
+class CountingProvider(WeatherProvider):
+    """A slow provider counting the cities it is asked for."""
+
+    def __init__(self, clock, latency=0.0):
+        self.clock = clock
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def fetch(self, city):
+        with self._lock:
+            self.calls.append(city)
+        time.sleep(self.latency)
+        return record(city, self.clock())
+
+    def fetch_many(self, cities, pool=None):
+        return {city: self.fetch(city) for city in cities}
+
+
+class ObservationCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ObsCache.db")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        close_connections()
+        self.tmp.cleanup()
+
+    def test_expiry(self):
+        """Records expire `ttl` after their reference time, but no sooner than `min_ttl` after storing."""
+        cache = ObservationCache(ttl=600, min_ttl=60, path=None, clock=self.clock)
+        cache.put(record("Delhi", self.clock.now - 100))
+        cache.put(record("Mumbai", self.clock.now - 3600))
+        self.clock.now += 59
+        self.assertEqual(cache.get("Mumbai")["City"], "Mumbai")
+        self.clock.now += 2
+        self.assertIsNone(cache.get("Mumbai"))
+        self.assertEqual(cache.get("Delhi")["Temperature"], 30)
+        self.clock.now += 440
+        self.assertIsNone(cache.get("Delhi"))
+
+    def test_lru_eviction(self):
+        """The least recently used record is evicted from memory first."""
+        cache = ObservationCache(max_entries=2, path=None, clock=self.clock)
+        for city in ["Delhi", "Mumbai"]:
+            cache.put(record(city, self.clock.now))
+        cache.get("Delhi")
+        cache.put(record("Pune", self.clock.now))
+        self.assertIsNone(cache.get("Mumbai"))
+        self.assertIsNotNone(cache.get("Delhi"))
+        self.assertIsNotNone(cache.get("Pune"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_disk_fallback(self):
+        """Records missing from memory are read from the SQLite copy while still fresh."""
+        cache = ObservationCache(max_entries=1, path=self.path, clock=self.clock)
+        cache.put(record("Delhi", self.clock.now))
+        cache.put(record("Mumbai", self.clock.now))
+        self.assertEqual(cache.get("Delhi")["City"], "Delhi")
+
+        # A new process starts with an empty memory level
+        restarted = ObservationCache(path=self.path, clock=self.clock)
+        self.assertEqual(restarted.get("Mumbai")["City"], "Mumbai")
+        self.assertEqual(restarted.get("Mumbai")["City"], "Mumbai")
+        self.clock.now += 601
+        self.assertIsNone(ObservationCache(path=self.path, clock=self.clock).get("Delhi"))
+
+        stats = restarted.stats()
+        self.assertEqual((stats["hits"], stats["disk_hits"], stats["misses"]), (1, 1, 0))
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+
+    def test_stats(self):
+        """Hits and misses are counted and give the hit ratio."""
+        cache = ObservationCache(path=None, clock=self.clock)
+        self.assertIsNone(cache.get("Delhi"))
+        cache.put(record("Delhi", self.clock.now))
+        for _ in range(3):
+            cache.get("Delhi")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+        self.assertEqual(stats["hit_ratio"], 0.75)
+
+
+class CachingProviderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(time.time())
+        self.provider = CountingProvider(self.clock, latency=0.1)
+        self.caching = CachingProvider(self.provider, ObservationCache(path=None, clock=self.clock))
+
+    def test_concurrent_misses(self):
+        """Concurrent requests for an uncached city make a single call to the provider."""
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            records = list(executor.map(self.caching.fetch, ["Delhi"] * 8 + ["Mumbai"] * 8))
+        self.assertEqual(sorted(self.provider.calls), ["Delhi", "Mumbai"])
+        self.assertEqual({r["City"] for r in records}, {"Delhi", "Mumbai"})
+
+    def test_fetch_many(self):
+        """Only cities missing from the cache are fetched, and fetched again once expired."""
+        self.caching.fetch("Delhi")
+        records = self.caching.fetch_many(["Delhi", "Mumbai"])
+        self.assertEqual(set(records), {"Delhi", "Mumbai"})
+        self.assertEqual(self.provider.calls, ["Delhi", "Mumbai"])
+
+        self.clock.now += 601
+        self.caching.fetch_many(["Delhi", "Mumbai"])
+        self.assertEqual(self.provider.calls, ["Delhi", "Mumbai", "Delhi", "Mumbai"])
+
+
+if __name__ == "__main__":
+    unittest.main()
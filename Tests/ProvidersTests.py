@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from DataManager import weather_db
+from DataManager.DataGen import fetchCities
+from DataManager.db import close_connections
+from DataManager.obs_cache import CachingProvider
+from DataManager.providers import (RECORDING_FILE, RecordingProvider, ReplayProvider, SyntheticProvider,
+                                   provider_from_env, set_provider)
+
+
+class RecordReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+
+    def tearDown(self):
+        set_provider(None)
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Recorded observations are replayed in order, for any city, and ingested like live ones."""
+        recorder = RecordingProvider(SyntheticProvider(seed=0), "recordings")
+        first = recorder.fetch_many(["Delhi", "Mumbai"])
+        second = recorder.fetch("Delhi")
+        with open(os.path.join("recordings", RECORDING_FILE)) as f:
+            self.assertEqual([json.loads(line) for line in f], [first["Delhi"], first["Mumbai"], second])
+        self.assertNotEqual(first["Delhi"]["Temperature"], second["Temperature"])
+
+        replay = ReplayProvider("recordings", rebase_time=False)
+        self.assertEqual([replay.fetch("Delhi"), replay.fetch("Delhi"), replay.fetch("Delhi")],
+                         [first["Delhi"], second, first["Delhi"]])
+        self.assertEqual(replay.fetch_many(["Mumbai"]), {"Mumbai": first["Mumbai"]})
+        # A city never recorded borrows a recorded city's observations
+        pune = replay.fetch("Pune")
+        self.assertEqual(pune["City"], "Pune")
+        self.assertIn({**pune, "City": "Delhi"}, [first["Delhi"], second])
+
+        set_provider(ReplayProvider("recordings"))
+        data, report = fetchCities(["Delhi", "Mumbai", "Pune"])
+        self.assertTrue(all(entry["Error"] is None for entry in report))
+        stored = weather_db.queryWeather(columns=["City", "Temperature"])
+        self.assertEqual(sorted(stored["City"].astype(str)), ["Delhi", "Mumbai", "Pune"])
+        self.assertAlmostEqual(float(stored.set_index("City").loc["Mumbai", "Temperature"]),
+                               first["Mumbai"]["Temperature"], places=4)
+
+    def test_empty_recording(self):
+        """Replaying a recording without observations is an error."""
+        os.makedirs("recordings")
+        open(os.path.join("recordings", RECORDING_FILE), "w").close()
+        with self.assertRaises(ValueError):
+            ReplayProvider("recordings")
+
+    def test_provider_from_env(self):
+        """The environment picks the provider, the recorder and the cache."""
+        with mock.patch.dict(os.environ, {"WEATHER_PROVIDER": "synthetic", "WEATHER_RECORD_DIR": "recordings",
+                                          "WEATHER_CACHE": "0"}):
+            provider = provider_from_env()
+        self.assertIsInstance(provider, RecordingProvider)
+        self.assertIsInstance(provider.provider, SyntheticProvider)
+        provider.fetch("Delhi")
+
+        with mock.patch.dict(os.environ, {"WEATHER_PROVIDER": "replay", "WEATHER_REPLAY_DIR": "recordings"}):
+            os.environ.pop("WEATHER_CACHE", None)
+            os.environ.pop("WEATHER_RECORD_DIR", None)
+            provider = provider_from_env()
+        self.assertIsInstance(provider, CachingProvider)
+        self.assertIsInstance(provider.provider, ReplayProvider)
+        self.assertEqual(provider.fetch("Delhi")["City"], "Delhi")
+
+        with mock.patch.dict(os.environ, {"WEATHER_PROVIDER": "carrier-pigeon"}):
+            with self.assertRaises(ValueError):
+                provider_from_env()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import datetime
+import importlib.util
+import io
+import os
+import re
+import tempfile
+import unittest
+
+from DataManager import Users_db, report_db, weather_db
+from DataManager.alerts import AlertEngine, activeAlerts, load_rules
+from DataManager.db import DATA_DB, REPORT_DB, USERS_DB, close_connections, get_connection
+from DataManager.export import streamExport
+from DataManager.obs_cache import ObservationCache
+from DataManager.retention import applyRetention, weatherHistory
+from DataManager.weather_frame import WeatherFrameCache
+
+# Statements that read a whole table on purpose
+ALLOWED_FULL_SCANS = [
+    "SELECT City, DateTime, Temperature, Temperature_max, Temperature_min, Weather, feels_like, Wind_Speed, "
+    "Humidity FROM weather",
+    "SELECT * FROM reports",
+    "SELECT City, Rule, Active FROM alerts",
+]
+
+# A full scan reads a table without using any index (scans of subquery results are fine)
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+
+
+class QueryPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Create fresh databases in a temporary directory and record every statement run on them."""
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+        weather_db.initialize_db()
+        report_db.initialize_db()
+        Users_db.initialize_db()
+        self.cache_db = os.path.join(self.tmp.name, "ObsCache.db")
+        self.cache = ObservationCache(path=self.cache_db)
+
+        self.statements = []
+        for path in (DATA_DB, REPORT_DB, USERS_DB, self.cache_db):
+            get_connection(path).set_trace_callback(
+                lambda statement, path=path: self.statements.append((path, statement)))
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def exercise(self):
+        """Call every function of the DataManager package that queries a database."""
+        now = datetime.datetime.now().replace(microsecond=0)
+        for city in ["Delhi", "Mumbai"]:
+            for minutes in range(0, 60, 10):
+                weather_db.addWeather(city, now - datetime.timedelta(minutes=minutes), 30, 31, 29, "haze",
+                                      32, 3, 40)
+
+        weather_db.getWeather()
+        weather_db.queryWeather(cities=["Delhi"], start=now - datetime.timedelta(hours=1),
+                                columns=["DateTime", "Temperature"], order="desc", limit=10)
+        frame = WeatherFrameCache(cities=["Mumbai"], columns=["Temperature"])
+        frame.refresh()
+        frame = WeatherFrameCache()
+        frame.refresh()
+        weather_db.addWeather("Delhi", now + datetime.timedelta(minutes=10), 30, 31, 29, "haze", 32, 3, 40)
+        frame.refresh()
+        weather_db.shouldUpdateWeather()
+        weather_db.lastWeather("Delhi")
+        weather_db.lastUpdates()
+        engine = AlertEngine(load_rules())
+        engine.warm_up()
+        engine.ingest([weather_db.lastWeather("Delhi")])
+        weather_db.Warning("Delhi")
+        activeAlerts("Delhi")
+        weather_db.Summary("Delhi")
+        weather_db.allSummary()
+        if importlib.util.find_spec("duckdb"):
+            from DataManager.parquet_store import ParquetBackend
+            parquet = ParquetBackend(os.path.join(self.tmp.name, "weather_parquet"))
+            parquet.sync(force=True)
+            parquet.query_weather(["Delhi"], now - datetime.timedelta(hours=1), None, ["Temperature"], "asc", None)
+            parquet.weather_history(None, now - datetime.timedelta(days=1), None, "hour")
+        applyRetention(now=now.timestamp() + 2 * 86400)
+        for resolution in ["raw", "hour", "day"]:
+            weatherHistory(start=now - datetime.timedelta(days=1), end=now, resolution=resolution)
+            weatherHistory(cities=["Delhi"], start=now - datetime.timedelta(days=1), resolution=resolution)
+
+        report_db.addSummary("Delhi", now.date().isoformat(), min_temp=29, max_temp=31, avg_temp=30,
+                             dominant_weather="haze")
+        report_db.getSummary()
+        for dataset, start in [("history", now - datetime.timedelta(days=1)), ("reports", now.date())]:
+            list(streamExport(dataset, "csv", start=start))
+            list(streamExport(dataset, "csv", cities=["Delhi"], start=start, end=start + datetime.timedelta(days=1)))
+
+        Users_db.subscribe("user", "user@example.com", "Delhi")
+        Users_db.subscribe("user", "user@example.com", "Mumbai")
+        Users_db.get_users_by_city("Mumbai")
+        Users_db.unsubscribe("user@example.com")
+        Users_db.import_subscribers(io.StringIO("UserName,Mail,City\nuser,user@example.com,Delhi\n"))
+        Users_db.unsubscribe_many(["user@example.com"])
+        list(Users_db.subscribers_by_city(["Delhi", "Mumbai"]))
+        list(Users_db.subscribers_by_city(alerting=True))
+
+        self.cache.put({"City": "Delhi", "Reference_time": now.timestamp(), "Temperature": 30})
+        self.cache.get("Delhi")
+        self.cache._memory.clear()
+        self.cache.get("Delhi")
+
+    def test_no_full_table_scans(self):
+        """No statement run by the DataManager package scans a whole table without an index."""
+        self.exercise()
+        for path in (DATA_DB, REPORT_DB, USERS_DB, self.cache_db):
+            get_connection(path).set_trace_callback(None)
+
+        checked = 0
+        for path, statement in self.statements:
+            sql = " ".join(statement.split())
+            if not re.match(r"^(SELECT|UPDATE|DELETE|INSERT|WITH)\b", sql, re.IGNORECASE):
+                continue
+            if any(sql.startswith(allowed) for allowed in ALLOWED_FULL_SCANS):
+                continue
+
+            plan = get_connection(path).execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+            tables = {name for name, in get_connection(path).execute("SELECT name FROM sqlite_master")}
+            scans = [row[3] for row in plan if FULL_SCAN.match(row[3]) and FULL_SCAN.match(row[3])[2] in tables]
+            self.assertEqual(scans, [], f"Full table scan in: {sql}")
+            checked += 1
+
+        self.assertGreater(checked, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
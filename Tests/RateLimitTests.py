@@ -0,0 +1,106 @@
+import unittest
+
+from DataManager.ratelimit import CallGuard, CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class FakeClock:
+    """A manually advanced clock whose sleep just moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def test_burst_then_throttle(self):
+        """Calls within the burst go straight through, later ones wait for the rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(60, burst=2, clock=clock, sleep=clock.sleep)
+        self.assertFalse(bucket.acquire())
+        self.assertFalse(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertAlmostEqual(clock.now, 1.0)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def test_opens_and_backs_off(self):
+        """The breaker opens after the threshold and doubles its timeout on a failed trial."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+
+        clock.now = 25
+        self.assertFalse(breaker.allow())
+        clock.now = 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class CallGuardTestCase(unittest.TestCase):
+
+    def make_guard(self, **kwargs):
+        clock = FakeClock()
+        limiter = TokenBucket(6000, burst=100, clock=clock, sleep=clock.sleep)
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+        return CallGuard(limiter, breaker, retries=2, sleep=clock.sleep, **kwargs)
+
+    def test_retries_then_succeeds(self):
+        """Transient failures are retried and counted."""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("temporary")
+            return "ok"
+
+        guard = self.make_guard()
+        self.assertEqual(guard.call(flaky), "ok")
+        self.assertEqual(guard.stats()["retried"], 2)
+
+    def test_short_circuits_after_failure(self):
+        """Once the breaker is open, calls fail fast without reaching the function."""
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise ConnectionError("down")
+
+        guard = self.make_guard()
+        with self.assertRaises(ConnectionError):
+            guard.call(broken)
+        with self.assertRaises(CircuitOpenError):
+            guard.call(broken)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(guard.stats()["short_circuited"], 1)
+
+    def test_non_retryable_is_raised_immediately(self):
+        """Non-retryable errors are not retried and do not open the breaker."""
+        def missing():
+            raise KeyError("no such city")
+
+        guard = self.make_guard(non_retryable=(KeyError,))
+        with self.assertRaises(KeyError):
+            guard.call(missing)
+        self.assertEqual(guard.stats()["retried"], 0)
+        self.assertEqual(guard.stats()["breaker"], CircuitBreaker.CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
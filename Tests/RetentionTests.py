@@ -0,0 +1,87 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from DataManager import weather_db
+from DataManager.db import DATA_DB, close_connections, get_connection
+from DataManager.retention import applyRetention, routeHistory, weatherHistory
+
+
+class RetentionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        # Local noon, so the two days below are whole local days
+        self.day = datetime.datetime(2024, 5, 1)
+        self.now = int((self.day + datetime.timedelta(days=3, hours=12)).timestamp())
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def add(self, time, temperature, weather="haze"):
+        weather_db.addWeather("Delhi", time, temperature, temperature + 1, temperature - 1, weather, 32, 3, 40)
+
+    def count(self, table):
+        return get_connection(DATA_DB).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_rolls_up_aged_rows(self):
+        """Observations older than the raw retention become hourly rollups; daily ones hold every day."""
+        for minutes in range(0, 120, 10):
+            self.add(self.day + datetime.timedelta(hours=10, minutes=minutes), 20 + minutes / 10,
+                     "rain" if minutes < 40 else "haze")
+        self.add(datetime.datetime.fromtimestamp(self.now - 600), 35)
+
+        self.assertEqual(applyRetention(now=self.now), 12)
+        self.assertEqual(self.count("weather"), 1)
+        self.assertEqual(self.count("weather_hourly"), 2)
+        self.assertEqual(self.count("weather_daily"), 2)
+
+        daily = weatherHistory(cities=["Delhi"], end=self.day + datetime.timedelta(days=1), resolution="day")
+        self.assertEqual(len(daily), 1)
+        self.assertEqual(daily["DateTime"][0], self.day)
+        self.assertEqual((daily["min_temp"][0], daily["max_temp"][0], daily["count"][0]), (20, 31, 12))
+        self.assertAlmostEqual(daily["avg_temp"][0], 25.5, places=5)
+        self.assertEqual(daily["dominant_weather"][0], "haze")
+
+        hourly = weatherHistory(cities=["Delhi"], start=self.day, resolution="hour")
+        self.assertEqual(list(hourly["count"]), [6, 6, 1])
+        self.assertEqual(list(hourly["dominant_weather"][:2]), ["rain", "haze"])
+
+    def test_late_rows_are_merged(self):
+        """An observation arriving after its hour was rolled up is added to the rollup."""
+        self.add(self.day + datetime.timedelta(hours=10), 20)
+        applyRetention(now=self.now)
+        self.add(self.day + datetime.timedelta(hours=10, minutes=30), 30)
+
+        # Before the next pass, the history combines the rollup and the raw row
+        hourly = weatherHistory(cities=["Delhi"], start=self.day, resolution="hour")
+        self.assertEqual((hourly["min_temp"][0], hourly["max_temp"][0], hourly["count"][0]), (20, 30, 2))
+
+        applyRetention(now=self.now)
+        self.assertEqual(self.count("weather"), 0)
+        self.assertEqual(get_connection(DATA_DB).execute(
+            "SELECT Temperature_min, Temperature_max, Count FROM weather_daily").fetchall(), [(20, 30, 2)])
+
+    def test_hourly_rollups_expire(self):
+        """Hourly rollups are dropped after their retention while daily ones stay."""
+        self.add(self.day + datetime.timedelta(hours=10), 20)
+        applyRetention(now=self.now + 365 * 86400)
+        self.assertEqual(self.count("weather_hourly"), 0)
+        self.assertEqual(self.count("weather_daily"), 1)
+
+    def test_route_history(self):
+        """Queries go to the cheapest tier that reaches back far enough."""
+        self.assertEqual(routeHistory(self.now - 3600, now=self.now), "raw")
+        self.assertEqual(routeHistory(self.now - 7 * 86400, now=self.now), "hour")
+        self.assertEqual(routeHistory(self.now - 365 * 86400, now=self.now), "day")
+        self.assertEqual(routeHistory(None, now=self.now), "day")
+
+
+if __name__ == '__main__':
+    unittest.main()
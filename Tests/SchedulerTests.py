@@ -0,0 +1,82 @@
+import random
+import unittest
+
+from DataManager.scheduler import PollScheduler
+
+
+class PollSchedulerTestCase(unittest.TestCase):
+
+    def make_scheduler(self, **kwargs):
+        """Create a scheduler without jitter so due times are predictable."""
+        return PollScheduler(jitter=0, rng=random.Random(0), clock=lambda: 0, **kwargs)
+
+    def test_new_city_is_due_immediately(self):
+        """A city without stored observations is due straight away."""
+        scheduler = self.make_scheduler()
+        scheduler.add("Delhi")
+        self.assertEqual(scheduler.due(now=0), ["Delhi"])
+
+    def test_due_orders_by_next_due_time(self):
+        """Cities are returned most overdue first and only once until rescheduled."""
+        scheduler = self.make_scheduler(base_interval=600)
+        scheduler.add("Delhi", last_update=100)
+        scheduler.add("Mumbai", last_update=0)
+        scheduler.add("Chennai", last_update=1000)
+        self.assertEqual(scheduler.due(now=800), ["Mumbai", "Delhi"])
+        self.assertEqual(scheduler.due(now=800), [])
+
+    def test_stable_city_backs_off(self):
+        """A city with stable temperatures is polled less and less often."""
+        scheduler = self.make_scheduler(base_interval=600, max_interval=1000, backoff=1.5)
+        scheduler.add("Delhi")
+        scheduler.due(now=0)
+        scheduler.record_success("Delhi", 20, now=0)
+        self.assertEqual(scheduler.seconds_until_next(now=0), 600)
+        scheduler.due(now=600)
+        scheduler.record_success("Delhi", 20, now=600)
+        self.assertEqual(scheduler.seconds_until_next(now=600), 900)
+        scheduler.due(now=1500)
+        scheduler.record_success("Delhi", 20, now=1500)
+        self.assertEqual(scheduler.seconds_until_next(now=1500), 1000)
+
+    def test_city_near_threshold_is_polled_fast(self):
+        """A city close to the warning threshold is polled at the minimum interval."""
+        scheduler = self.make_scheduler(min_interval=300, warning_threshold=35, warning_margin=3)
+        scheduler.add("Delhi")
+        scheduler.due(now=0)
+        scheduler.record_success("Delhi", 33, now=0)
+        self.assertEqual(scheduler.seconds_until_next(now=0), 300)
+
+    def test_fast_change_is_polled_fast(self):
+        """A city whose temperature changes quickly is polled at the minimum interval."""
+        scheduler = self.make_scheduler(base_interval=600, min_interval=300, fast_change=2)
+        scheduler.add("Delhi")
+        scheduler.due(now=0)
+        scheduler.record_success("Delhi", 20, now=0)
+        scheduler.due(now=600)
+        scheduler.record_success("Delhi", 22, now=600)
+        self.assertEqual(scheduler.seconds_until_next(now=600), 300)
+
+    def test_failure_retries_early_with_backoff(self):
+        """A failed city is retried before its normal interval, with growing delays."""
+        scheduler = self.make_scheduler(base_interval=600, retry_interval=60)
+        scheduler.add("Delhi")
+        scheduler.due(now=0)
+        scheduler.record_failure("Delhi", now=0)
+        self.assertEqual(scheduler.seconds_until_next(now=0), 60)
+        scheduler.due(now=60)
+        scheduler.record_failure("Delhi", now=60)
+        self.assertEqual(scheduler.seconds_until_next(now=60), 120)
+
+    def test_jitter_spreads_due_times(self):
+        """Cities added at the same time do not all fall due at the same moment."""
+        scheduler = PollScheduler(base_interval=600, jitter=0.1, rng=random.Random(0))
+        for i in range(20):
+            scheduler.add(f"City{i}", last_update=0)
+        due_times = {state["due"] for state in scheduler._state.values()}
+        self.assertEqual(len(due_times), 20)
+        self.assertTrue(all(540 <= due <= 660 for due in due_times))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from DataManager import weather_db
+from DataManager.db import close_connections
+from DataManager.export import exportRows
+from DataManager.retention import applyRetention, weatherHistory
+from DataManager.sqlite_store import SQLiteBackend
+from DataManager.storage import set_backend
+
+
+@unittest.skipUnless(importlib.util.find_spec("duckdb"), "DuckDB is not installed")
+class ParquetBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from DataManager.parquet_store import ParquetBackend
+
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        self.parquet = ParquetBackend("weather_parquet")
+        set_backend(self.parquet)
+
+        # Three days of hourly observations for two cities, ending an hour ago
+        self.now = int(datetime.datetime.now().replace(minute=30, second=0, microsecond=0).timestamp())
+        self.start = self.now - 72 * 3600
+        self.add(self.start, self.now - 3600)
+
+    def tearDown(self):
+        set_backend(None)
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def add(self, start, end):
+        weather_db.addWeatherMany({
+            "City": city, "DateTime": epoch, "Temperature": 20 + epoch % 7 + index, "Temperature_max": 30,
+            "Temperature_min": 10, "Weather": ["haze", "mist", None][epoch // 3600 % 3], "Feels_like": 25,
+            "Wind_Speed": 3, "Humidity": 40,
+        } for index, city in enumerate(["Delhi", "Mumbai"]) for epoch in range(start, end, 3600))
+
+    def assertSameAsSQLite(self, *args):
+        # Observations made at the same time may come in any order
+        expected = SQLiteBackend().weather_history(*args).sort_values(["DateTime", "City"], ignore_index=True,
+                                                                      key=lambda column: column.astype(str))
+        actual = self.parquet.weather_history(*args).sort_values(["DateTime", "City"], ignore_index=True,
+                                                                 key=lambda column: column.astype(str))
+        pd.testing.assert_frame_equal(actual, expected, check_categorical=False, check_dtype=False)
+
+    def test_reads_match_sqlite(self):
+        """Before and after copies, the Parquet backend returns what SQLite returns."""
+        for resolution in ["raw", "hour", "day"]:
+            self.assertSameAsSQLite(None, self.start, None, resolution)
+
+        self.assertEqual(self.parquet.sync(), 142)
+        self.add(self.now - 3600, self.now + 3600)
+        # Recent observations wait for more before being copied
+        self.assertEqual(self.parquet.sync(), 0)
+
+        columns = ["City", "DateTime", "Temperature", "Weather"]
+        expected = SQLiteBackend().query_weather(["Delhi"], self.start + 7200, self.now, columns, "desc", 10)
+        actual = weather_db.queryWeather(["Delhi"], self.start + 7200, self.now, columns, "desc", 10)
+        pd.testing.assert_frame_equal(actual, expected, check_categorical=False)
+        self.assertEqual(len(weather_db.queryWeather()), 146)
+
+        for resolution in ["raw", "hour", "day"]:
+            self.assertSameAsSQLite(["Mumbai"], self.start, self.now + 3600, resolution)
+            self.assertSameAsSQLite(None, self.now - 30 * 3600, None, resolution)
+
+    def test_keeps_history_past_retention(self):
+        """Observations deleted from SQLite by retention are still read from Parquet."""
+        self.parquet.sync()
+        applyRetention(now=self.now)
+        self.assertEqual(len(weather_db.queryWeather(cities=["Delhi"])), 71)
+
+        expected = SQLiteBackend().weather_history(None, None, None, "day")
+        pd.testing.assert_frame_equal(weatherHistory(resolution="day"), expected, check_categorical=False,
+                                      check_dtype=False)
+        self.assertEqual(len(weatherHistory(start=self.start, resolution="raw")), 142)
+
+    def test_exports_history_past_retention(self):
+        """The history export reads through the backend, including what SQLite no longer holds."""
+        self.parquet.sync()
+        applyRetention(now=self.now)
+
+        chunks = list(exportRows("history", start=self.start, resolution="raw", chunk_rows=50))
+        exported = pd.DataFrame({column: [value for chunk in chunks for value in chunk[column]]
+                                 for column in chunks[0]})
+        self.assertEqual(len(exported), 142)
+        expected = weatherHistory(start=self.start, resolution="raw")
+        pd.testing.assert_series_equal(exported["avg_temp"].sort_values(ignore_index=True),
+                                       expected["avg_temp"].astype(float).sort_values(ignore_index=True),
+                                       check_names=False)
+        self.assertEqual(sorted(exported["City"].unique()), ["Delhi", "Mumbai"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import os
+import tempfile
+import unittest
+
+from DataManager import Users_db, weather_db
+from DataManager.db import DATA_DB, USERS_DB, close_connections, get_connection, transaction
+
+
+class UsersDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        Users_db.initialize_db()
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_subscribe(self):
+        """Subscribing again moves the user to the new city and keeps one row."""
+        Users_db.subscribe("user", "user@example.com", "Delhi")
+        Users_db.subscribe("other name", "user@example.com", "Mumbai")
+        self.assertEqual(Users_db.get_users_by_city("Delhi"), [])
+        self.assertEqual(Users_db.get_users_by_city("Mumbai"), [("user", "user@example.com")])
+
+        Users_db.unsubscribe("user@example.com")
+        Users_db.unsubscribe("user@example.com")
+        self.assertEqual(Users_db.get_users_by_city("Mumbai"), [])
+
+    def test_import(self):
+        """CSV rows are imported in batches and invalid ones are reported."""
+        lines = ["UserName,Mail,City,Source"]
+        lines += [f"user{i},user{i}@example.com,{['Delhi', 'Mumbai'][i % 2]},partner" for i in range(25)]
+        lines += ["bad,not-an-address,Delhi,partner", "nowhere,nowhere@example.com,Atlantis,partner",
+                  "moved,user0@example.com,Mumbai,partner"]
+        imported, rejected = Users_db.import_subscribers(io.StringIO("\n".join(lines)),
+                                                         cities=["Delhi", "Mumbai"], batch_size=4)
+        self.assertEqual(imported, 26)
+        self.assertEqual([line for line, _ in rejected], [27, 28])
+
+        count, = get_connection(USERS_DB).execute("SELECT COUNT(*) FROM users").fetchone()
+        self.assertEqual(count, 25)
+        self.assertEqual(len(Users_db.get_users_by_city("Mumbai")), 13)
+        # The first import of an address keeps its name
+        self.assertIn(("user0", "user0@example.com"), Users_db.get_users_by_city("Mumbai"))
+
+        removed = Users_db.unsubscribe_many(f"user{i}@example.com" for i in range(0, 40, 2))
+        self.assertEqual(removed, 13)
+        self.assertEqual(len(Users_db.get_users_by_city("Delhi")), 0)
+
+    def test_import_header(self):
+        """A CSV without the required columns is rejected before anything is written."""
+        with self.assertRaises(ValueError):
+            Users_db.import_subscribers(io.StringIO("Name,Mail\nuser,user@example.com\n"))
+
+    def test_fan_out(self):
+        """Subscribers stream in bounded groups per city, optionally only for cities with an active alert."""
+        for i in range(7):
+            Users_db.subscribe(f"user{i}", f"user{i}@example.com", ["Delhi", "Mumbai", "Chennai"][i % 3])
+
+        groups = list(Users_db.subscribers_by_city(["Delhi", "Mumbai"], batch_size=2))
+        self.assertEqual([(city, len(recipients)) for city, recipients in groups],
+                         [("Delhi", 2), ("Delhi", 1), ("Mumbai", 2)])
+        self.assertEqual(groups[0][1], [("user0", "user0@example.com"), ("user3", "user3@example.com")])
+        self.assertEqual(len(list(Users_db.subscribers_by_city())), 3)
+
+        weather_db.initialize_db()
+        with transaction(DATA_DB) as conn:
+            conn.executemany("INSERT INTO alerts (City, Rule, Active, Since, Value) VALUES (?, ?, ?, 0, 40)",
+                             [("Mumbai", "heat", 1), ("Mumbai", "humid", 1), ("Delhi", "heat", 0)])
+        groups = list(Users_db.subscribers_by_city(["Delhi", "Mumbai"], alerting=True))
+        self.assertEqual([(city, len(recipients)) for city, recipients in groups], [("Mumbai", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
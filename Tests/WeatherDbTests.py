@@ -0,0 +1,132 @@
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from DataManager import report_db, weather_db
+from DataManager.db import DATA_DB, REPORT_DB, close_connections, get_connection
+from DataManager.retention import applyRetention
+
+
+class WeatherDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_migrates_text_timestamps(self):
+        """Local-time text timestamps of older databases become UTC Unix times and day buckets."""
+        observed = datetime.datetime(2024, 5, 1, 23, 30)
+        with sqlite3.connect(DATA_DB) as conn:
+            conn.execute("""CREATE TABLE weather (City TEXT, DateTime TEXT, Temperature REAL, Temperature_max REAL,
+                            Temperature_min REAL, Weather TEXT, feels_like REAL, Wind_Speed REAL, Humidity REAL)""")
+            conn.execute("INSERT INTO weather VALUES ('Delhi', ?, 30, 31, 29, 'haze', 32, 3, 40)",
+                         (observed.isoformat(" "),))
+            conn.execute("INSERT INTO weather VALUES ('Delhi', 'not a date', 30, 31, 29, 'haze', 32, 3, 40)")
+        conn.close()
+
+        weather_db.initialize_db()
+
+        rows = get_connection(DATA_DB).execute("SELECT DateTime, Day FROM weather").fetchall()
+        self.assertEqual(rows, [(int(observed.timestamp()), weather_db.day_of(observed.timestamp()))])
+        self.assertEqual(weather_db.date_of(rows[0][1]), observed.date())
+        self.assertEqual(weather_db.lastWeather("Delhi")["DateTime"], observed)
+        self.assertEqual(get_connection(DATA_DB).execute("SELECT Count FROM weather_daily").fetchall(), [(1,)])
+
+    def test_day_buckets(self):
+        """Observations are bucketed by local calendar day."""
+        weather_db.initialize_db()
+        midnight = datetime.datetime(2024, 5, 2)
+        for observed in [midnight - datetime.timedelta(seconds=1), midnight, midnight + datetime.timedelta(hours=1)]:
+            self.assertTrue(weather_db.addWeather("Delhi", observed, 30, 31, 29, "haze", 32, 3, 40))
+        self.assertFalse(weather_db.addWeather("Delhi", int(midnight.timestamp()), 30, 31, 29, "haze", 32, 3, 40))
+
+        days = get_connection(DATA_DB).execute(
+            "SELECT Day, COUNT(*) FROM weather GROUP BY Day ORDER BY Day").fetchall()
+        self.assertEqual([(weather_db.date_of(day), count) for day, count in days],
+                         [(datetime.date(2024, 5, 1), 1), (datetime.date(2024, 5, 2), 2)])
+
+    def test_add_weather_many(self):
+        """Bulk inserts consume iterators in batches and skip stored observations."""
+        weather_db.initialize_db()
+        start = int(datetime.datetime(2024, 5, 1).timestamp())
+        observations = ({"City": city, "DateTime": start + 600 * i, "Temperature": 30, "Temperature_max": 31,
+                         "Temperature_min": 29, "Weather": "haze", "Feels_like": 32, "Wind_Speed": 3, "Humidity": 40}
+                        for i in range(25) for city in ["Delhi", "Mumbai"])
+
+        self.assertEqual(weather_db.addWeatherMany(observations, batch_size=7), 50)
+        self.assertEqual(weather_db.addWeatherMany([{**weather_db.lastWeather("Delhi"), "Temperature": 20}]), 0)
+        self.assertEqual(weather_db.lastWeather("Delhi")["Temperature"], 30)
+        self.assertEqual(get_connection(DATA_DB).execute("SELECT COUNT(*) FROM weather").fetchone()[0], 50)
+
+    def test_query_weather(self):
+        """Queries return only the requested cities, times and columns, typed."""
+        weather_db.initialize_db()
+        start = int(datetime.datetime(2024, 5, 1).timestamp())
+        for i in range(6):
+            for city in ["Delhi", "Mumbai", "Chennai"]:
+                weather_db.addWeather(city, start + 600 * i, 30 + i, 31, 29, "haze", 32, 3, None)
+
+        df = weather_db.queryWeather(cities=["Delhi", "Chennai"], start=start + 600, end=start + 3000,
+                                     columns=["City", "DateTime", "Temperature", "Humidity"], order="desc", limit=5)
+        self.assertEqual(list(df.columns), ["City", "DateTime", "Temperature", "Humidity"])
+        self.assertEqual(len(df), 5)
+        self.assertEqual(set(df["City"]), {"Delhi", "Chennai"})
+        self.assertEqual(df["DateTime"].iloc[0], datetime.datetime.fromtimestamp(start + 2400))
+        self.assertEqual(str(df["City"].dtype), "category")
+        self.assertEqual(str(df["Temperature"].dtype), "float32")
+        self.assertTrue(df["Humidity"].isna().all())
+
+        self.assertEqual(len(weather_db.queryWeather(cities=["Pune"], columns=["DateTime"])), 0)
+        with self.assertRaises(ValueError):
+            weather_db.queryWeather(columns=["Temperature; DROP TABLE weather"])
+
+    def test_all_summary(self):
+        """Only days with new rows are summarized, from raw rows and rollups alike."""
+        weather_db.initialize_db()
+        report_db.initialize_db()
+        day = datetime.datetime(2024, 5, 1)
+        for hours, temperature, weather in [(1, 20, "rain"), (2, 30, "haze"), (3, 25, "haze")]:
+            weather_db.addWeather("Delhi", day + datetime.timedelta(hours=hours), temperature, 0, 0, weather, 0, 0, 0)
+        weather_db.addWeather("Mumbai", day + datetime.timedelta(hours=1), 28, 0, 0, "mist", 0, 0, 0)
+
+        self.assertEqual(weather_db.allSummary(), 2)
+        self.assertEqual(weather_db.allSummary(), 0)
+        reports = get_connection(REPORT_DB).execute(
+            "SELECT City, DateTime, min_temp, max_temp, avg_temp, dominant_weather FROM reports ORDER BY City")
+        self.assertEqual(reports.fetchall(), [("Delhi", "2024-05-01", 20, 30, 25, "haze"),
+                                              ("Mumbai", "2024-05-01", 28, 28, 28, "mist")])
+
+        # Roll the morning up, then add an evening row: the day is recomputed from both tiers
+        applyRetention(now=(day + datetime.timedelta(days=1, hours=12)).timestamp())
+        weather_db.addWeather("Delhi", day + datetime.timedelta(hours=20), 35, 0, 0, "rain", 0, 0, 0)
+        self.assertEqual(weather_db.allSummary(), 1)
+        self.assertEqual(get_connection(REPORT_DB).execute(
+            "SELECT min_temp, max_temp, avg_temp, dominant_weather FROM reports WHERE City = 'Delhi'").fetchall(),
+            [(20, 35, 27.5, "haze")])
+
+    def test_running_daily_aggregates(self):
+        """Every stored observation updates its day's aggregate; skipped duplicates do not."""
+        weather_db.initialize_db()
+        # Midday, so the observations of the last seconds all fall on today whenever the test runs
+        now = int(datetime.datetime.combine(datetime.date.today(), datetime.time(12)).timestamp())
+        weather_db.addWeatherMany({"City": "Delhi", "DateTime": now - i, "Temperature": 20 + i, "Temperature_max": 0,
+                                   "Temperature_min": 0, "Weather": "haze" if i % 3 else "rain", "Feels_like": 0,
+                                   "Wind_Speed": 0, "Humidity": 0} for i in range(10))
+        weather_db.addWeather("Delhi", now, 99, 0, 0, "mist", 0, 0, 0)
+
+        summary = weather_db.Summary("Delhi")
+        self.assertEqual((summary["min_temp"], summary["max_temp"], summary["avg_temp"]), (20, 29, 24.5))
+        self.assertEqual(summary["dominant_weather"], "haze")
+        self.assertEqual(summary["DateTime"], datetime.date.today().isoformat())
+
+
+if __name__ == '__main__':
+    unittest.main()
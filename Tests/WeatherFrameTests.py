@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from DataManager import weather_db
+from DataManager.db import DATA_DB, close_connections, get_connection
+from DataManager.weather_frame import WeatherFrameCache
+
+
+class WeatherFrameTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        weather_db.initialize_db()
+        self.now = 1714600000
+        self.cache = WeatherFrameCache(retention=3600, clock=lambda: self.now)
+
+    def tearDown(self):
+        close_connections()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def add(self, city, epoch, temperature=30):
+        weather_db.addWeather(city, epoch, temperature, 31, 29, "haze", 32, 3, 40)
+
+    def test_reads_only_new_rows(self):
+        """Refreshes append rows inserted since the last one and keep the rest untouched."""
+        self.add("Delhi", self.now - 600)
+        self.add("Mumbai", self.now - 600)
+        first = self.cache.refresh()
+        self.assertEqual(list(first["City"]), ["Delhi", "Mumbai"])
+        self.assertIs(self.cache.refresh(), first)
+
+        statements = []
+        get_connection(DATA_DB).set_trace_callback(statements.append)
+        self.add("Delhi", self.now)
+        self.add("Delhi", self.now - 1200, temperature=25)
+        frame = self.cache.refresh()
+        self.assertEqual(list(frame["Temperature"]), [30, 30, 30, 25])
+        self.assertTrue(any("rowid > 2" in statement for statement in statements))
+
+    def test_evicts_expired_rows(self):
+        """Rows older than the retention window leave the frame."""
+        self.add("Delhi", self.now - 3000)
+        self.add("Delhi", self.now)
+        self.assertEqual(len(self.cache.refresh()), 2)
+
+        self.now += 1200
+        frame = self.cache.refresh()
+        self.assertEqual(len(frame), 1)
+        self.assertEqual(frame["DateTime"][0], weather_db.lastWeather("Delhi")["DateTime"])
+
+    def test_reloads_rebuilt_table(self):
+        """A table that shrank below the watermark is loaded again from scratch."""
+        self.add("Delhi", self.now - 600)
+        self.add("Delhi", self.now)
+        self.cache.refresh()
+        with get_connection(DATA_DB) as conn:
+            conn.execute("DELETE FROM weather")
+        self.add("Mumbai", self.now)
+        self.assertEqual(list(self.cache.refresh()["City"]), ["Mumbai"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from DataManager import DataGen, providers, weather_db
+from DataManager.db import close_connections
+from DataManager.providers import WeatherProvider, set_provider
+from DataManager.ratelimit import TokenBucket
+from DataManager.worker import WorkerLockError, acquire_worker_lock, run_worker
+
+# The OWM quota of the sharded workers: 20 calls a second, two back to back
+CALLS_PER_MINUTE = 1200
+BURST = 2
+
+
+class GuardedProvider(WeatherProvider):
+    """A provider whose fetches go through owm_guard, reporting the time of each call."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def fetch(self, city):
+        providers.owm_guard.call(lambda: self.calls.put(time.time()))
+        return {"City": city, "DateTime": 1714564800, "Temperature": 30, "Temperature_max": 31,
+                "Temperature_min": 29, "Weather": "haze", "Feels_like": 30, "Wind_Speed": 3, "Humidity": 40}
+
+
+class WorkerLockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "worker.lock")
+        self.locks = []
+
+    def tearDown(self):
+        for lock_file in self.locks:
+            lock_file.close()
+        self.tmp.cleanup()
+
+    def acquire(self, shard, shards):
+        lock_file = acquire_worker_lock(shard, shards, self.path)
+        self.locks.append(lock_file)
+        return lock_file
+
+    def test_one_worker_per_shard(self):
+        """A shard that already has a worker refuses another one."""
+        self.acquire(0, 4)
+        self.acquire(1, 4)
+        with self.assertRaises(WorkerLockError):
+            self.acquire(1, 4)
+
+    def test_one_layout_at_a_time(self):
+        """Workers of another layout are refused until every worker of the running one has stopped."""
+        first = self.acquire(0, 4)
+        last = self.acquire(3, 4)
+        for shard, shards in [(0, 1), (1, 2), (5, 8)]:
+            with self.assertRaises(WorkerLockError):
+                self.acquire(shard, shards)
+
+        first.close()
+        with self.assertRaises(WorkerLockError):
+            self.acquire(0, 1)
+        last.close()
+        self.acquire(0, 1)
+        with self.assertRaises(WorkerLockError):
+            self.acquire(2, 4)
+
+    def test_old_lock_file(self):
+        """A lock file left by an older worker, holding its pid, does not block a new one."""
+        with open(self.path, "w") as f:
+            f.write("12345")
+        self.acquire(0, 1)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "shards=1")
+
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "Needs fork to share the fake provider")
+class ShardQuotaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        with open("cities.json", "w") as f:
+            json.dump([f"City{i}" for i in range(24)], f)
+        weather_db.initialize_db()
+        close_connections()
+
+    def tearDown(self):
+        set_provider(None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_shards_share_the_quota(self):
+        """Two shards together call OWM no faster than the configured quota."""
+        context = multiprocessing.get_context("fork")
+        calls = context.Queue()
+        set_provider(GuardedProvider(calls))
+        # The quota every process starts with, before a worker takes its share
+        with mock.patch.object(providers, "OWM_CALLS_PER_MINUTE", CALLS_PER_MINUTE), \
+                mock.patch.object(providers, "OWM_BURST", BURST), \
+                mock.patch.object(providers.owm_guard, "limiter", TokenBucket(CALLS_PER_MINUTE, burst=BURST)), \
+                mock.patch.object(DataGen, "FETCH_MODE", "sequential"):
+            processes = [context.Process(target=run_worker, args=(shard, 2, True)) for shard in range(2)]
+            for process in processes:
+                process.start()
+            times = [calls.get(timeout=30) for _ in range(24)]
+            for process in processes:
+                process.join(30)
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+
+        # Beyond the burst, calls come no faster than the quota, whichever shard makes them
+        rate = (len(times) - BURST) / (max(times) - min(times))
+        self.assertLessEqual(rate, CALLS_PER_MINUTE / 60 * 1.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
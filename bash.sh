@@ -1,4 +1,9 @@
 #!/bin/bash
 
+echo "Starting the ingestion worker..."
+python -m DataManager.worker &
+WORKER_PID=$!
+trap 'kill $WORKER_PID' EXIT
+
 echo "Running the application..."
 streamlit run 🏠_Home.py # Replace 'app.py' with your application's entry point if different
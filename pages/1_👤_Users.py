@@ -1,35 +1,16 @@
-import concurrent.futures
+import csv
 import datetime
+import io
 
 import streamlit as st
 
-from DataManager.DataGen import callCities
 from DataManager.LLMsummary import send_summary, send_warning
-from DataManager.Users_db import get_users_by_city as Users
-from DataManager.Users_db import subscribe, unsubscribe
+from DataManager.Users_db import import_subscribers, subscribe, subscribers_by_city, unsubscribe, unsubscribe_many
+from DataManager.cities import city_names
 from DataManager.mailSystem import send_email
-from DataManager.weather_db import Summary, Warning
+from DataManager.weather_db import Summary
 
 
-# Run callCities in parallel
-def run_callCities_async():
-    """
-    Run the callCities function in parallel using a ThreadPoolExecutor.
-
-    Returns:
-        concurrent.futures.Future: The future object returned by the executor.
-    """
-    # Create a ThreadPoolExecutor to run the callCities function in parallel
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Submit the callCities function to the executor and get the future object
-        future = executor.submit(callCities)
-        # Return the future object
-        return future
-
-
-# Start callCities asynchronously
-future_callCities = run_callCities_async()
-
 st.set_page_config(layout="wide")
 
 
@@ -46,10 +27,7 @@ def Subscribe() -> None:
     # Get the user's email address
     Mail: str = st.text_input("Mail")
     # Get the user's city
-    City: str = st.radio(
-        "What City do you live in?",
-        ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]
-    )
+    City: str = st.selectbox("What City do you live in?", city_names())
     # If the user confirms, add the subscription to the database
     if st.button("confirm"):
         subscribe(UserName, Mail, City)
@@ -74,6 +52,36 @@ def Unsubscribe() -> None:
         st.rerun()
 
 
+@st.dialog("Import subscribers")
+def Import() -> None:
+    """
+    Opens a dialog to subscribe or unsubscribe the users listed in a CSV file.
+
+    The file must have the columns UserName, Mail and City; to unsubscribe,
+    only the Mail column is read.
+    """
+    # Get the CSV file
+    upload = st.file_uploader("Subscriber list (CSV with UserName, Mail and City columns)", type="csv")
+    # Subscribe the listed users, or unsubscribe them
+    remove: bool = st.checkbox("Unsubscribe the listed addresses instead")
+    if upload is not None and st.button("confirm"):
+        # Read the upload as text, row by row, rather than decoding it whole
+        text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+        try:
+            if remove:
+                removed = unsubscribe_many(row["Mail"] for row in csv.DictReader(text) if row.get("Mail"))
+                st.success(f"Unsubscribed {removed} users.")
+            else:
+                imported, rejected = import_subscribers(text, cities=city_names())
+                st.success(f"Subscribed {imported} users.")
+                if rejected:
+                    st.warning(f"Skipped {len(rejected)} rows, e.g. line {rejected[0][0]}: {rejected[0][1]}.")
+        except ValueError as e:
+            st.error(str(e))
+        finally:
+            text.detach()
+
+
 # Apply custom CSS for styling
 st.markdown("""
     <style>
@@ -139,15 +147,23 @@ with col2:
             if st.button("Unsubscribe"):
                 Unsubscribe()
 
+# Bulk import, e.g. of a partner's subscriber list
+_, _, x, _, _ = st.columns(5)
+with x:
+    if st.button("Import subscriber list"):
+        Import()
+
 # Weather notifications logic
 if datetime.datetime.now().hour == 22:
-    for city in ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]:
-        data = Summary(city)
-        for user, mail in Users(city):
-            send_email("Weather Report", send_summary(User=user, **data), mail)
-
-# Warning notifications logic
-for city in ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]:
-    if Warning(city):
-        for user, mail in Users(city):
-            send_email("Weather Warning", send_warning(User=user, city=city), mail)
+    data = {}
+    for city, recipients in subscribers_by_city(city_names()):
+        # Large cities come in several groups; summarize each city once
+        if city not in data:
+            data[city] = Summary(city)
+        for user, mail in recipients:
+            send_email("Weather Report", send_summary(User=user, **data[city]), mail)
+
+# Warning notifications logic, only for cities with an active alert
+for city, recipients in subscribers_by_city(city_names(), alerting=True):
+    for user, mail in recipients:
+        send_email("Weather Warning", send_warning(user=user, city=city), mail)
@@ -5,29 +5,45 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 
-from DataManager.DataGen import C2K, C2F, callCities
+from DataManager.DataGen import C2K, C2F
 from DataManager.LLMsummary import send_summary, send_warning
+from DataManager.cities import city_names
 from DataManager.weather_db import Summary, Warning
-from DataManager.weather_db import getWeather
+from DataManager.weather_frame import WeatherFrameCache
 
 st.set_page_config(layout="wide")
 st.markdown("# Weather Monitoring App 🌦️")
 
 
-@st.cache_data(ttl=60)  # Cache the data for 60 seconds
-def get_data_from_database() -> pd.DataFrame:
+# Columns shown for a city
+DISPLAY_COLUMNS = ["DateTime", "Temperature", "Temperature_max", "Temperature_min", "feels_like", "Humidity",
+                   "Wind_Speed", "Weather"]
+
+
+@st.cache_resource  # One incrementally refreshed frame per city, shared by all sessions
+def get_weather_frame(city) -> WeatherFrameCache:
+    """
+    Create the cache holding the weather data of a city loaded so far.
+
+    Returns:
+        WeatherFrameCache: The shared cache.
+    """
+    return WeatherFrameCache(cities=[city], columns=DISPLAY_COLUMNS)
+
+
+def get_data_from_database(city) -> pd.DataFrame:
     """
-    Retrieve the weather data from the SQLite database and return it as a Pandas DataFrame.
-    The data is cached for 60 seconds to reduce the number of queries to the database.
+    Retrieve the weather data of a city from the SQLite database and return it as a Pandas DataFrame.
+    Only the displayed columns of the rows added since the last call are read from the database.
 
     Returns:
         pd.DataFrame: The weather data.
     """
-    return getWeather()
+    return get_weather_frame(city).refresh()
 
 
 # Function to display weather data for a city
-def display_city_data(city, df):
+def display_city_data(city):
     """
     Display the weather data and summary for the specified city.
 
@@ -35,8 +51,6 @@ def display_city_data(city, df):
     ----------
     city : str
         The city for which to display the weather data.
-    df : pd.DataFrame
-        The weather data DataFrame.
     """
     current_summary = send_summary(**Summary(city))
     st.subheader("Current Weather Summary")
@@ -54,7 +68,7 @@ def display_city_data(city, df):
         else:
             st.success("Weather looks good!")
 
-    df_city = df[df["City"] == city]
+    df_city = get_data_from_database(city).copy()
 
     # Apply temperature conversions based on the selected unit
     if Unit == "°C":
@@ -85,24 +99,26 @@ def fetch_weather_data():
     This function runs in an infinite loop, so it should be run in a separate thread.
     """
     while True:
-        df = get_data_from_database()  # Fetch data from DB
+        for city in CITIES:
+            get_data_from_database(city)  # Fetch new data from DB
         time.sleep(30)  # Refresh every 30 seconds
         st.experimental_rerun()  # Rerun the app to refresh the displayed data
 
 
+# List of cities from the city registry
+CITIES = city_names()
+
 # Start data fetching in a separate thread
 threading.Thread(target=fetch_weather_data, daemon=True).start()
 
-callCities()  # Dump data into the DB
-
-# List of cities
-CITIES = ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]
-
-# Create tabs for each city
-tabs = st.tabs(CITIES)
-
-# Display data for each city within its respective tab
-df = get_data_from_database()
-for i, city in enumerate(CITIES):
-    with tabs[i]:
-        display_city_data(city, df)
+if len(CITIES) <= 10:
+    # Create tabs for each city
+    tabs = st.tabs(CITIES)
+
+    # Display data for each city within its respective tab
+    for i, city in enumerate(CITIES):
+        with tabs[i]:
+            display_city_data(city)
+else:
+    # Too many cities for tabs, let the user pick one
+    display_city_data(st.selectbox("City", CITIES))
@@ -1,18 +1,31 @@
-from concurrent.futures import ThreadPoolExecutor
+import datetime
+import importlib.util
+import time
 
 import plotly.express as px
 import streamlit as st
 
-from DataManager.DataGen import callCities, C2K, C2F
+from DataManager.DataGen import C2K, C2F
 from DataManager.LLMsummary import send_summary
+from DataManager.cities import city_names
+from DataManager.export import EXPORT_FORMATS
+from DataManager.export_server import ensure_export_server, export_base, export_url
 from DataManager.report_db import getSummary
-from DataManager.weather_db import Summary, allSummary
+from DataManager.retention import weatherHistory
+from DataManager.weather_db import Summary
 
 st.set_page_config(layout="wide")
 
 st.markdown("# Summary/Report 📃")
 
-CITIES = ["Delhi", "Mumbai", "Chennai", "Bangalore", "Kolkata", "Hyderabad"]
+# List of cities from the city registry
+CITIES = city_names()
+
+# Days shown in the long-term trend
+TREND_DAYS = 365
+
+# Days exported by default
+EXPORT_DAYS = 30
 
 
 def convert_temperature(temp: float, unit: str) -> float:
@@ -153,21 +166,75 @@ def display_city_data(city):
 
     else:
         st.error("Temperature data is incomplete.")
+
+    # Plot the long-term trend, read from the daily rollups
+    history = weatherHistory(cities=[city], start=time.time() - TREND_DAYS * 86400)
+    if len(history):
+        for column in ["min_temp", "avg_temp", "max_temp"]:
+            history[column] = history[column].apply(lambda x: convert_temperature(float(x), unit))
+        fig = px.line(history, x="DateTime", y=["min_temp", "avg_temp", "max_temp"],
+                      title=f"Long-term Trend for {city}")
+        st.plotly_chart(fig, key=f"{city}_trend")
+
     with st.expander(f"Weather Data till today for {city}"):
         st.dataframe(weather_summary_till_today.style.background_gradient(cmap='Blues'), use_container_width=True,
                      hide_index=True)
 
 
-# Create tabs for each city
-tabs = st.tabs(CITIES)
+def display_export():
+    """Let the user download the weather history or the reports for offline access.
 
-# Fetch all summaries in parallel
-with ThreadPoolExecutor() as executor:
-    executor.submit(callCities())
-    # Retrieve all daily summaries concurrently and save them
-    executor.submit(allSummary)  # Call to save daily summaries in the database
+    The download link points at the export endpoint, which streams the file
+    from the database in chunks straight to the browser; Streamlit's own
+    download button would need the whole file up front.
 
-# Display data for each city within its respective tab
-for i, city in enumerate(CITIES):
-    with tabs[i]:
-        display_city_data(city)
+    Returns:
+        None
+    """
+    st.subheader("Export")
+    dataset = st.radio("Data", ["history", "reports"], key="export_dataset", horizontal=True,
+                       format_func={"history": "Weather history", "reports": "Daily reports"}.get)
+    cities = st.multiselect("Cities", CITIES, default=CITIES, key="export_cities")
+    today = datetime.date.today()
+    dates = st.date_input("Dates", value=(today - datetime.timedelta(days=EXPORT_DAYS), today), key="export_dates")
+    resolution = None
+    if dataset == "history":
+        resolution = st.radio("Resolution", ["day", "hour", "raw"], key="export_resolution", horizontal=True)
+    # Parquet needs pyarrow, which is optional
+    formats = [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or importlib.util.find_spec("pyarrow")]
+    fmt = st.radio("Format", formats, key="export_format", horizontal=True)
+
+    if len(dates) != 2:
+        st.info("Select the first and last day to export.")
+        return
+    # Both days are included
+    start, end = dates[0], dates[1] + datetime.timedelta(days=1)
+    if dataset == "history":
+        start = datetime.datetime.combine(start, datetime.time())
+        end = datetime.datetime.combine(end, datetime.time())
+
+    # The endpoint runs next to the app, on the host the browser loaded the page from
+    base = export_base(st.context.headers.get("Host"))
+    st.link_button("Download", export_url(dataset, fmt, cities=cities, start=start, end=end, resolution=resolution,
+                                          base=base))
+
+
+@st.cache_resource  # One export endpoint per Streamlit process, shared by all sessions
+def start_export_server():
+    return ensure_export_server()
+
+
+if len(CITIES) <= 10:
+    # Create tabs for each city
+    tabs = st.tabs(CITIES)
+
+    # Display data for each city within its respective tab
+    for i, city in enumerate(CITIES):
+        with tabs[i]:
+            display_city_data(city)
+else:
+    # Too many cities for tabs, let the user pick one
+    display_city_data(st.selectbox("City", CITIES))
+
+start_export_server()
+display_export()
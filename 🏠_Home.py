@@ -2,7 +2,6 @@ import concurrent.futures
 
 import streamlit as st
 
-from DataManager.DataGen import callCities
 from DataManager.Users_db import initialize_db as u_db
 from DataManager.report_db import initialize_db as r_db
 from DataManager.weather_db import initialize_db as w_db
@@ -17,8 +16,8 @@ def initialize_dbs_async():
     """Run the initialization functions in parallel using a ThreadPoolExecutor.
 
     This function runs the initialization functions for the weather database,
-    report database, and users database in parallel. Additionally, it calls
-    the callCities function that fetches the weather data for all cities.
+    report database, and users database in parallel. Weather data itself is
+    fetched by the ingestion worker (python -m DataManager.worker).
 
     :return: None
     """
@@ -27,8 +26,6 @@ def initialize_dbs_async():
         future_w_db = executor.submit(w_db)
         future_r_db = executor.submit(r_db)
         future_u_db = executor.submit(u_db)
-        # Fetch the weather data for all cities
-        future_callCities = executor.submit(callCities)
         # You can use the futures if you need the results or status, for now, it's just fire-and-forget
 
 
@@ -74,7 +71,7 @@ with col3:
     st.write("""
     - Generate detailed weather reports with summaries.
     - Analyze dominant weather conditions.
-    - Export reports for offline access.
+    - Export the weather history and reports for offline access, downloaded as they are read.
     """)
 
 # Final note